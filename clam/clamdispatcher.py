@@ -24,12 +24,17 @@ import subprocess
 import time
 import signal
 import shutil
+import multiprocessing
 
 VERSION = '2.1'
 
 sys.path.append(sys.path[0] + '/..')
 
 import clam.common.data #pylint: disable=wrong-import-position
+import clam.common.archive #pylint: disable=wrong-import-position
+import clam.common.state #pylint: disable=wrong-import-position
+import clam.common.status #pylint: disable=wrong-import-position
+import clam.common.util #pylint: disable=wrong-import-position
 
 
 def mem(pid, size="rss"):
@@ -39,7 +44,141 @@ def mem(pid, size="rss"):
 def total_seconds(delta):
     return delta.days * 86400 + delta.seconds + (delta.microseconds / 1000000.0)
 
+def updatestate(statestore, method, *args):
+    """Update the project state store, failures are not fatal as the .pid/.done files are written regardless"""
+    if statestore:
+        try:
+            getattr(statestore, method)(*args)
+        except Exception as e: #pylint: disable=broad-except
+            print("[CLAM Dispatcher] WARNING: Unable to update project state: " + str(e), file=sys.stderr)
+
+def buildcommand(args):
+    """Reassembles the command and its arguments as passed on the command line into a single (shell-safe) command"""
+    cmd = args[0]
+    cmd = clam.common.data.unescapeshelloperators(cmd) #shell operators like pipes and redirects were passed in an escaped form
+    if sys.version[0] == '2' and isinstance(cmd,str):
+        cmd = unicode(cmd,'utf-8') #pylint: disable=undefined-variable
+    for arg in args[1:]:
+        arg_u = clam.common.data.unescapeshelloperators(arg)
+        if arg_u != arg:
+            cmd += " " + arg_u #shell operator (pipe or something)
+        else:
+            cmd += " " + clam.common.data.shellsafe(arg,'"')
+    return cmd
+
+
+class Aborted(Exception):
+    pass
+
+def aborthandler(signum, frame): #pylint: disable=unused-argument
+    raise Aborted()
+
+class Task(object):
+    """A single task in per-file mode: the command run for one input file, producing one output file"""
+
+    def __init__(self, nr, inputfilename, outputfilename):
+        self.nr = nr
+        self.inputfilename = inputfilename
+        self.outputfilename = outputfilename
+        self.process = None
+        self.statusfile = None
+        self.statuslog = clam.common.status.StatusLog()
+        self.seen = 0 #number of status messages of the task already passed on
+        self.completion = 0
+
+    def start(self, cmd, projectdir):
+        self.statusfile = os.path.join(projectdir, 'tmp', '.status.' + str(self.nr))
+        if os.path.exists(self.statusfile):
+            os.unlink(self.statusfile)
+        outputfile = projectdir + 'output/' + self.outputfilename
+        if not os.path.isdir(os.path.dirname(outputfile)):
+            os.makedirs(os.path.dirname(outputfile))
+        for variable, value in (('INPUTFILE', projectdir + 'input/' + self.inputfilename), ('OUTPUTFILE', outputfile), ('STATUSFILE', self.statusfile)):
+            value = clam.common.data.shellsafe(value,'"')
+            cmd = cmd.replace('"%' + variable + '%"', value).replace('%' + variable + '%', value)
+        if sys.version[0] == '2' and isinstance(cmd,unicode): #pylint: disable=undefined-variable
+            cmd = cmd.encode('utf-8')
+        #each task gets its own process group so it can be stopped along with its children
+        self.process = subprocess.Popen(cmd, cwd=projectdir, shell=True, preexec_fn=os.setsid)
+
+    def messages(self):
+        """Returns the status messages the task wrote since the last call"""
+        self.statuslog.update(self.statusfile)
+        self.completion = self.statuslog.completion
+        entries = self.statuslog.entries[self.seen:]
+        self.seen += len(entries)
+        return [ message for message, _, _ in entries ]
+
+    def stop(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGTERM)
+        except OSError:
+            pass
+
+def perfile(args):
+    """Per-file mode: runs the command once for every task (one input file producing one output file) of the project, at most maxparallel at once, and merges the status messages and completion of all tasks into the status file of the project. Invoked as: clamdispatcher --perfile maxparallel projectdir cmd arg1 arg2 ..."""
+    maxparallel = int(args[0])
+    if maxparallel <= 0:
+        maxparallel = multiprocessing.cpu_count()
+    projectdir = args[1]
+    if projectdir[-1] != '/':
+        projectdir += '/'
+    cmd = buildcommand(args[2:])
+    statusfile = projectdir + '.status'
+    if not os.path.isdir(projectdir + 'tmp'):
+        os.makedirs(projectdir + 'tmp')
+
+    clamdata = clam.common.data.getclamdata(projectdir + 'clam.xml')
+    tasks = [ Task(i, inputfilename, outputfilename) for i, (inputfilename, outputfilename) in enumerate(clamdata.program.tasks() or []) ]
+    print("[CLAM Dispatcher] Running " + str(len(tasks)) + " tasks, at most " + str(maxparallel) + " at once: " + cmd, file=sys.stderr)
+    clam.common.status.write(statusfile, "Running " + str(len(tasks)) + " tasks", 0)
+
+    signal.signal(signal.SIGTERM, aborthandler)
+    parentpid = os.getppid() #if the shell we were started from is killed (on abort), we are orphaned and stop as well
+    pending = list(tasks)
+    running = []
+    failed = 0
+    exitcode = 0
+    try:
+        while pending or running:
+            while pending and len(running) < maxparallel:
+                task = pending.pop(0)
+                task.start(cmd, projectdir)
+                running.append(task)
+            time.sleep(0.2)
+            if os.getppid() != parentpid:
+                raise Aborted()
+            for task in list(running):
+                returncode = task.process.poll()
+                messages = task.messages()
+                if returncode is not None:
+                    running.remove(task)
+                    task.completion = 100
+                    if returncode != 0:
+                        failed += 1
+                        if not exitcode: exitcode = returncode
+                        messages.append("Failed with exit code " + str(returncode))
+                    else:
+                        messages.append("Done") #always report it, most tasks don't write a status file of their own
+                completion = int(sum( task.completion for task in tasks ) / len(tasks))
+                for message in messages:
+                    clam.common.status.write(statusfile, "[" + task.outputfilename + "] " + message, completion)
+    except Aborted:
+        print("[CLAM Dispatcher] Aborting " + str(len(running)) + " running tasks", file=sys.stderr)
+        for task in running:
+            task.stop()
+        return 143
+
+    if failed:
+        clam.common.status.write(statusfile, str(failed) + " of " + str(len(tasks)) + " tasks failed", 100)
+    else:
+        clam.common.status.write(statusfile, "Done", 100)
+    return exitcode
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--perfile':
+        return perfile(sys.argv[2:])
+
     if len(sys.argv) < 4:
         print("[CLAM Dispatcher] ERROR: Invalid syntax, use clamdispatcher.py [pythonpath] settingsmodule projectdir cmd arg1 arg2 ... got: " + " ".join(sys.argv[1:]), file=sys.stderr)
         with open('.done','w') as f:
@@ -70,16 +209,7 @@ def main():
 
     print("[CLAM Dispatcher] Started CLAM Dispatcher v" + str(VERSION) + " with " + settingsmodule + " (" + datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S') + ")", file=sys.stderr)
 
-    cmd = sys.argv[3+offset]
-    cmd = clam.common.data.unescapeshelloperators(cmd) #shell operators like pipes and redirects were passed in an escaped form
-    if sys.version[0] == '2' and isinstance(cmd,str):
-        cmd = unicode(cmd,'utf-8') #pylint: disable=undefined-variable
-    for arg in sys.argv[4+offset:]:
-        arg_u = clam.common.data.unescapeshelloperators(arg)
-        if arg_u != arg:
-            cmd += " " + arg_u #shell operator (pipe or something)
-        else:
-            cmd += " " + clam.common.data.shellsafe(arg,'"')
+    cmd = buildcommand(sys.argv[3+offset:])
 
 
     if not cmd:
@@ -123,6 +253,16 @@ def main():
         settings.DISPATCHER_MAXRESMEM = 0
     if not 'DISPATCHER_MAXTIME' in settingkeys:
         settings.DISPATCHER_MAXTIME = 0
+    if not 'PROJECTSTATE' in settingkeys:
+        settings.PROJECTSTATE = 'sqlite'
+
+    statestore = None
+    user = project = None #remain unset if there is no state store, updatestate() then does nothing
+    if projectdir:
+        try:
+            statestore, user, project = clam.common.state.forproject(settings.PROJECTSTATE, projectdir)
+        except Exception as e: #pylint: disable=broad-except
+            print("[CLAM Dispatcher] WARNING: Unable to open project state store: " + str(e), file=sys.stderr)
 
 
     try:
@@ -133,6 +273,7 @@ def main():
     if sys.version[0] == '2' and isinstance(cmd,unicode): #pylint: disable=undefined-variable
         cmd = cmd.encode('utf-8')
     if projectdir:
+        outputsize = clam.common.util.computediskusage(projectdir + 'output/') #to account for the disk space the output takes
         process = subprocess.Popen(cmd,cwd=projectdir, shell=True, stderr=sys.stderr)
     else:
         process = subprocess.Popen(cmd, shell=True, stderr=sys.stderr)
@@ -144,12 +285,14 @@ def main():
         if projectdir:
             with open(projectdir + '.pid','w') as f:
                 f.write(str(pid))
+            updatestate(statestore, 'started', user, project, pid)
     else:
         print("[CLAM Dispatcher] Unable to launch process", file=sys.stderr)
         sys.stderr.flush()
         if projectdir:
             with open(projectdir + '.done','w') as f:
                 f.write(str(1))
+            updatestate(statestore, 'finished', user, project, 1)
         return 1
 
     #intervalf = lambda s: min(s/10.0, 15)
@@ -220,10 +363,9 @@ def main():
         with open(projectdir + '.done','w') as f:
             f.write(str(statuscode))
         if os.path.exists(projectdir + '.pid'): os.unlink(projectdir + '.pid')
-
-        #remove project index cache (has to be recomputed next time because this project now has a different size)
-        if os.path.exists(os.path.join(projectdir,'..','.index')):
-            os.unlink(os.path.join(projectdir,'..','.index'))
+        updatestate(statestore, 'finished', user, project, statuscode, abort)
+        updatestate(statestore, 'adddiskusage', user, project, clam.common.util.computediskusage(projectdir + 'output/') - outputsize)
+        clam.common.archive.invalidate(projectdir) #the output has changed, cached archives are stale
 
 
     if tmpdir and os.path.exists(tmpdir):
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- CLAM Metadata converter --
+#       by Maarten van Gompel (proycon)
+#       http://ilk.uvt.nl/clam
+#       http://ilk.uvt.nl/~mvgompel
+#       Induction for Linguistic Knowledge Research Group
+#       Universiteit van Tilburg
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+#Converts the output metadata of existing projects, one .METADATA file per
+#output file, to a single metadata store per project (output/.METADATA.sqlite),
+#as written by services with OUTPUTMETADATA = 'sqlite'.
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import sys
+import os
+import glob
+import argparse
+
+from clam.common.data import VERSION, MetadataStore
+
+def projectdirs(path):
+    """Yields the project directories at or (up to two levels, i.e. $ROOT/projects/$USER/$PROJECT) below path"""
+    if os.path.isdir(os.path.join(path, 'output')):
+        yield path
+    else:
+        for outputdir in sorted(glob.glob(os.path.join(path, '*', 'output')) + glob.glob(os.path.join(path, '*', '*', 'output'))):
+            yield os.path.dirname(outputdir)
+
+def main():
+    parser = argparse.ArgumentParser(description="Moves the metadata of the output files of existing CLAM projects into a single metadata store per project, for services configured with OUTPUTMETADATA = 'sqlite'", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-v','--version',help="Version", action='version',version="CLAM version " + str(VERSION))
+    parser.add_argument('directories',nargs='+', help="Project directories, or directories containing projects (e.g. $ROOT/projects)")
+    args = parser.parse_args()
+
+    total = 0
+    for path in args.directories:
+        if not os.path.isdir(path):
+            print("No such directory: " + path, file=sys.stderr)
+            sys.exit(2)
+        for projectdir in projectdirs(path):
+            count = MetadataStore.convert(os.path.join(projectdir, 'output'))
+            if count:
+                print("Converted " + str(count) + " metadata files in " + projectdir, file=sys.stderr)
+            total += count
+    print("Converted " + str(total) + " metadata files in total", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -34,6 +34,10 @@ import argparse
 import time
 import socket
 import json
+import threading
+import multiprocessing
+import tempfile
+import signal
 import mimetypes
 import flask
 import werkzeug
@@ -45,7 +49,11 @@ import clam.common.formats
 import clam.common.auth
 import clam.common.oauth
 import clam.common.data
-from clam.common.util import globsymlinks, setdebug, setlog, setlogfile, printlog, printdebug, xmlescape, withheaders, computediskusage
+import clam.common.state
+import clam.common.archive
+import clam.common.executor
+import clam.clamsupervisor
+from clam.common.util import globsymlinks, setdebug, setlog, setlogfile, printlog, printdebug, xmlescape, withheaders, computediskusage, filesize, memoryavailable, loadaverage, DirectoryWatcher, LRUCache
 import clam.config.defaults as settings #will be overridden by real settings later
 settings.STANDALONEURLPREFIX = ''
 
@@ -75,10 +83,29 @@ VERSION = clam.common.data.VERSION
 
 DEBUG = False
 
-DATEMATCH = re.compile(r'^[\d\.\-\s:]*$')
-
 settingsmodule = None #will be overwritten later
 
+MAXWAIT = 300 #maximum number of seconds a long polling status request may wait
+STREAMKEEPALIVE = 15 #seconds between keepalive messages on status streams
+RECONCILERINTERVAL = 300 #seconds between runs of the disk usage reconciler
+ACTIONCACHESWEEPINTERVAL = 60 #minimum number of seconds between evictions from the shared action cache on disk
+
+#archive formats for downloading all output at once => (content type, content encoding)
+ARCHIVEFORMATS = {
+    'zip': ('application/zip', None),
+    'tar.gz': ('application/x-tar', 'gzip'),
+    'tar.bz2': ('application/x-bzip2', None),
+    'tar.xz': ('application/x-xz', None),
+}
+
+statestore = None #project state backend (clam.common.state), instantiated when the service starts
+archivecache = None #cache of output archives (clam.common.archive.ArchiveCache), if enabled
+actionpools = {} #executor ('thread' or 'process') => clam.common.executor.Pool, for actions with an executor
+actioncache = None #results of actions with cache=True (clam.common.util.LRUCache), instantiated when the service starts
+actioncachesweep = 0 #time of the last eviction from the shared action cache on disk
+userdb_mysql = None #MySQLUserDB, if USERS_MYSQL is used
+templateindex = None #(inputtemplates, outputtemplates) dictionaries by ID, for attaching viewers and converters to files, built when the service starts
+
 setlog(sys.stderr)
 
 HOST = PORT = None
@@ -105,39 +132,99 @@ def userdb_lookup_dict(user, **authsettings):
 
 
 def userdb_lookup_mysql(user, **authsettings):
-    printdebug("Looking up user " + user + " in MySQL")
-    host,port, mysqluser,passwd, database, table, userfield, passwordfield, accesslist, denylist = validate_users_mysql()  #pylint: disable=unused-variable
-    if denylist and user in denylist:
-        printdebug("User in denylist")
-        raise KeyError
-    if accesslist and not (user in accesslist):
-        printdebug("User not in accesslist")
-        raise KeyError
-    if sys.version >= '3' and isinstance(passwd,bytes): passwd = str(passwd,'utf-8')
-    db = MySQLdb.connect(host=host,user=mysqluser,passwd=passwd,db=database, charset='utf8', use_unicode=True)
-    cursor = db.cursor()
-    #simple protection against mysql injection
-    user = user.replace("'","")
-    user = user.replace(";","")
-    sql = "SELECT `" + userfield + "`, `" + passwordfield + "` FROM `" + table + "` WHERE " + userfield + "='" + user + "' LIMIT 1"
-    cursor.execute(sql)
-    password = None
-    while True:
-        data = cursor.fetchone()
-        if data:
-            user, password = data
-        else:
-            break
-    cursor.close()
-    db.close()
-    if password:
-        printdebug("Password retrieved")
-        return password
-    else:
-        printdebug("User not found")
-        raise KeyError
+    global userdb_mysql #pylint: disable=global-statement
+    if userdb_mysql is None:
+        userdb_mysql = MySQLUserDB(*validate_users_mysql())
+    return userdb_mysql.lookup(user)
+
+
+class MySQLUserDB(object):
+    """Looks up the (hashed) passwords of users in MySQL, over a pool of persistent connections. Passwords that are found, and users that are not, are cached for a while"""
+
+    def __init__(self, host, port, user, password, database, table, userfield, passwordfield, accesslist, denylist):
+        #pylint: disable=unsupported-membership-test,unsubscriptable-object
+        if sys.version >= '3' and isinstance(password,bytes): password = str(password,'utf-8')
+        self.connectargs = dict(host=host,port=port,user=user,passwd=password,db=database, charset='utf8', use_unicode=True)
+        self.sql = "SELECT `" + passwordfield + "` FROM `" + table + "` WHERE `" + userfield + "`=%s LIMIT 1"
+        self.accesslist = accesslist
+        self.denylist = denylist
+        self.idle = [] #idle connections, as (connection, time last used), most recently used last
+        self.poolsize = int(settings.USERS_MYSQL.get('poolsize',4))
+        self.pinginterval = int(settings.USERS_MYSQL.get('pinginterval',30)) #connections idle for longer than this many seconds are checked before use
+        self.lock = threading.Lock()
+        self.passwords = LRUCache(int(settings.USERS_MYSQL.get('cachesize',10000)), int(settings.USERS_MYSQL.get('cachettl',60)))
+        self.unknown = LRUCache(int(settings.USERS_MYSQL.get('cachesize',10000)), int(settings.USERS_MYSQL.get('negativecachettl',10)))
+
+    def connect(self):
+        """Returns an idle connection from the pool, or a new one if there is none"""
+        while True:
+            with self.lock:
+                if not self.idle:
+                    break
+                db, lastused = self.idle.pop()
+            if time.time() - lastused < self.pinginterval:
+                return db
+            try:
+                db.ping()
+                return db
+            except MySQLdb.Error:
+                printdebug("Discarding stale MySQL connection")
+                self.close(db)
+        printdebug("Opening new MySQL connection")
+        return MySQLdb.connect(**self.connectargs)
+
+    def release(self, db):
+        """Returns a connection to the pool (or closes it if the pool is full)"""
+        with self.lock:
+            if len(self.idle) < self.poolsize:
+                self.idle.append( (db, time.time()) )
+                return
+        self.close(db)
 
+    @staticmethod
+    def close(db):
+        try:
+            db.close()
+        except MySQLdb.Error:
+            pass
 
+    def query(self, user):
+        """Returns the password of the user according to the database, or None if the user does not exist"""
+        db = self.connect()
+        try:
+            cursor = db.cursor()
+            cursor.execute(self.sql, (user,))
+            data = cursor.fetchone()
+            cursor.close()
+        except MySQLdb.Error:
+            self.close(db) #may be broken, don't return it to the pool
+            raise
+        self.release(db)
+        if data:
+            return data[0]
+        return None
+
+    def lookup(self, user):
+        printdebug("Looking up user " + user + " in MySQL")
+        if self.denylist and user in self.denylist:
+            printdebug("User in denylist")
+            raise KeyError
+        if self.accesslist and not (user in self.accesslist):
+            printdebug("User not in accesslist")
+            raise KeyError
+        password = self.passwords.get(user)
+        if password is None:
+            if user in self.unknown:
+                printdebug("User not found (cached)")
+                raise KeyError
+            password = self.query(user)
+            if not password:
+                printdebug("User not found")
+                self.unknown.set(user, True)
+                raise KeyError
+            printdebug("Password retrieved")
+            self.passwords.set(user, password)
+        return password
 
 
 def validate_users_mysql():
@@ -306,35 +393,24 @@ def entryshortcut(credentials = None, fromstart=False): #pylint: disable=too-man
 
     return None
 
-def getprojects(user):
-    projects = []
+def getprojects(user, offset=0, limit=None):
+    """Returns a list of (project, last changed, size in MB, status) tuples for the projects of the user (at most limit of them, starting at offset), the total disk usage in MB, and the total number of projects"""
+    states = statestore.getall(user)
     totalsize = 0.0
-    path = settings.ROOT + "projects/" + user
-    if os.path.exists(os.path.join(path,'.index')):
-        with io.open(os.path.join(path,'.index'),'r',encoding='utf-8') as f:
-            try:
-                data = json.load(f)
-            except ValueError:
-                printlog("Invalid json in .index")
-                os.unlink(os.path.join(path,'.index'))
-                return getprojects(user)
-            totalsize = float(data['totalsize'])
-            projects = data['projects']
-    else:
-        for f in glob.glob(path + '/*'):
-            if os.path.isdir(f):
-                d = datetime.datetime.fromtimestamp(os.stat(f)[8])
-                project = os.path.basename(f)
-                projectsize = Project.getdiskusage(user,project )
-                totalsize += projectsize
-                projects.append( ( project , d.strftime("%Y-%m-%d %H:%M:%S"), round(projectsize,2), Project.simplestatus(project,user)  ) )
-            with io.open(os.path.join(path,'.index'),'w',encoding='utf-8') as f:
-                if sys.version < '3':
-                    data = json.dumps({'totalsize': totalsize, 'projects': projects}, ensure_ascii=False)
-                    f.write(data)
-                else:
-                    json.dump({'totalsize': totalsize, 'projects': projects},f, ensure_ascii=False)
-    return projects, round(totalsize)
+    for state in states:
+        if state['diskusage'] is None:
+            state['diskusage'] = statestore.measure(user, state['project'])
+        totalsize += state['diskusage']
+    projects = []
+    for state in states[offset:offset+limit if limit else None]:
+        if state['status'] == clam.common.status.RUNNING:
+            state = statestore.lookup(user, state['project']) or state #verify it is still running
+        if state['modified']:
+            modified = datetime.datetime.fromtimestamp(state['modified']).strftime("%Y-%m-%d %H:%M:%S")
+        else:
+            modified = ""
+        projects.append( ( state['project'], modified, round(state['diskusage'] or 0.0,2), state['status'] ) )
+    return projects, round(totalsize), len(states)
 
 def index(credentials = None):
     """Get list of projects or shortcut to other functionality"""
@@ -347,8 +423,11 @@ def index(credentials = None):
     projects = []
     user, oauth_access_token = parsecredentials(credentials)
     totalsize = 0.0
+    projectcount = 0
+    offset = max(0, getintparameter('offset', 0))
+    limit = getintparameter('limit')
     if settings.LISTPROJECTS:
-        projects, totalsize = getprojects(user)
+        projects, totalsize, projectcount = getprojects(user, offset, limit)
 
     errors = "no"
     errormsg = ""
@@ -380,6 +459,9 @@ def index(credentials = None):
             datafile=None,
             projects=projects,
             totalsize=totalsize,
+            projectcount=projectcount,
+            projectoffset=offset,
+            projectlimit=limit,
             actions=settings.ACTIONS,
             disableinterface=not settings.ENABLEWEBAPP,
             info=False,
@@ -398,7 +480,7 @@ def info(credentials=None):
 
     totalsize = 0.0
     if settings.LISTPROJECTS:
-        projects, totalsize = getprojects(user)
+        projects, totalsize, _ = getprojects(user)
 
     errors = "no"
     errormsg = ""
@@ -450,7 +532,7 @@ class Admin:
         for f in glob.glob(settings.ROOT + "projects/*"):
             if os.path.isdir(f):
                 u = os.path.basename(f)
-                usersprojects[u], totalsize[u] = getprojects(u)
+                usersprojects[u], totalsize[u], _ = getprojects(u)
                 usersprojects[u].sort()
 
         return withheaders(flask.make_response(flask.render_template('admin.html',
@@ -508,6 +590,8 @@ class Admin:
             d = Project.path(project, targetuser)
             if os.path.isdir(d):
                 shutil.rmtree(d)
+                statestore.delete(targetuser, project)
+                clam.common.archive.invalidate(d)
                 return "Ok"
             else:
                 return flask.make_response('Not Found',403)
@@ -540,12 +624,8 @@ class Admin:
             headers = {}
             mimetype = 'application/octet-stream'
         try:
-            return withheaders(flask.Response( (line for line in outputfile) ), mimetype, headers )
-        except UnicodeError:
-            return flask.make_response("Output file " + str(outputfile) + " is not in the expected encoding! Make sure encodings for output templates service configuration file are accurate.",500)
-        except FileNotFoundError:
-            raise flask.abort(404)
-        except IOError:
+            return sendfile(str(outputfile), mimetype, headers)
+        except (IOError, OSError):
             raise flask.abort(404)
 
 
@@ -569,14 +649,61 @@ def getrooturl(): #not a view
         if url[-1] == '/': url = url[:-1]
         return url
 
-def getbinarydata(path, buffersize=16*1024):
-    with io.open(path,'rb') as f:
+def getintparameter(key, default=None): #not a view
+    """Returns the value of an integer request parameter, or the default if it is absent or invalid"""
+    try:
+        return int(flask.request.values[key])
+    except (KeyError, ValueError):
+        return default
+
+def getstatusloglimit(): #not a view
+    """Returns the maximum number of status log entries the client asked for (statusloglimit parameter), or None for all of them"""
+    limit = getintparameter('statusloglimit', 0)
+    return limit if limit > 0 else None
+
+def getlistingparameters(): #not a view
+    """Returns the parameters that select which input/output files are listed (files, template, since, offset, limit) as a dictionary. These are only honoured on GET requests, as other requests may carry service parameters of the same name"""
+    listing = {'files': 'all', 'template': None, 'since': None, 'offset': 0, 'limit': None}
+    if flask.request.method == 'GET':
+        if flask.request.values.get('files') in ('all','none','input','output'):
+            listing['files'] = flask.request.values['files']
+        listing['template'] = flask.request.values.get('template') or None
+        try:
+            listing['since'] = float(flask.request.values['since'])
+        except (KeyError, ValueError):
+            pass
+        listing['offset'] = max(0, getintparameter('offset', 0))
+        listing['limit'] = getintparameter('limit')
+        if listing['limit'] is not None and listing['limit'] <= 0:
+            listing['limit'] = None
+    return listing
+
+def reconciler(store, maxage): #not a view
+    """Runs in a background thread, rescans the projects whose disk usage was not measured for maxage seconds to correct any drift in the incremental accounting (e.g. files changed outside of CLAM)"""
+    while True:
+        time.sleep(RECONCILERINTERVAL)
+        try:
+            count = store.reconcile(maxage)
+            if count:
+                printdebug("Measured disk usage of " + str(count) + " projects")
+        except Exception as e: #pylint: disable=broad-except
+            printlog("Unable to reconcile disk usage: " + str(e))
+
+def getbinarydata(f, buffersize=64*1024): #not a view
+    """Yields the contents of an opened file in chunks, closes the file when done"""
+    with f:
         while True:
             data = f.read(buffersize)
             if not data:
                 break
             else:
                 yield data
+
+def sendfile(path, mimetype, headers=None): #not a view
+    """Sends a file as is (no decoding/re-encoding), so the server can use sendfile() for it. Handles Range, If-None-Match and If-Modified-Since requests"""
+    response = flask.send_file(path, mimetype=mimetype, conditional=True)
+    return withheaders(response, mimetype, headers)
+
 class Project:
     """This class simply groups project methods, is not instantiated and does not offer any kind of persistence, all methods are static"""
 
@@ -592,15 +719,17 @@ class Project:
 
     @staticmethod
     def getdiskusage(user, project):
-        path = settings.ROOT + "projects/" + user + '/' + project + "/"
-        if os.path.exists(os.path.join(path,'.du')):
-            with open(os.path.join(path,'.du'),'r') as f:
-                return float(f.read().strip())
+        state = statestore.get(user, project)
+        if state and state['diskusage'] is not None:
+            return state['diskusage']
         else:
-            size = computediskusage(path)
-            with open(os.path.join(path,'.du'),'w') as f:
-                f.write(str(size))
-            return size
+            return statestore.measure(user, project)
+
+    @staticmethod
+    def filediskusage(file):
+        """Returns the disk usage of a local CLAMFile plus its metadata file (MB)"""
+        path = file.projectpath + file.basedir + '/'
+        return (filesize(path + file.filename) + filesize(path + file.metafilename())) / 1024 / 1024
 
     @staticmethod
     def create(project, credentials): #pylint: disable=too-many-return-statements
@@ -615,6 +744,8 @@ class Project:
         printdebug("Checking if " + settings.ROOT + "projects/" + user + '/' + project + " exists")
         if not project:
             return flask.make_response('No project name',403)
+        if project == 'run':
+            return flask.make_response("The project name 'run' is reserved",403)
         if not os.path.isdir(settings.ROOT + "projects/" + user):
             printlog("Creating user directory '" + user + "'")
             os.makedirs(settings.ROOT + "projects/" + user)
@@ -624,7 +755,7 @@ class Project:
 
         #checking user quota
         if settings.USERQUOTA > 0:
-            _, totalsize = getprojects(user)
+            totalsize = round(statestore.totaldiskusage(user))
             if totalsize > settings.USERQUOTA:
                 printlog("User " + user + " exceeded quota, refusing to create new project...")
                 return flask.make_response("Unable to create new project because you are exceeding your disk quota (max " + str(settings.USERQUOTA) + " MB, you now use " + str(totalsize) + " MB). Please delete some projects and try again.",403)
@@ -633,10 +764,6 @@ class Project:
             printlog("Creating project '" + project + "'")
             os.makedirs(settings.ROOT + "projects/" + user + '/' + project)
 
-        #project index will need to be regenerated, remove cache
-        if os.path.exists(os.path.join(settings.ROOT + "projects/" + user,'.index')):
-            os.unlink(os.path.join(settings.ROOT + "projects/" + user,'.index'))
-
         if not os.path.isdir(settings.ROOT + "projects/" + user + '/' + project + '/input/'):
             os.makedirs(settings.ROOT + "projects/" + user + '/' + project + "/input")
             if not os.path.isdir(settings.ROOT + "projects/" + user + '/' + project + '/input'):
@@ -650,67 +777,66 @@ class Project:
             if not os.path.isdir(settings.ROOT + "projects/" + user + '/' + project + '/tmp'):
                 return flask.make_response("tmp directory " + settings.ROOT + "projects/" + user + '/' + project + "/tmp/  could not be created succesfully",403)
 
+        statestore.create(user, project)
         return None #checks rely on this
 
+    @staticmethod
+    def state(project, user):
+        """Returns the state of the project (a dictionary, see clam.common.state), or None if the project does not exist"""
+        return statestore.lookup(user, project)
+
     @staticmethod
     def pid(project, user):
-        pidfile = Project.path(project, user) + '.pid'
-        if os.path.isfile(pidfile):
-            f = open(pidfile,'r')
-            pid = int(f.read(os.path.getsize(pidfile)))
-            f.close()
-            return pid
+        state = Project.state(project, user)
+        if state and state['status'] == clam.common.status.RUNNING:
+            return state['pid']
         else:
             return 0
 
     @staticmethod
     def running(project, user):
-        pidfile = Project.path(project, user) + '.pid'
-        if os.path.isfile(pidfile) and not os.path.isfile(Project.path(project, user) + ".done"):
-            f = open(pidfile,'r')
-            pid = int(f.read(os.path.getsize(pidfile)))
-            f.close()
-            try:
-                os.kill(pid, 0) #raises error if pid doesn't exist
-                return True
-            except:
-                f = open(Project.path(project, user) + ".done", 'w')
-                f.write(str(1) )
-                f.close()
-                os.unlink(pidfile)
-                return False
-        else:
-            return False
+        state = Project.state(project, user)
+        return bool(state) and state['status'] == clam.common.status.RUNNING
 
+    @staticmethod
+    def queued(project, user):
+        state = Project.state(project, user)
+        return bool(state) and state['status'] == clam.common.status.QUEUED
 
     @staticmethod
     def abort(project, user):
-        if Project.pid(project, user) == 0:
+        state = Project.state(project, user)
+        if not state or state['status'] not in (clam.common.status.RUNNING, clam.common.status.QUEUED):
             return False
         printlog("Aborting process of project '" + project + "'" )
         f = open(Project.path(project,user) + ".abort", 'w')
         f.close()
         os.chmod( Project.path(project,user) + ".abort", 0o777)
-        while not os.path.exists(Project.path(project, user) + ".done"):
+        if settings.SUPERVISOR_SOCKET and not settings.REMOTEHOST:
+            try:
+                clam.clamsupervisor.abort(settings.SUPERVISOR_SOCKET, Project.path(project, user))
+            except (socket.error, IOError, ValueError) as e:
+                printlog("Unable to reach supervisor, relying on abort file: " + str(e))
+        while not Project.done(project, user):
             printdebug("Waiting for process to die")
             time.sleep(1)
         return True
 
     @staticmethod
     def done(project,user):
-        return os.path.isfile(Project.path(project, user) + ".done")
+        state = Project.state(project, user)
+        return bool(state) and state['status'] == clam.common.status.DONE
 
     @staticmethod
     def aborted(project,user):
-        return os.path.isfile(Project.path(project, user) + ".aborted")
+        state = Project.state(project, user)
+        return bool(state) and state['status'] == clam.common.status.DONE and state['aborted']
 
 
     @staticmethod
     def exitstatus(project, user):
-        f = open(Project.path(project, user) + ".done")
-        status = int(f.read(1024))
-        f.close()
-        return status
+        state = Project.state(project, user)
+        return state['exitcode'] if state and state['exitcode'] is not None else 0
 
     @staticmethod
     def exists(project, credentials):
@@ -720,53 +846,25 @@ class Project:
         return os.path.isdir(Project.path(project, user))
 
     @staticmethod
-    def statuslog(project, user):
-        statuslog = []
-        statusfile = Project.path(project,user) + ".status"
-        totalcompletion = 0
-        if os.path.isfile(statusfile): #pylint: disable=too-many-nested-blocks
-            prevmsg = None
-            with open(statusfile) as f:
-                for line in f: #pylint: disable=too-many-nested-blocks
-                    line = line.strip()
-                    if line:
-                        message = ""
-                        completion = 0
-                        timestamp = ""
-                        for field in line.split("\t"):
-                            if field:
-                                if field[-1] == '%' and field[:-1].isdigit():
-                                    completion = int(field[:-1])
-                                    if completion > 0:
-                                        totalcompletion = completion
-                                elif DATEMATCH.match(field):
-                                    if field.isdigit():
-                                        try:
-                                            d = datetime.datetime.fromtimestamp(float(field))
-                                            timestamp = d.strftime("%d/%b/%Y %H:%M:%S")
-                                        except ValueError:
-                                            pass
-                                else:
-                                    message += " " + field
-
-                        if message and (message != prevmsg):
-                            #print "STATUSLOG: t=",timestamp,"c=",completion,"msg=" + message.strip()
-                            statuslog.append( (message.strip(), timestamp, completion) )
-                            prevmsg = message
-            statuslog.reverse()
-        return statuslog, totalcompletion
-
-    @staticmethod
-    def status(project, user):
-        if Project.running(project, user):
-            statuslog, completion = Project.statuslog(project, user)
+    def statuslog(project, user, limit=None):
+        return clam.common.status.read(Project.path(project,user) + ".status", limit)
+
+    @staticmethod
+    def status(project, user, limit=None):
+        """Returns the status code, status message, status log (most recent first, at most limit entries if set) and completion of the project"""
+        state = Project.state(project, user)
+        statuscode = state['status'] if state else clam.common.status.READY
+        if statuscode == clam.common.status.QUEUED:
+            return (clam.common.status.QUEUED, "Waiting in queue, the system will start as soon as it is available", [], 0)
+        elif statuscode == clam.common.status.RUNNING:
+            statuslog, completion = Project.statuslog(project, user, limit)
             if statuslog:
                 return (clam.common.status.RUNNING, statuslog[0][0],statuslog, completion)
             else:
                 return (clam.common.status.RUNNING, "The system is running",  [], 0) #running
-        elif Project.done(project, user):
-            statuslog, completion = Project.statuslog(project, user)
-            if Project.aborted(project,user):
+        elif statuscode == clam.common.status.DONE:
+            statuslog, completion = Project.statuslog(project, user, limit)
+            if state['aborted']:
                 if not statuslog:
                     completion = 100
                 return (clam.common.status.DONE, "Aborted! Output may be partial or unavailable", statuslog, completion)
@@ -780,12 +878,8 @@ class Project:
 
     @staticmethod
     def simplestatus(project, user):
-        if Project.done(project, user):
-            return clam.common.status.DONE
-        elif Project.running(project, user):
-            return clam.common.status.RUNNING
-        else:
-            return clam.common.status.READY
+        state = Project.state(project, user)
+        return state['status'] if state else clam.common.status.READY
 
     @staticmethod
     def status_json(project, credentials=None):
@@ -803,48 +897,166 @@ class Project:
         if not os.path.exists(Project.path(project, user)):
             return "{success: false, error: 'Destination does not exist'}"
 
-        statuscode, statusmsg, statuslog, completion = Project.status(project,user)
+        if 'wait' in postdata:
+            #long polling, used by the web interface
+            statuscode, statusmsg, statuslog, completion = Project.waitforstatus(project, user, getintparameter('since', 0), getintparameter('statuscode'), getintparameter('wait', 0))
+            return json.dumps({'success':True, 'statuscode':statuscode,'statusmsg':statusmsg, 'statuslog': statuslog, 'completion': completion, 'offset': len(statuslog)})
+        statuscode, statusmsg, statuslog, completion = Project.status(project,user, getstatusloglimit())
         return json.dumps({'success':True, 'statuscode':statuscode,'statusmsg':statusmsg, 'statuslog': statuslog, 'completion': completion})
 
     @staticmethod
-    def inputindex(project, user, d = ''):
-        prefix = Project.path(project, user) + 'input/'
-        for f in glob.glob(prefix + d + "/*"):
-            if os.path.basename(f)[0] != '.': #always skip all hidden files
-                if os.path.isdir(f):
-                    for result in Project.inputindex(project, user, f[len(prefix):]):
-                        yield result
+    def waitforstatus(project, user, since=0, statuscode=None, wait=30):
+        """Waits at most wait seconds until the project has more than since status log entries, or until its status code differs from statuscode (the last one the client saw; if None: until it is no longer queued or running). Returns the same as Project.status()"""
+        wait = max(0, min(wait, MAXWAIT))
+        endtime = time.time() + wait
+        watcher = None
+        try:
+            while True:
+                currentcode, statusmsg, statuslog, completion = Project.status(project, user)
+                if statuscode is None:
+                    changed = currentcode not in (clam.common.status.RUNNING, clam.common.status.QUEUED)
+                else:
+                    changed = currentcode != statuscode
+                remaining = endtime - time.time()
+                if changed or len(statuslog) != since or remaining <= 0:
+                    return currentcode, statusmsg, statuslog, completion
+                if watcher is None:
+                    #start watching and check once more, so no changes in between are missed
+                    watcher = DirectoryWatcher(Project.path(project, user), ('.status',))
                 else:
-                    file = clam.common.data.CLAMInputFile(Project.path(project,user), f[len(prefix):])
-                    file.attachviewers(settings.PROFILES) #attaches converters as well
-                    yield file
+                    watcher.wait(min(remaining, 5)) #wake up periodically anyway, the process may have died without notice
+        finally:
+            if watcher is not None:
+                watcher.close()
 
+    @staticmethod
+    def statusstream(project, credentials=None):
+        """Stream status updates as Server-Sent Events, or, if the wait parameter is given, respond once there is an update (long polling). Status log entries are only sent if they are newer than the first since entries"""
+        user, oauth_access_token = parsecredentials(credentials) #pylint: disable=unused-variable
+        if not Project.exists(project, user):
+            return flask.make_response("Project " + project + " was not found for user " + user,404) #404
+        since = getintparameter('since', 0)
+        statuscode = getintparameter('statuscode')
+        if 'wait' in flask.request.values:
+            statuscode, statusmsg, statuslog, completion = Project.waitforstatus(project, user, since, statuscode, getintparameter('wait', 0))
+            offset = len(statuslog)
+            if since > offset: since = 0 #status log was started over
+            return withheaders(flask.make_response(json.dumps({'statuscode':statuscode,'statusmsg':statusmsg, 'statuslog': statuslog[:offset-since], 'completion': completion, 'offset': offset})), 'application/json', {'Cache-Control': 'no-cache'})
+
+        if 'Last-Event-ID' in flask.request.headers:
+            #reconnecting client
+            try:
+                since = int(flask.request.headers['Last-Event-ID'])
+            except ValueError:
+                pass
+
+        def stream(since, statuscode):
+            wait = 0 #send the current status right away
+            while True:
+                currentcode, statusmsg, statuslog, completion = Project.waitforstatus(project, user, since, statuscode, wait)
+                wait = STREAMKEEPALIVE
+                offset = len(statuslog)
+                if since > offset: since = 0 #status log was started over
+                if currentcode != statuscode or offset != since:
+                    yield "id: " + str(offset) + "\nevent: status\ndata: " + json.dumps({'statuscode':currentcode,'statusmsg':statusmsg, 'statuslog': statuslog[:offset-since], 'completion': completion, 'offset': offset}) + "\n\n"
+                    since = offset
+                    statuscode = currentcode
+                    if currentcode not in (clam.common.status.RUNNING, clam.common.status.QUEUED):
+                        break
+                else:
+                    yield ": keepalive\n\n"
+
+        return withheaders(flask.Response(stream(since, statuscode)), 'text/event-stream', {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
     @staticmethod
-    def outputindex(project, user, d = ''):
-        prefix = Project.path(project, user) + 'output/'
-        for f in glob.glob(prefix + d + "/*"):
+    def listfiles(project, credentials=None):
+        """Compact JSON listing of the input and/or output files of a project (files parameter), one page (offset, limit) at a time, optionally only those of a template or modified after since (unix time)"""
+        user, oauth_access_token = parsecredentials(credentials) #pylint: disable=unused-variable
+        if not Project.exists(project, user):
+            return flask.make_response("Project " + project + " was not found for user " + user,404) #404
+        listing = getlistingparameters()
+        statuscode = Project.simplestatus(project, user)
+        result = {'project': project, 'statuscode': statuscode}
+        for kind in Project.listedkinds(listing['files'], statuscode):
+            filenames, count = Project.filepage(project, user, kind, listing['template'], listing['since'], listing['offset'], listing['limit'])
+            prefix = Project.path(project, user) + kind + '/'
+            manifest = clam.common.data.InputManifest(Project.path(project, user)) if kind == 'input' else None
+            files = []
+            for filename in filenames:
+                files.append({'name': filename, 'template': listing['template'] or Project.filetemplate(project, user, kind, filename, manifest), 'size': os.path.getsize(prefix + filename), 'modified': os.path.getmtime(prefix + filename)})
+            result[kind] = {'count': count, 'offset': listing['offset'], 'limit': listing['limit'], 'files': files}
+        return withheaders(flask.make_response(json.dumps(result)), 'application/json', {'Cache-Control': 'no-cache'})
+
+    @staticmethod
+    def filenames(project, user, kind, d = ''):
+        """Yields the filenames (relative to the input or output directory, as per kind) of all files in the project, in sorted order, without reading any metadata"""
+        prefix = Project.path(project, user) + kind + '/'
+        for f in sorted(glob.glob(prefix + d + "/*")):
             if os.path.basename(f)[0] != '.': #always skip all hidden files
                 if os.path.isdir(f):
-                    for result in Project.outputindex(project, user, f[len(prefix):]):
+                    for result in Project.filenames(project, user, kind, f[len(prefix):]):
                         yield result
                 else:
-                    file = clam.common.data.CLAMOutputFile(Project.path(project,user), f[len(prefix):])
-                    file.attachviewers(settings.PROFILES) #attaches converters as well
-                    yield file
+                    yield f[len(prefix):]
+
+    @staticmethod
+    def inputindex(project, user, filenames=None):
+        for filename in (Project.filenames(project, user, 'input') if filenames is None else filenames):
+            file = clam.common.data.CLAMInputFile(Project.path(project,user), filename)
+            file.attachviewers(settings.PROFILES, templateindex) #attaches converters as well
+            yield file
+
+
+    @staticmethod
+    def outputindex(project, user, filenames=None):
+        for filename in (Project.filenames(project, user, 'output') if filenames is None else filenames):
+            file = clam.common.data.CLAMOutputFile(Project.path(project,user), filename)
+            file.attachviewers(settings.PROFILES, templateindex) #attaches converters as well
+            yield file
+
+    @staticmethod
+    def filetemplate(project, user, kind, filename, manifest=None):
+        """Returns the ID of the input or output template (as per kind) of a file, or None if unknown"""
+        if kind == 'input':
+            if manifest is None:
+                manifest = clam.common.data.InputManifest(Project.path(project, user))
+            for inputtemplate_id, seq in manifest.inputtemplates(filename): #pylint: disable=unused-variable
+                return inputtemplate_id
+        else:
+            metadata = clam.common.data.CLAMOutputFile(Project.path(project, user), filename).metadata
+            if metadata and metadata.provenance:
+                return metadata.provenance.outputtemplate_id
+        return None
+
+    @staticmethod
+    def filepage(project, user, kind, template=None, since=None, offset=0, limit=None):
+        """Returns one page (at most limit files, starting at offset) of the filenames of the input or output files (kind) of the project, restricted to the files of the specified template and/or those modified after since (unix time) if set, along with the total number of such files"""
+        filenames = Project.filenames(project, user, kind)
+        if since:
+            prefix = Project.path(project, user) + kind + '/'
+            filenames = ( filename for filename in filenames if os.path.getmtime(prefix + filename) > since )
+        if template:
+            manifest = clam.common.data.InputManifest(Project.path(project, user)) if kind == 'input' else None
+            filenames = ( filename for filename in filenames if Project.filetemplate(project, user, kind, filename, manifest) == template )
+        filenames = list(filenames)
+        return filenames[offset:offset+limit if limit else None], len(filenames)
+
+    @staticmethod
+    def listedkinds(files, statuscode):
+        """Returns the kinds of files (input/output) to list for the files parameter and the status of the project"""
+        kinds = []
+        if files in ('all','input') and statuscode in (clam.common.status.READY, clam.common.status.DONE):
+            kinds.append('input')
+        if files in ('all','output') and statuscode == clam.common.status.DONE:
+            kinds.append('output')
+        return kinds
 
     @staticmethod
     def inputindexbytemplate(project, user, inputtemplate):
         """Retrieve sorted index for the specified input template"""
-        index = [] #pylint: disable=redefined-outer-name
-        prefix = Project.path(project, user) + 'input/'
-        for linkf, f in globsymlinks(prefix + '.*.INPUTTEMPLATE.' + inputtemplate.id + '.*'):
-            seq = int(linkf.split('.')[-1])
-            index.append( (seq,f) )
-
         #yield CLAMFile objects in proper sequence
-        for seq, f in sorted(index):
-            yield seq, clam.common.data.CLAMInputFile(Project.path(project, user), f[len(prefix):])
+        for seq, f in clam.common.data.InputManifest(Project.path(project, user)).files(inputtemplate.id):
+            yield seq, clam.common.data.CLAMInputFile(Project.path(project, user), f)
 
 
     @staticmethod
@@ -871,27 +1083,31 @@ class Project:
         else:
             errors = "yes"
 
-        statuscode, statusmsg, statuslog, completion = Project.status(project, user)
+        statuscode, statusmsg, statuslog, completion = Project.status(project, user, getstatusloglimit())
 
         customhtml = ""
         if statuscode == clam.common.status.READY:
             customhtml = settings.CUSTOMHTML_PROJECTSTART
 
+        #the file listings are rendered lazily, and only the requested page of them (the datafile for the wrapper always lists all files)
+        listing = getlistingparameters() if not datafile else {'files': 'all', 'template': None, 'since': None, 'offset': 0, 'limit': None}
+        kinds = Project.listedkinds(listing['files'], statuscode)
         inputpaths = []
-        if statuscode == clam.common.status.READY or statuscode == clam.common.status.DONE:
-            inputpaths = Project.inputindex(project, user) #pylint: disable=redefined-variable-type
-
-
+        inputcount = outputcount = 0
+        if 'input' in kinds:
+            filenames, inputcount = Project.filepage(project, user, 'input', listing['template'], listing['since'], listing['offset'], listing['limit'])
+            inputpaths = Project.inputindex(project, user, filenames) #pylint: disable=redefined-variable-type
+        outputpaths = []
+        if 'output' in kinds:
+            filenames, outputcount = Project.filepage(project, user, 'output', listing['template'], listing['since'], listing['offset'], listing['limit'])
+            outputpaths = Project.outputindex(project, user, filenames) #pylint: disable=redefined-variable-type
 
         if statuscode == clam.common.status.DONE:
-            outputpaths = Project.outputindex(project, user)
             if Project.exitstatus(project, user) != 0: #non-zero codes indicate errors!
                 errors = "yes"
                 errormsg = "An error occurred within the system. Please inspect the error log for details"
                 printlog("Child process failed, exited with non zero-exit code.")
             customhtml = settings.CUSTOMHTML_PROJECTDONE
-        else:
-            outputpaths = [] #pylint: disable=redefined-variable-type
 
 
         for parametergroup, parameterlist in parameters: #pylint: disable=unused-variable
@@ -922,6 +1138,11 @@ class Project:
                 inputsources=settings.INPUTSOURCES,
                 outputpaths=outputpaths,
                 inputpaths=inputpaths,
+                listedkinds=kinds,
+                inputcount=inputcount,
+                outputcount=outputcount,
+                fileoffset=listing['offset'],
+                filelimit=listing['limit'],
                 profiles=settings.PROFILES,
                 matchedprofiles=matchedprofiles, #comma-separated list of indices (str)
                 program=program, #Program instance
@@ -962,7 +1183,7 @@ class Project:
             #if user and not Project.access(project, user) and not user in settings.ADMINS:
             #    return flask.make_response("Access denied to project " +  project + " for user " + user, 401) #401
             datafile = os.path.join(Project.path(project,credentials),'clam.xml')
-            statuscode, statusmsg, statuslog, completion = Project.status(project, user) #pylint: disable=unused-variable
+            statuscode = Project.simplestatus(project, user)
             if statuscode == clam.common.status.DONE and os.path.exists(datafile):
                 f = io.open(datafile,'r',encoding='utf-8')
                 xmldata = f.read(os.path.getsize(datafile))
@@ -1003,7 +1224,7 @@ class Project:
         #if user and not Project.access(project, user):
         #    return flask.make_response("Access denied to project " + project +  " for user " + user,401) #401
 
-        statuscode, _, _, _  = Project.status(project, user)
+        statuscode = Project.simplestatus(project, user)
         if statuscode != clam.common.status.READY:
             if oauth_access_token:
                 return flask.redirect(getrooturl() + '/' + project + '/?oauth_access_token=' + oauth_access_token)
@@ -1016,12 +1237,13 @@ class Project:
 
         errors, parameters, commandlineparams = clam.common.data.processparameters(postdata, settings.PARAMETERS)
 
-        sufresources, resmsg = sufficientresources()
+        #with a supervisor, jobs are queued until memory and load allow them to start, rather than refused
+        sufresources, resmsg = sufficientresources(not (settings.SUPERVISOR_SOCKET and not settings.REMOTEHOST))
         if not sufresources:
             printlog("*** NOT ENOUGH SYSTEM RESOURCES AVAILABLE: " + resmsg + " ***")
             return flask.make_response("There are not enough system resources available to accommodate your request. " + resmsg + " .Please try again later.",503)
         if not errors: #We don't even bother running the profiler if there are errors
-            matchedprofiles, program = clam.common.data.profiler(settings.PROFILES, Project.path(project, user), parameters, settings.SYSTEM_ID, settings.SYSTEM_NAME, getrooturl(), printdebug)
+            matchedprofiles, program = clam.common.data.profiler(settings.PROFILES, Project.path(project, user), parameters, settings.SYSTEM_ID, settings.SYSTEM_NAME, getrooturl(), printdebug, settings.OUTPUTMETADATA)
             #converted matched profiles to a list of indices
             matchedprofiles_byindex = []
             for i, profile in enumerate(settings.PROFILES):
@@ -1043,7 +1265,17 @@ class Project:
 
 
             #Start project with specified parameters
-            cmd = settings.COMMAND
+            tasks = None
+            if settings.PERFILECOMMAND:
+                tasks = program.tasks()
+                if tasks is None:
+                    printlog("Not all output files derive from a single input file, not running per file")
+            if tasks:
+                cmd = settings.PERFILECOMMAND
+                for variable in ('INPUTFILE','OUTPUTFILE','STATUSFILE'):
+                    cmd = cmd.replace('$' + variable, '%' + variable + '%') #filled in by the dispatcher for each task
+            else:
+                cmd = settings.COMMAND
             cmd = cmd.replace('$PARAMETERS', " ".join(commandlineparams)) #commandlineparams is shell-safe
             #if 'usecorpus' in postdata and postdata['usecorpus']:
             #    corpus = postdata['usecorpus'].replace('..','') #security
@@ -1063,47 +1295,195 @@ class Project:
             cmd = cmd.replace('$OAUTH_ACCESS_TOKEN',oauth_access_token)
             cmd = clam.common.data.escapeshelloperators(cmd)
             #everything should be shell-safe now
+            if tasks:
+                #the dispatcher runs the command for each input file, at most MAXPARALLEL at once
+                cmd = settings.DISPATCHER + " --perfile " + str(settings.MAXPARALLEL) + " " + Project.path(project, user) + " " + cmd
             cmd += " 2> " + Project.path(project, user) + "output/error.log" #add error output
 
-            pythonpath = ''
+            submitted = False
+            if settings.SUPERVISOR_SOCKET and not settings.REMOTEHOST:
+                try:
+                    submitted = Project.submit(project, user, cmd, not tasks)
+                except clam.clamsupervisor.SupervisorError as e:
+                    printlog("*** JOB REFUSED BY SUPERVISOR: " + str(e) + " ***")
+                    return flask.make_response("The system is too busy to accommodate your request: " + str(e) + ". Please try again later.",503)
+            if not submitted:
+                pythonpath = ''
+                try:
+                    pythonpath = ':'.join(settings.DISPATCHER_PYTHONPATH)
+                except AttributeError:
+                    pass
+                if pythonpath:
+                    pythonpath = os.path.dirname(settings.__file__) + ':' + pythonpath
+                else:
+                    pythonpath = os.path.dirname(settings.__file__)
+
+                #if settings.DISPATCHER == 'clamdispatcher' and os.path.exists(settings.CLAMDIR + '/' + settings.DISPATCHER + '.py') and stat.S_IXUSR & os.stat(settings.CLAMDIR + '/' + settings.DISPATCHER+'.py')[stat.ST_MODE]:
+                #    #backward compatibility for old configurations without setuptools
+                #    cmd = settings.CLAMDIR + '/' + settings.DISPATCHER + '.py'
+                #else:
+                cmd = settings.DISPATCHER + ' ' + pythonpath + ' ' + settingsmodule + ' ' + Project.path(project, user) + ' ' + cmd
+                if settings.REMOTEHOST:
+                    if settings.REMOTEUSER:
+                        cmd = "ssh -o NumberOfPasswordPrompts=0 " + settings.REMOTEUSER + "@" + settings.REMOTEHOST + " " + cmd
+                    else:
+                        cmd = "ssh -o NumberOfPasswordPrompts=0 " + settings.REMOTEHOST + " " + cmd
+                printlog("Starting dispatcher " +  settings.DISPATCHER + " with " + settings.COMMAND + ": " + repr(cmd) + " ..." )
+                #process = subprocess.Popen(cmd,cwd=Project.path(project), shell=True)
+                process = subprocess.Popen(cmd,cwd=settings.CLAMDIR, shell=True)
+                if process:
+                    pid = process.pid
+                    printlog("Started dispatcher with pid " + str(pid) )
+                    with open(Project.path(project, user) + '.pid','w') as f: #will be handled by dispatcher!
+                        f.write(str(pid))
+                    statestore.started(user, project, pid)
+                else:
+                    return flask.make_response("Unable to launch process",500)
+            if shortcutresponse is True:
+                #redirect to project page to lose parameters in URL
+                if oauth_access_token:
+                    return flask.redirect(getrooturl() + '/' + project + '/?oauth_access_token=' + oauth_access_token)
+                else:
+                    return flask.redirect(getrooturl() + '/' + project)
+            else:
+                #normal response (202)
+                return flask.make_response(Project.response(user, project, parameters,"",False,oauth_access_token,",".join([str(x) for x in matchedprofiles_byindex]), program),202) #returns 202 - Accepted
+
+    @staticmethod
+    def submit(project, user, cmd, useworker=True):
+        """Hand the job over to the supervisor (clamsupervisor), which writes the .pid (or .queued) file itself. Returns False if the supervisor could not be reached, raises clam.clamsupervisor.SupervisorError if it refused the job"""
+        worker = None
+        if settings.WORKER_FUNCTION and useworker:
+            #the supervisor runs the job in a warm worker if one is idle, and falls back to cmd otherwise
+            pythonpath = [os.path.dirname(settings.__file__)]
             try:
-                pythonpath = ':'.join(settings.DISPATCHER_PYTHONPATH)
+                pythonpath += list(settings.DISPATCHER_PYTHONPATH)
             except AttributeError:
                 pass
-            if pythonpath:
-                pythonpath = os.path.dirname(settings.__file__) + ':' + pythonpath
+            worker = {'function': settings.WORKER_FUNCTION, 'settings': settingsmodule, 'pythonpath': pythonpath, 'size': settings.WORKERS, 'maxjobs': settings.WORKER_MAXJOBS}
+        try:
+            reply = clam.clamsupervisor.submit(settings.SUPERVISOR_SOCKET, Project.path(project, user), clam.common.data.unescapeshelloperators(cmd), dict(os.environ), settings.DISPATCHER_MAXTIME, settings.DISPATCHER_MAXRESMEM, settings.DISPATCHER_POLLINTERVAL, settings.REQUIREMEMORY, settings.MAXLOADAVG, settings.PROJECTSTATE, worker)
+        except (socket.error, IOError, ValueError) as e:
+            printlog("Unable to submit job to supervisor at " + settings.SUPERVISOR_SOCKET + ", falling back to dispatcher: " + str(e))
+            return False
+        if reply.get('queued'):
+            printlog("Submitted job to supervisor, queued at position " + str(reply['position']))
+        else:
+            printlog("Submitted job to supervisor, running with pid " + str(reply['pid']))
+        return True
+
+    @staticmethod
+    def run(credentials=None): #pylint: disable=too-many-return-statements
+        """Process the input files and parameters of a single request in an ephemeral project and send back the output right away (POST /run).
+        Input files are passed like with the entry shortcut: uploaded files or contents in a field named after their input template, URLs in <inputtemplate>_url, and metadata parameters in <inputtemplate>_<parameter>.
+        A single output file is sent as is, several as an archive (or always an archive if a format is requested)"""
+        user, oauth_access_token = parsecredentials(credentials) #pylint: disable=unused-variable
+        rq = flask.request.values
+        if 'project' in rq:
+            return flask.make_response("The project parameter can not be used with run",403)
+        format = rq.get('format')
+        if format and (format not in ARCHIVEFORMATS or not clam.common.archive.supported(format)):
+            return flask.make_response('Invalid archive format',403)
+
+        project = 'run' + str("%032x" % random.getrandbits(128))
+        path = Project.path(project, user)
+        if settings.RUNDIR and not settings.REMOTEHOST:
+            #the project directory is a symlink to a directory in RUNDIR (a tmpfs), nothing ends up on disk
+            if not os.path.isdir(settings.ROOT + "projects/" + user):
+                os.makedirs(settings.ROOT + "projects/" + user)
+            os.symlink(tempfile.mkdtemp(prefix='clam.' + project + '.', dir=settings.RUNDIR), path[:-1])
+
+        def cleanup():
+            printdebug("Removing ephemeral project " + project)
+            if os.path.islink(path[:-1]):
+                target = os.readlink(path[:-1])
+                os.unlink(path[:-1])
+                shutil.rmtree(target, ignore_errors=True)
             else:
-                pythonpath = os.path.dirname(settings.__file__)
+                shutil.rmtree(path, ignore_errors=True)
+            statestore.delete(user, project)
 
-            #if settings.DISPATCHER == 'clamdispatcher' and os.path.exists(settings.CLAMDIR + '/' + settings.DISPATCHER + '.py') and stat.S_IXUSR & os.stat(settings.CLAMDIR + '/' + settings.DISPATCHER+'.py')[stat.ST_MODE]:
-            #    #backward compatibility for old configurations without setuptools
-            #    cmd = settings.CLAMDIR + '/' + settings.DISPATCHER + '.py'
-            #else:
-            cmd = settings.DISPATCHER + ' ' + pythonpath + ' ' + settingsmodule + ' ' + Project.path(project, user) + ' ' + cmd
-            if settings.REMOTEHOST:
-                if settings.REMOTEUSER:
-                    cmd = "ssh -o NumberOfPasswordPrompts=0 " + settings.REMOTEUSER + "@" + settings.REMOTEHOST + " " + cmd
-                else:
-                    cmd = "ssh -o NumberOfPasswordPrompts=0 " + settings.REMOTEHOST + " " + cmd
-            printlog("Starting dispatcher " +  settings.DISPATCHER + " with " + settings.COMMAND + ": " + repr(cmd) + " ..." )
-            #process = subprocess.Popen(cmd,cwd=Project.path(project), shell=True)
-            process = subprocess.Popen(cmd,cwd=settings.CLAMDIR, shell=True)
-            if process:
-                pid = process.pid
-                printlog("Started dispatcher with pid " + str(pid) )
-                with open(Project.path(project, user) + '.pid','w') as f: #will be handled by dispatcher!
-                    f.write(str(pid))
-                if shortcutresponse is True:
-                    #redirect to project page to lose parameters in URL
-                    if oauth_access_token:
-                        return flask.redirect(getrooturl() + '/' + project + '/?oauth_access_token=' + oauth_access_token)
-                    else:
-                        return flask.redirect(getrooturl() + '/' + project)
-                else:
-                    #normal response (202)
-                    return flask.make_response(Project.response(user, project, parameters,"",False,oauth_access_token,",".join([str(x) for x in matchedprofiles_byindex]), program),202) #returns 202 - Accepted
+        try:
+            response = Project.create(project, user)
+            if response is not None:
+                cleanup()
+                return response
+            printlog("Running ephemeral project " + project)
+
+            added = False
+            for profile in settings.PROFILES:
+                for inputtemplate in profile.input:
+                    data = {'inputtemplate': inputtemplate.id}
+                    for key, value in rq.items():
+                        if key.startswith(inputtemplate.id + '_') and key not in (inputtemplate.id+'_filename',inputtemplate.id+'_url'):
+                            data[key[len(inputtemplate.id+'_'):]] = value
+                    uploads = [ (os.path.basename(upload.filename), upload) for upload in flask.request.files.getlist(inputtemplate.id) ]
+                    filename = rq.get(inputtemplate.id + '_filename', inputtemplate.filename or '')
+                    if inputtemplate.id in rq:
+                        data['contents'] = rq[inputtemplate.id]
+                        uploads.append( (filename, None) )
+                    elif inputtemplate.id + '_url' in rq:
+                        data['url'] = rq[inputtemplate.id + '_url']
+                        uploads.append( (filename, None) )
+                    for filename, upload in uploads:
+                        addfileresult = addfile(project, filename, user, data, None, 'true_on_success', upload)
+                        if addfileresult is not True:
+                            cleanup()
+                            return addfileresult
+                        added = True
+            if not added:
+                cleanup()
+                return flask.make_response("No input files specified",403)
+
+            response = Project.start(project, credentials)
+            if response.status_code != 202:
+                cleanup()
+                return response
+
+            #the job may have to wait in the queue as well, so do not keep this worker (and the job) busy indefinitely
+            endtime = time.time() + settings.RUNTIMEOUT if settings.RUNTIMEOUT > 0 else None
+            interval = 0.05
+            while not Project.done(project, user):
+                if endtime is not None and time.time() >= endtime:
+                    printlog("Ephemeral project " + project + " did not finish within " + str(settings.RUNTIMEOUT) + "s, aborting")
+                    Project.abort(project, user)
+                    cleanup()
+                    return withheaders(flask.make_response("The system did not finish within " + str(settings.RUNTIMEOUT) + " seconds", 504), 'text/plain')
+                time.sleep(interval)
+                interval = min(interval * 2, 1)
+        except: #pylint: disable=bare-except
+            cleanup()
+            raise
+
+        if Project.exitstatus(project, user) != 0:
+            errors = ""
+            if os.path.exists(path + 'output/error.log'):
+                with io.open(path + 'output/error.log','r',encoding='utf-8',errors='replace') as f:
+                    errors = f.read()
+            cleanup()
+            return withheaders(flask.make_response("The system returned exit code " + str(Project.exitstatus(project, user)) + "\n" + errors, 500), 'text/plain')
+
+        outputfiles = [ outputfile for outputfile in Project.outputindex(project, user) if outputfile.filename != 'error.log' ]
+        if len(outputfiles) == 1 and not format:
+            outputfile = outputfiles[0]
+            if outputfile.metadata:
+                headers = outputfile.metadata.httpheaders()
+                mimetype = outputfile.metadata.mimetype
             else:
-                return flask.make_response("Unable to launch process",500)
+                headers = {}
+                mimetype = mimetypes.guess_type(str(outputfile))[0] or 'application/octet-stream'
+            headers['Content-Disposition'] = 'attachment; filename="' + os.path.basename(outputfile.filename) + '"'
+            response = sendfile(str(outputfile), mimetype, headers) #the file is opened, so it can be removed before it is sent
+        else:
+            if not format:
+                format = 'zip'
+            contenttype, contentencoding = ARCHIVEFORMATS[format]
+            extraheaders = {'Content-Disposition': 'attachment; filename="output.' + format + '"'}
+            if contentencoding:
+                extraheaders['Content-Encoding'] = contentencoding
+            response = withheaders(flask.Response( clam.common.archive.stream(path + 'output/', format) ), contenttype, extraheaders )
+        response.call_on_close(cleanup)
+        return response
 
     @staticmethod
     def delete(project, credentials=None):
@@ -1115,18 +1495,18 @@ class Project:
         user, oauth_access_token = parsecredentials(credentials) #pylint: disable=unused-variable
         if not Project.exists(project, user):
             return flask.make_response("No such project: " + project + " for user " + user,404)
-        statuscode, _, _, _  = Project.status(project, user)
+        statuscode = Project.simplestatus(project, user)
         msg = ""
-        if statuscode == clam.common.status.RUNNING:
+        if statuscode in (clam.common.status.RUNNING, clam.common.status.QUEUED):
             Project.abort(project, user)
             msg = "Aborted"
         if not abortonly:
             printlog("Deleting project '" + project + "'" )
             shutil.rmtree(Project.path(project, user))
+            statestore.delete(user, project)
+            clam.common.archive.invalidate(Project.path(project, user))
             msg += " Deleted"
         msg = msg.strip()
-        if os.path.exists(os.path.join(settings.ROOT + "projects/" + user,'.index')):
-            os.unlink(os.path.join(settings.ROOT + "projects/" + user,'.index'))
         return withheaders(flask.make_response(msg),'text/plain',{'Content-Length':len(msg)})  #200
 
 
@@ -1145,6 +1525,11 @@ class Project:
         user, _ = parsecredentials(credentials)
         return Project.getarchive(project, user,'tar.bz2')
 
+    @staticmethod
+    def download_tarxz(project, credentials=None):
+        user, _ = parsecredentials(credentials)
+        return Project.getarchive(project, user,'tar.xz')
+
     @staticmethod
     def getoutputfile(project, filename, credentials=None): #pylint: disable=too-many-return-statements
         user, oauth_access_token = parsecredentials(credentials) #pylint: disable=unused-variable
@@ -1177,7 +1562,7 @@ class Project:
                     return flask.make_response("No metadata found!",404)
             else:
                 #attach viewer data (also attaches converters!
-                outputfile.attachviewers(settings.PROFILES)
+                outputfile.attachviewers(settings.PROFILES, templateindex)
 
                 viewer = None
                 for v in outputfile.viewers:
@@ -1219,12 +1604,8 @@ class Project:
                 if not mimetype: mimetype = 'application/octet-stream'
             printdebug("Returning output file " + str(outputfile) + " with mimetype " + mimetype)
             try:
-                return withheaders(flask.Response( (line for line in outputfile) ), mimetype, headers )
-            except UnicodeError:
-                return flask.make_response("Output file " + str(outputfile) + " is not in the expected encoding! Make sure encodings for output templates service configuration file are accurate.",500)
-            except FileNotFoundError:
-                raise flask.abort(404)
-            except IOError:
+                return sendfile(str(outputfile), mimetype, headers)
+            except (IOError, OSError):
                 raise flask.abort(404)
 
     @staticmethod
@@ -1245,7 +1626,10 @@ class Project:
             return withheaders(flask.make_response(msg), 'text/plain',{'Content-Length':len(msg)}) #200
         elif os.path.isdir(Project.path(project, user) + filename):
             #Deleting specified directory
+            removedsize = computediskusage(Project.path(project, user) + filename)
             shutil.rmtree(Project.path(project, user) + filename)
+            statestore.adddiskusage(user, project, -removedsize)
+            clam.common.archive.invalidate(Project.path(project, user))
             msg = "Deleted"
             return withheaders(flask.make_response(msg), 'text/plain',{'Content-Length':len(msg)}) #200
         else:
@@ -1254,10 +1638,13 @@ class Project:
             except:
                 raise flask.abort(404)
 
+            removedsize = Project.filediskusage(file)
             success = file.delete()
             if not success:
                 raise flask.abort(404)
             else:
+                statestore.adddiskusage(user, project, -removedsize)
+                clam.common.archive.invalidate(Project.path(project, user))
                 msg = "Deleted"
                 return withheaders(flask.make_response(msg), 'text/plain',{'Content-Length':len(msg)}) #200
 
@@ -1267,79 +1654,50 @@ class Project:
         """Reset system, delete all output files and prepare for a new run"""
         d = Project.path(project, user) + "output"
         if os.path.isdir(d):
+            statestore.adddiskusage(user, project, -computediskusage(d))
             shutil.rmtree(d)
             os.makedirs(d)
+            clam.common.archive.invalidate(Project.path(project, user))
         else:
             raise flask.abort(404)
-        if os.path.exists(Project.path(project, user) + ".done"):
-            os.unlink(Project.path(project, user) + ".done")
-        if os.path.exists(Project.path(project, user) + ".status"):
-            os.unlink(Project.path(project, user) + ".status")
+        for statefile in (".done", ".aborted", ".status"):
+            if os.path.exists(Project.path(project, user) + statefile):
+                os.unlink(Project.path(project, user) + statefile)
+        statestore.reset(user, project)
 
     @staticmethod
     def getarchive(project, user, format=None):
-        """Generates and returns a download package (or 403 if one is already in the process of being prepared)"""
-        if os.path.isfile(Project.path(project, user) + '.download'):
-            #make sure we don't start two compression processes at the same time
-            return flask.make_response('Another compression is already running',403)
-        else:
-            if not format:
-                data = flask.request.values
-                if 'format' in data:
-                    format = data['format']
-                else:
-                    format = 'zip' #default
-
-            #validation, security
-            contentencoding = None
-            if format == 'zip':
-                contenttype = 'application/zip'
-                command = "/usr/bin/zip -r" #TODO: do not hard-code path!
-                if os.path.isfile(Project.path(project, user) + "output/" + project + ".tar.gz"):
-                    os.unlink(Project.path(project, user) + "output/" + project + ".tar.gz")
-                if os.path.isfile(Project.path(project, user) + "output/" + project + ".tar.bz2"):
-                    os.unlink(Project.path(project, user) + "output/" + project + ".tar.bz2")
-            elif format == 'tar.gz':
-                contenttype = 'application/x-tar'
-                contentencoding = 'gzip'
-                command = "/bin/tar -czf"
-                if os.path.isfile(Project.path(project, user) + "output/" + project + ".zip"):
-                    os.unlink(Project.path(project, user) + "output/" + project + ".zip")
-                if os.path.isfile(Project.path(project, user) + "output/" + project + ".tar.bz2"):
-                    os.unlink(Project.path(project, user) + "output/" + project + ".tar.bz2")
-            elif format == 'tar.bz2':
-                contenttype = 'application/x-bzip2'
-                command = "/bin/tar -cjf"
-                if os.path.isfile(Project.path(project, user) + "output/" + project + ".tar.gz"):
-                    os.unlink(Project.path(project, user) + "output/" + project + ".tar.gz")
-                if os.path.isfile(Project.path(project, user) + "output/" + project + ".zip"):
-                    os.unlink(Project.path(project, user) + "output/" + project + ".zip")
+        """Streams all output files as a single archive, built on the fly while it is being sent"""
+        if not format:
+            data = flask.request.values
+            if 'format' in data:
+                format = data['format']
             else:
-                return flask.make_response('Invalid archive format',403) #TODO: message won't show
-
-            path = Project.path(project, user) + "output/" + project + "." + format
-
-            if not os.path.isfile(path):
-                printlog("Building download archive in " + format + " format")
-                cmd = command + ' ' + project + '.' + format + ' *'
-                printdebug(cmd)
-                printdebug(Project.path(project, user)+'output/')
-                process = subprocess.Popen(cmd, cwd=Project.path(project, user)+'output/', shell=True)
-                if not process:
-                    flask.make_response("Unable to make download package",500)
-                else:
-                    pid = process.pid
-                    f = open(Project.path(project, user) + '.download','w')
-                    f.write(str(pid))
-                    f.close()
-                    os.waitpid(pid, 0) #wait for process to finish
-                    os.unlink(Project.path(project, user) + '.download')
+                format = 'zip' #default
 
-            extraheaders = {}
-            if contentencoding:
-                extraheaders['Content-Encoding'] = contentencoding
+        #validation, security
+        if format not in ARCHIVEFORMATS or not clam.common.archive.supported(format):
+            return flask.make_response('Invalid archive format',403) #TODO: message won't show
+        contenttype, contentencoding = ARCHIVEFORMATS[format]
+
+        extraheaders = {'Content-Disposition': 'attachment; filename="' + project + '.' + format + '"'}
+        if contentencoding:
+            extraheaders['Content-Encoding'] = contentencoding
+
+        exclude = [ project + '.' + f for f in ARCHIVEFORMATS ] #archives that older versions left in the output directory
+        if archivecache:
+            try:
+                path = archivecache.get(Project.path(project, user), format, exclude)
+                f = io.open(path,'rb') #opened right away, the archive may be evicted while it is being sent
+            except (IOError, OSError) as e:
+                printlog("Unable to cache download archive, streaming it instead: " + str(e))
+            else:
+                printlog("Sending cached download archive in " + format + " format")
+                extraheaders['Content-Length'] = os.fstat(f.fileno()).st_size
+                return withheaders(flask.Response( getbinarydata(f) ), contenttype, extraheaders )
 
-            return withheaders(flask.Response( getbinarydata(path) ), contenttype, extraheaders )
+        printlog("Streaming download archive in " + format + " format")
+        return withheaders(flask.Response( clam.common.archive.stream(Project.path(project, user) + 'output/', format, exclude) ), contenttype, extraheaders )
 
 
     @staticmethod
@@ -1388,14 +1746,10 @@ class Project:
                 headers = {}
                 mimetype = mimetypes.guess_type(str(inputfile))[0]
                 if not mimetype: mimetype = 'application/octet-stream'
+            printdebug("Returning input file " + str(inputfile) + " with mimetype " + mimetype)
             try:
-                printdebug("Returning input file " + str(inputfile) + " with mimetype " + mimetype)
-                return withheaders(flask.Response( (line for line in inputfile) ), mimetype, headers )
-            except UnicodeError:
-                return flask.make_response("Input file " + str(inputfile) + " is not in the expected encoding! Make sure encodings for output templates service configuration file are accurate.",500)
-            except FileNotFoundError:
-                raise flask.abort(404)
-            except IOError:
+                return sendfile(str(inputfile), mimetype, headers)
+            except (IOError, OSError):
                 raise flask.abort(404)
 
     @staticmethod
@@ -1407,12 +1761,17 @@ class Project:
 
         if len(filename) == 0:
             #Deleting all input files
+            removedsize = computediskusage(Project.path(project, user) + 'input')
             shutil.rmtree(Project.path(project, user) + 'input')
             os.makedirs(Project.path(project, user) + 'input') #re-add new input directory
+            statestore.adddiskusage(user, project, -removedsize)
             return "Deleted" #200
         elif os.path.isdir(Project.path(project, user) + filename):
             #Deleting specified directory
+            removedsize = computediskusage(Project.path(project, user) + filename)
             shutil.rmtree(Project.path(project, user) + filename)
+            clam.common.data.InputManifest.remove(Project.path(project, user), os.path.relpath(Project.path(project, user) + filename, Project.path(project, user) + 'input'), True)
+            statestore.adddiskusage(user, project, -removedsize)
             return "Deleted" #200
         else:
             try:
@@ -1420,10 +1779,12 @@ class Project:
             except:
                 raise flask.abort(404)
 
+            removedsize = Project.filediskusage(file)
             success = file.delete()
             if not success:
                 raise flask.abort(404)
             else:
+                statestore.adddiskusage(user, project, -removedsize)
                 msg = "Deleted"
                 return withheaders(flask.make_response(msg),'text/plain', {'Content-Length': len(msg)}) #200
 
@@ -1498,8 +1859,8 @@ class Project:
 
 
 
-def addfile(project, filename, user, postdata, inputsource=None,returntype='xml'): #pylint: disable=too-many-return-statements
-    """Add a new input file, this invokes the actual uploader"""
+def addfile(project, filename, user, postdata, inputsource=None,returntype='xml', upload=None): #pylint: disable=too-many-return-statements
+    """Add a new input file, this invokes the actual uploader. The uploaded file is taken from the ``file`` field of the request unless another one (a werkzeug FileStorage) is passed as ``upload``"""
 
 
     def errorresponse(msg, code=403):
@@ -1511,6 +1872,8 @@ def addfile(project, filename, user, postdata, inputsource=None,returntype='xml'
     inputtemplate_id = flask.request.headers.get('Inputtemplate','')
     inputtemplate = None
     metadata = None
+    if upload is None and 'file' in flask.request.files:
+        upload = flask.request.files['file']
 
 
     printdebug('Handling addfile, postdata contains fields ' + ",".join(postdata.keys()) )
@@ -1626,9 +1989,9 @@ def addfile(project, filename, user, postdata, inputsource=None,returntype='xml'
     printdebug("(Obtaining filename for uploaded file)")
     head = "<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
     head += "<clamupload>\n"
-    if 'file' in flask.request.files:
-        printlog("Adding client-side file " + flask.request.files['file'].filename + " to input files")
-        sourcefile = flask.request.files['file'].filename
+    if upload is not None:
+        printlog("Adding client-side file " + upload.filename + " to input files")
+        sourcefile = upload.filename
     elif 'url' in postdata and postdata['url']:
         #Download from URL
         printlog("Adding web-based URL " + postdata['url'] + " to input files")
@@ -1723,7 +2086,7 @@ def addfile(project, filename, user, postdata, inputsource=None,returntype='xml'
         printdebug('(Archive test)')
         # -------- Are we an archive? If so, determine what kind
         archivetype = None
-        if 'file' in flask.request.files:
+        if upload is not None:
             uploadname = sourcefile.lower()
             archivetype = None
             if uploadname[-4:] == '.zip':
@@ -1758,7 +2121,7 @@ def addfile(project, filename, user, postdata, inputsource=None,returntype='xml'
             #Upload file from client to server
             printdebug('(Archive transfer starting)')
             if not xhrpost:
-                flask.request.files['file'].save(Project.path(project,user) + archive)
+                upload.save(Project.path(project,user) + archive)
             elif xhrpost:
                 with open(Project.path(project,user) + archive,'wb') as f:
                     while True:
@@ -1849,10 +2212,10 @@ def addfile(project, filename, user, postdata, inputsource=None,returntype='xml'
             if not archive:
                 #============================ Transfer file ========================================
                 printdebug('(Start file transfer: ' +  Project.path(project, user) + 'input/' + filename+' )')
-                if 'file' in flask.request.files:
+                if upload is not None:
                     printdebug('(Receiving data by uploading file)')
                     #Upload file from client to server
-                    flask.request.files['file'].save(Project.path(project, user) + 'input/' + filename)
+                    upload.save(Project.path(project, user) + 'input/' + filename)
                 elif 'url' in postdata and postdata['url']:
                     printdebug('(Receiving data via url)')
                     #Download file from 3rd party server to CLAM server
@@ -1977,6 +2340,8 @@ def addfile(project, filename, user, postdata, inputsource=None,returntype='xml'
                         if linkfilename: linkfilename += '/'
                         linkfilename += '.' + os.path.basename(filename) + '.INPUTTEMPLATE' + '.' + inputtemplate.id + '.' + str(nextseq)
                         os.symlink(Project.path(project, user) + 'input/' + filename, Project.path(project, user) + 'input/' + linkfilename)
+                        #and register it in the input manifest
+                        clam.common.data.InputManifest.add(Project.path(project, user), inputtemplate.id, nextseq, filename, hashlib.sha1(metadata.xml().encode('utf-8')).hexdigest())
                     else:
                         printdebug('(Validation error)')
                         #Too bad, everything worked out but the file itself doesn't validate.
@@ -1992,6 +2357,12 @@ def addfile(project, filename, user, postdata, inputsource=None,returntype='xml'
 
     output += "</clamupload>"
 
+    #account for the disk space taken by the files that were added (and their metadata)
+    addedsize = 0
+    for f in addedfiles:
+        addedsize += filesize(Project.path(project, user) + 'input/' + f) + filesize(Project.path(project, user) + 'input/' + os.path.join(os.path.dirname(f), '.' + os.path.basename(f) + '.METADATA'))
+    statestore.adddiskusage(user, project, addedsize / 1024 / 1024)
+
 
 
     if returntype == 'boolean':
@@ -2034,7 +2405,7 @@ def interfacedata(): #no auth
                 inputtemplates_mem.append(inputtemplate)
                 inputtemplates.append( inputtemplate.json() )
 
-    return withheaders(flask.make_response("systemid = '"+ settings.SYSTEM_ID + "'; baseurl = '" + getrooturl() + "';\n inputtemplates = [ " + ",".join(inputtemplates) + " ];"), 'text/javascript')
+    return withheaders(flask.make_response("systemid = '"+ settings.SYSTEM_ID + "'; baseurl = '" + getrooturl() + "'; pollwait = " + str(int(settings.INTERFACE_POLLWAIT)) + ";\n inputtemplates = [ " + ",".join(inputtemplates) + " ];"), 'text/javascript')
 
 def foliaxsl():
     if foliatools is not None:
@@ -2080,7 +2451,7 @@ class ActionHandler(object):
     @staticmethod
     def find_action( actionid, method):
         for action in settings.ACTIONS:
-            if action.id == actionid and (not action.method or method == action.method):
+            if action.id == actionid and (not action.method or not method or method == action.method):
                 return action
         raise Exception("No such action: " + actionid)
 
@@ -2105,7 +2476,121 @@ class ActionHandler(object):
 
 
     @staticmethod
-    def do( actionid, method, user="anonymous", oauth_access_token=""): #pylint: disable=too-many-return-statements
+    def cachekey(action, user): #not a view
+        """Returns the key under which the result of an action with cache=True is cached, for the parameters of the current request. Raises ParameterError"""
+        parameters = sorted( (paramid, "%s" % (value,)) for _, value, paramid in ActionHandler.collect_parameters(action) )
+        if action.command and ('$USERNAME' in action.command or '$OAUTH_ACCESS_TOKEN' in action.command):
+            scope = user #the result depends on the user
+        else:
+            scope = None
+        return hashlib.sha1(json.dumps([action.id, scope, parameters]).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def getcached(key): #not a view
+        """Returns the cached result (expiry time, status, mimetype, etag, body) for the key, or None"""
+        result = actioncache.get(key)
+        if result is None and settings.ACTIONCACHE_SHARED:
+            try:
+                with open(os.path.join(settings.SESSIONDIR, 'actioncache', key),'rb') as f:
+                    expires, status, mimetype, etag = json.loads(f.readline().decode('utf-8'))
+                    result = (expires, status, mimetype, etag, f.read())
+                os.utime(os.path.join(settings.SESSIONDIR, 'actioncache', key), None) #recently used, see evictcached()
+            except (IOError, OSError, ValueError):
+                return None
+        if result is not None and result[0] and result[0] < time.time():
+            actioncache.pop(key)
+            if settings.ACTIONCACHE_SHARED:
+                try:
+                    os.unlink(os.path.join(settings.SESSIONDIR, 'actioncache', key))
+                except OSError:
+                    pass
+            return None
+        if result is not None:
+            actioncache.set(key, result)
+        return result
+
+    @staticmethod
+    def evictcached(cachedir): #not a view
+        """Removes expired results from the shared cache on disk, and the least recently used ones beyond ACTIONCACHE_SIZE"""
+        now = time.time()
+        entries = []
+        for name in os.listdir(cachedir):
+            filename = os.path.join(cachedir, name)
+            try:
+                if name[0] == '.': #being written, or left behind by a process that died while writing it
+                    if os.path.getmtime(filename) < now - 3600:
+                        os.unlink(filename)
+                    continue
+                with open(filename,'rb') as f:
+                    expires = json.loads(f.readline().decode('utf-8'))[0]
+                if expires and expires < now:
+                    os.unlink(filename)
+                else:
+                    entries.append( (os.path.getmtime(filename), filename) )
+            except (IOError, OSError, ValueError):
+                pass
+        entries.sort()
+        for _, filename in entries[:max(0, len(entries) - settings.ACTIONCACHE_SIZE)]:
+            try:
+                os.unlink(filename)
+            except OSError:
+                pass
+
+    @staticmethod
+    def setcached(key, result): #not a view
+        global actioncachesweep #pylint: disable=global-statement
+        actioncache.set(key, result)
+        if settings.ACTIONCACHE_SHARED:
+            expires, status, mimetype, etag, body = result
+            cachedir = os.path.join(settings.SESSIONDIR, 'actioncache')
+            try:
+                if not os.path.isdir(cachedir):
+                    os.makedirs(cachedir)
+                tmpfile = os.path.join(cachedir, '.' + key + '.' + str(os.getpid()))
+                with open(tmpfile,'wb') as f:
+                    f.write(json.dumps([expires, status, mimetype, etag]).encode('utf-8') + b"\n")
+                    f.write(body)
+                os.rename(tmpfile, os.path.join(cachedir, key)) #atomic, other workers never see a partial result
+            except (IOError, OSError) as e:
+                printlog("Unable to store action result in the shared cache: " + str(e))
+            if time.time() - actioncachesweep >= ACTIONCACHESWEEPINTERVAL:
+                actioncachesweep = time.time()
+                try:
+                    ActionHandler.evictcached(cachedir)
+                except OSError as e:
+                    printlog("Unable to evict results from the shared action cache: " + str(e))
+
+    @staticmethod
+    def do( actionid, method, user="anonymous", oauth_access_token=""):
+        """Performs the action, or returns its cached result if the action has cache=True and was performed with the same parameters before"""
+        try:
+            action = ActionHandler.find_action(actionid, 'GET')
+        except: #pylint: disable=bare-except
+            return flask.make_response("Action does not exist",404)
+        if not action.cache or action.stream or action.asynchronous:
+            return ActionHandler.execute(actionid, method, user, oauth_access_token)
+
+        try:
+            key = ActionHandler.cachekey(action, user)
+        except clam.common.data.ParameterError as e:
+            return flask.make_response(str(e),403)
+        result = ActionHandler.getcached(key)
+        if result is not None:
+            printdebug("Returning cached result for action " + actionid)
+            _, status, mimetype, etag, body = result
+            response = withheaders(flask.make_response(body, status), mimetype)
+        else:
+            response = ActionHandler.execute(actionid, method, user, oauth_access_token)
+            if response.status_code not in (200, 403, 404) or response.is_streamed:
+                return response
+            body = response.get_data()
+            etag = hashlib.sha1(body).hexdigest()
+            ActionHandler.setcached(key, (time.time() + action.cachettl if action.cachettl else 0, response.status_code, response.mimetype, etag, body))
+        response.set_etag(etag)
+        return response.make_conditional(flask.request) #304 if the client has this result already
+
+    @staticmethod
+    def execute( actionid, method, user="anonymous", oauth_access_token=""): #pylint: disable=too-many-return-statements
         try:
             printdebug("Looking for action " + actionid)
             action = ActionHandler.find_action(actionid, 'GET')
@@ -2187,9 +2672,17 @@ class ActionHandler(object):
                     cmd = "ssh -o NumberOfPasswordPrompts=0 " + settings.REMOTEUSER + "@" + settings.REMOTEHOST + " " + cmd
                 else:
                     cmd = "ssh -o NumberOfPasswordPrompts=0 " + settings.REMOTEHOST + " " + cmd
+            if action.asynchronous:
+                return ActionHandler.launch(action, cmd, passcwd, tmpdir, user)
             printlog("Starting dispatcher " +  settings.DISPATCHER + " for action " + actionid + " with " + action.command + ": " + repr(cmd) + " ..." )
             if sys.version[0] == '2' and isinstance(cmd,unicode): #pylint: disable=undefined-variable
                 cmd = cmd.encode('utf-8')
+            if action.stream:
+                #the output is forwarded as it is produced, the error output goes to a temporary file so the process can not block on it
+                errfile = tempfile.TemporaryFile()
+                process = subprocess.Popen(cmd,cwd=passcwd, shell=True, stdout=subprocess.PIPE, stderr=errfile, preexec_fn=os.setsid)
+                printlog("Streaming output of dispatcher (pid " + str(process.pid) + ")" )
+                return withheaders(flask.Response(ActionHandler.streamoutput(action, process, errfile, tmpdir)), action.mimetype)
             process = subprocess.Popen(cmd,cwd=passcwd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
             if process:
                 printlog("Waiting for dispatcher (pid " + str(process.pid) + ") to finish" )
@@ -2223,7 +2716,22 @@ class ActionHandler(object):
         elif action.function:
             actionargs = [ x[1] for x in  ActionHandler.collect_parameters(action) ]
             try:
-                r = action.function(*actionargs) #200
+                if action.executor:
+                    function = action.function
+                    if action.executor == 'thread':
+                        function = flask.copy_current_request_context(function) #so the function can still access the request
+                    try:
+                        future = actionpools[action.executor].submit(function, actionargs, action.id, action.maxconcurrency)
+                    except clam.common.executor.Saturated as e:
+                        printlog("Refusing action " + actionid + ": " + str(e))
+                        return withheaders(flask.make_response("The system is too busy to accommodate your request, please try again later",503), 'text/plain', {'Retry-After': int(action.timeout) if action.timeout else 5})
+                    try:
+                        r = future.result(action.timeout if action.timeout else None) #200
+                    except clam.common.executor.TimeoutError:
+                        printlog("Action " + actionid + " timed out after " + str(action.timeout) + "s")
+                        return flask.make_response("Action " + actionid + " did not finish within " + str(action.timeout) + " seconds",504)
+                else:
+                    r = action.function(*actionargs) #200
             except Exception as e: #pylint: disable=broad-except
                 if isinstance(e, werkzeug.exceptions.HTTPException):
                     raise
@@ -2240,13 +2748,146 @@ class ActionHandler(object):
         else:
             raise Exception("No command or function defined for action " + actionid)
 
+    @staticmethod
+    def streamoutput(action, process, errfile, tmpdir): #not a view
+        """Yields the output of the process of a streaming action as it is produced, the process is killed if the client goes away. Its error output is in errfile (a temporary file)"""
+        try:
+            while True:
+                data = os.read(process.stdout.fileno(), 64*1024)
+                if not data:
+                    break
+                yield data
+            process.wait()
+            printlog("Dispatcher for action " + action.id + " finished with code " + str(process.returncode) )
+            if process.returncode not in action.returncodes200:
+                errfile.seek(0)
+                printlog("Action " + action.id + " failed: " + errfile.read().decode('utf-8','replace'))
+        finally:
+            if process.poll() is None:
+                printlog("Client went away, killing dispatcher for action " + action.id)
+                try:
+                    os.killpg(process.pid, signal.SIGTERM)
+                except OSError:
+                    pass
+                process.wait()
+            if tmpdir:
+                shutil.rmtree(tmpdir, ignore_errors=True)
+            process.stdout.close()
+            errfile.close()
+
+    @staticmethod
+    def jobpath(jobid): #not a view
+        return os.path.join(settings.SESSIONDIR, 'ajob.' + jobid) + '/'
+
+    @staticmethod
+    def launch(action, cmd, cwd, tmpdir, user): #not a view
+        """Start an asynchronous action in the background, returns 202 with the URL of the job (where the result can be retrieved from, and which can be deleted to cancel it)"""
+        ActionHandler.expirejobs()
+        jobid = str("%032x" % random.getrandbits(128))
+        jobdir = ActionHandler.jobpath(jobid)
+        os.mkdir(jobdir)
+        with io.open(jobdir + 'job.json','w',encoding='utf-8') as f:
+            f.write(json.dumps({'action': action.id, 'user': user, 'tmpdir': tmpdir}))
+        #the shell records the exit code itself, so the result does not depend on this (web server) process staying around
+        cmd = "(" + cmd + ") > " + jobdir + "stdout 2> " + jobdir + "stderr; echo $? > " + jobdir + "returncode.tmp; mv " + jobdir + "returncode.tmp " + jobdir + "returncode"
+        printlog("Starting dispatcher " +  settings.DISPATCHER + " for asynchronous action " + action.id + ", job " + jobid + ": " + repr(cmd) + " ..." )
+        if sys.version[0] == '2' and isinstance(cmd,unicode): #pylint: disable=undefined-variable
+            cmd = cmd.encode('utf-8')
+        process = subprocess.Popen(cmd, cwd=cwd, shell=True, preexec_fn=os.setsid, close_fds=True)
+        with open(jobdir + 'pid','w') as f:
+            f.write(str(process.pid))
+        threading.Thread(target=process.wait).start() #reaps the process
+        url = getrooturl() + '/actions/' + action.id + '/jobs/' + jobid + '/'
+        return withheaders(flask.make_response(url, 202), 'text/plain', {'Location': url})
+
+    @staticmethod
+    def expirejobs(): #not a view
+        """Remove asynchronous action jobs that finished more than ACTIONJOBEXPIRY seconds ago and were never deleted"""
+        for returncodefile in glob.glob(os.path.join(settings.SESSIONDIR, 'ajob.*', 'returncode')):
+            try:
+                if time.time() - os.path.getmtime(returncodefile) > settings.ACTIONJOBEXPIRY:
+                    ActionHandler.removejob(os.path.dirname(returncodefile) + '/')
+            except (IOError, OSError):
+                pass
+
+    @staticmethod
+    def removejob(jobdir): #not a view
+        with io.open(jobdir + 'job.json','r',encoding='utf-8') as f:
+            job = json.load(f)
+        if job['tmpdir']:
+            shutil.rmtree(job['tmpdir'], ignore_errors=True)
+        shutil.rmtree(jobdir, ignore_errors=True)
+
+    @staticmethod
+    def getjob(actionid, jobid, credentials=None): #not a view
+        """Returns the action, directory and description of a job, or a response if it is not accessible"""
+        try:
+            action = ActionHandler.find_action(actionid, None)
+        except: #pylint: disable=bare-except
+            return flask.make_response("Action does not exist",404)
+        if action.allowanonymous:
+            user = "anonymous"
+        else:
+            user, _ = parsecredentials(credentials)
+        jobdir = ActionHandler.jobpath(jobid)
+        if not re.match(r'^\w+$', jobid) or not os.path.exists(jobdir + 'job.json'):
+            return flask.make_response("Job does not exist",404)
+        with io.open(jobdir + 'job.json','r',encoding='utf-8') as f:
+            job = json.load(f)
+        if job['action'] != action.id:
+            return flask.make_response("Job does not exist",404)
+        if job['user'] != user:
+            return flask.make_response("Access denied to job " + jobid + " for user " + user,403)
+        return action, jobdir, job
+
+    @staticmethod
+    def GETJOB(actionid, jobid, credentials=None):
+        """Returns the result of an asynchronous action, or 202 if it is still running"""
+        job = ActionHandler.getjob(actionid, jobid, credentials)
+        if not isinstance(job, tuple):
+            return job
+        action, jobdir, _ = job
+        if not os.path.exists(jobdir + 'returncode'):
+            return withheaders(flask.make_response("Running", 202), 'text/plain', {'Retry-After': 1})
+        with open(jobdir + 'returncode','r') as f:
+            returncode = int(f.read().strip())
+        if returncode in action.returncodes200:
+            return sendfile(jobdir + 'stdout', action.mimetype) #200
+        elif returncode in action.returncodes403:
+            return withheaders(flask.make_response(getbinarydata(io.open(jobdir + 'stdout','rb')), 403), action.mimetype)
+        elif returncode in action.returncodes404:
+            return withheaders(flask.make_response(getbinarydata(io.open(jobdir + 'stdout','rb')), 404), action.mimetype)
+        else:
+            with io.open(jobdir + 'stderr','r',encoding='utf-8',errors='replace') as f:
+                return flask.make_response("Process for action " + actionid + " failed\n" + f.read(),500)
+
+    @staticmethod
+    def DELETEJOB(actionid, jobid, credentials=None):
+        """Cancels an asynchronous action if it is still running, and removes the job and its result"""
+        job = ActionHandler.getjob(actionid, jobid, credentials)
+        if not isinstance(job, tuple):
+            return job
+        _, jobdir, _ = job
+        msg = "Deleted"
+        if not os.path.exists(jobdir + 'returncode'):
+            with open(jobdir + 'pid','r') as f:
+                pid = int(f.read().strip())
+            printlog("Cancelling asynchronous action " + actionid + ", job " + jobid)
+            try:
+                os.killpg(pid, signal.SIGTERM)
+            except OSError:
+                pass
+            msg = "Cancelled"
+        ActionHandler.removejob(jobdir)
+        return withheaders(flask.make_response(msg),'text/plain',{'Content-Length':len(msg)})  #200
+
     @staticmethod
     def do_auth(actionid, method, credentials=None):
         user, oauth_access_token = parsecredentials(credentials)
         return ActionHandler.do(actionid, method, user, oauth_access_token)
 
     @staticmethod
-    def run(actionid, method):
+    def run(actionid, method, credentials=None):
         #check whether the action requires authentication or allows anonymous users:
         action = ActionHandler.find_action(actionid, method)
         if action.allowanonymous:
@@ -2254,49 +2895,40 @@ class ActionHandler(object):
             oauth_access_token = ""
             return ActionHandler.do(actionid, method,user,oauth_access_token)
         else:
-            return ActionHandler.do_auth(actionid, method)
+            return ActionHandler.do_auth(actionid, method, credentials)
 
 
     @staticmethod
     def GET(actionid, credentials=None):
-        return ActionHandler.run(actionid, 'GET')
+        return ActionHandler.run(actionid, 'GET', credentials)
 
     @staticmethod
     def POST(actionid, credentials=None):
-        return ActionHandler.run(actionid, 'POST')
+        return ActionHandler.run(actionid, 'POST', credentials)
 
     @staticmethod
     def PUT(actionid, credentials=None):
-        return ActionHandler.run(actionid, 'PUT')
+        return ActionHandler.run(actionid, 'PUT', credentials)
 
     @staticmethod
     def DELETE(actionid, credentials=None):
-        return ActionHandler.run(actionid, 'DELETE')
+        return ActionHandler.run(actionid, 'DELETE', credentials)
 
 
-def sufficientresources():
-    if settings.REQUIREMEMORY > 0:
-        if not os.path.exists('/proc/meminfo'):
+def sufficientresources(checkload=True):
+    """Checks whether there are sufficient system resources to start a job. If checkload is False, only the disk space is checked (the supervisor checks memory and load itself before taking a job from its queue)"""
+    if checkload and settings.REQUIREMEMORY > 0:
+        memavailable = memoryavailable()
+        if memavailable is None:
             printlog("WARNING: No /proc/meminfo available on your system! Not Linux? Skipping memory requirement check!")
-        else:
-            memfree = cached = 0.0
-            with open('/proc/meminfo') as f:
-                for line in f:
-                    if line[0:8] == "MemFree:":
-                        memfree = float(line[9:].replace('kB','').strip()) #in kB
-                    if line[0:8] == "Cached:":
-                        cached = float(line[9:].replace('kB','').strip()) #in kB
-            if settings.REQUIREMEMORY * 1024 > memfree + cached:
-                return False, str(settings.REQUIREMEMORY * 1024) + " kB memory is required but only " + str(memfree + cached) + " is available."
-    if settings.MAXLOADAVG > 0:
-        if not os.path.exists('/proc/loadavg'):
+        elif settings.REQUIREMEMORY * 1024 > memavailable:
+            return False, str(settings.REQUIREMEMORY * 1024) + " kB memory is required but only " + str(memavailable) + " is available."
+    if checkload and settings.MAXLOADAVG > 0:
+        loadavg = loadaverage()
+        if loadavg is None:
             printlog("WARNING: No /proc/loadavg available on your system! Not Linux? Skipping load average check!")
-        else:
-            with open('/proc/loadavg') as f:
-                line = f.readline()
-                loadavg = float(line.split(' ')[0])
-            if settings.MAXLOADAVG < loadavg:
-                return False, "System load too high: " + str(loadavg) + ", max is " + str(settings.MAXLOADAVG)
+        elif settings.MAXLOADAVG < loadavg:
+            return False, "System load too high: " + str(loadavg) + ", max is " + str(settings.MAXLOADAVG)
     if settings.MINDISKSPACE and settings.DISK:
         dffile = '/tmp/df.' + str("%034x" % random.getrandbits(128))
         ret = os.system('df -mP ' + settings.DISK + " | gawk '{ print $4; }'  > " + dffile)
@@ -2384,14 +3016,15 @@ class CLAMService(object):
                 self.auth = clam.common.auth.HTTPBasicAuth(get_password=userdb_lookup_dict, realm=settings.REALM,debug=printdebug) #pylint: disable=redefined-variable-type
                 warning("*** HTTP Basic Authentication is enabled. THIS IS NOT SECURE WITHOUT SSL! ***")
             else:
-                self.auth = clam.common.auth.HTTPDigestAuth(settings.SESSIONDIR,get_password=userdb_lookup_dict, realm=settings.REALM,debug=printdebug) #pylint: disable=redefined-variable-type
+                self.auth = clam.common.auth.HTTPDigestAuth(settings.SESSIONDIR,get_password=userdb_lookup_dict, realm=settings.REALM,debug=printdebug,noncememory=settings.NONCEMEMORY) #pylint: disable=redefined-variable-type
         elif settings.USERS_MYSQL:
-            validate_users_mysql()
+            global userdb_mysql #pylint: disable=global-statement
+            userdb_mysql = MySQLUserDB(*validate_users_mysql())
             if settings.BASICAUTH:
                 self.auth = clam.common.auth.HTTPBasicAuth(get_password=userdb_lookup_mysql, realm=settings.REALM,debug=printdebug) #pylint: disable=redefined-variable-type
                 warning("*** HTTP Basic Authentication is enabled. THIS IS NOT SECURE WITHOUT SSL! ***")
             else:
-                self.auth = clam.common.auth.HTTPDigestAuth(settings.SESSIONDIR, get_password=userdb_lookup_mysql,realm=settings.REALM,debug=printdebug) #pylint: disable=redefined-variable-type
+                self.auth = clam.common.auth.HTTPDigestAuth(settings.SESSIONDIR, get_password=userdb_lookup_mysql,realm=settings.REALM,debug=printdebug,noncememory=settings.NONCEMEMORY) #pylint: disable=redefined-variable-type
         elif settings.PREAUTHHEADER:
             warning("*** Forwarded Authentication is enabled. THIS IS NOT SECURE WITHOUT A PROPERLY CONFIGURED AUTHENTICATION PROVIDER! ***")
             self.auth = clam.common.auth.ForwardedAuth(settings.PREAUTHHEADER) #pylint: disable=redefined-variable-type
@@ -2399,6 +3032,29 @@ class CLAMService(object):
             warning("*** NO AUTHENTICATION ENABLED!!! This is strongly discouraged in production environments! ***")
             self.auth = clam.common.auth.NoAuth() #pylint: disable=redefined-variable-type
 
+        if settings.PERFILECOMMAND and not os.path.exists(settings.PERFILECOMMAND.split(" ")[0]):
+            error("Specified per-file command " + settings.PERFILECOMMAND.split(" ")[0] + " not found")
+
+        global statestore #pylint: disable=global-statement
+        statestore = clam.common.state.getbackend(settings.PROJECTSTATE, settings.ROOT + "projects/")
+        if settings.ARCHIVECACHE:
+            global archivecache #pylint: disable=global-statement
+            archivecache = clam.common.archive.ArchiveCache(settings.ROOT + "archives/", settings.ARCHIVECACHE * 1024 * 1024)
+        global actioncache #pylint: disable=global-statement
+        actioncache = LRUCache(settings.ACTIONCACHE_SIZE)
+        global templateindex #pylint: disable=global-statement
+        templateindex = clam.common.data.indextemplates(settings.PROFILES)
+        clam.common.data.METADATACACHE.maxsize = settings.METADATACACHE_SIZE
+        for action in settings.ACTIONS:
+            if action.function and action.executor and action.executor not in actionpools:
+                try:
+                    actionpools[action.executor] = clam.common.executor.Pool(action.executor, settings.ACTIONTHREADS if action.executor == 'thread' else settings.ACTIONPROCESSES)
+                except ValueError as e:
+                    error("Unable to create executor for action " + action.id + ": " + str(e))
+        if settings.DISKUSAGE_RECONCILE:
+            reconcilerthread = threading.Thread(target=reconciler, args=(statestore, settings.DISKUSAGE_RECONCILE))
+            reconcilerthread.daemon = True
+            reconcilerthread.start()
 
 
         self.service = flask.Flask("clam")
@@ -2414,11 +3070,15 @@ class CLAMService(object):
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/info', 'info2', info, methods=['GET'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/login', 'login2', Login.GET, methods=['GET'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/logout', 'logout2', self.auth.require_login(Logout.GET), methods=['GET'] )
+        self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/run', 'run2', self.auth.require_login(Project.run), methods=['POST'] )
+        self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/actions/<actionid>/jobs/<jobid>', 'action_getjob2', self.auth.require_login(ActionHandler.GETJOB), methods=['GET'] )
+        self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/actions/<actionid>/jobs/<jobid>', 'action_deletejob2', self.auth.require_login(ActionHandler.DELETEJOB), methods=['DELETE'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/actions/<actionid>', 'action_get2', self.auth.require_login(ActionHandler.GET), methods=['GET'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/actions/<actionid>', 'action_post2', self.auth.require_login(ActionHandler.POST), methods=['POST'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/actions/<actionid>', 'action_put2', self.auth.require_login(ActionHandler.PUT), methods=['PUT'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/actions/<actionid>', 'action_delete2', self.auth.require_login(ActionHandler.DELETE), methods=['DELETE'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/status', 'project_status_json2', Project.status_json, methods=['GET'] )
+        self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/files', 'project_listfiles2', self.auth.require_login(Project.listfiles), methods=['GET'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/upload', 'project_uploader2', uploader, methods=['POST'] ) #has it's own login mechanism
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>', 'project_get2', self.auth.require_login(Project.get), methods=['GET'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>', 'project_start2', self.auth.require_login(Project.start), methods=['POST'] )
@@ -2427,6 +3087,7 @@ class CLAMService(object):
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/output/zip', 'project_download_zip2', self.auth.require_login(Project.download_zip), methods=['GET'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/output/gz', 'project_download_targz2', self.auth.require_login(Project.download_targz), methods=['GET'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/output/bz2', 'project_download_tarbz22', self.auth.require_login(Project.download_tarbz2), methods=['GET'] )
+        self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/output/xz', 'project_download_tarxz2', self.auth.require_login(Project.download_tarxz), methods=['GET'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/output', 'project_download_zip3', self.auth.require_login(Project.download_zip), methods=['GET'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/input', 'project_addinputfile3', self.auth.require_login(Project.addinputfile_nofile), methods=['POST','GET'] )
 
@@ -2435,6 +3096,9 @@ class CLAMService(object):
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/admin/', 'adminindex', self.auth.require_login(Admin.index), methods=['GET'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/admin/download/<targetuser>/<project>/<type>/<filename>/', 'admindownloader', self.auth.require_login(Admin.downloader), methods=['GET'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/admin/<command>/<targetuser>/<project>/', 'adminhandler', self.auth.require_login(Admin.handler), methods=['GET'] )
+        self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/run/', 'run', self.auth.require_login(Project.run), methods=['POST'] )
+        self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/actions/<actionid>/jobs/<jobid>/', 'action_getjob', self.auth.require_login(ActionHandler.GETJOB), methods=['GET'] )
+        self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/actions/<actionid>/jobs/<jobid>/', 'action_deletejob', self.auth.require_login(ActionHandler.DELETEJOB), methods=['DELETE'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/actions/<actionid>/', 'action_get', self.auth.require_login(ActionHandler.GET), methods=['GET'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/actions/<actionid>/', 'action_post', self.auth.require_login(ActionHandler.POST), methods=['POST'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/actions/<actionid>/', 'action_put', self.auth.require_login(ActionHandler.PUT), methods=['PUT'] )
@@ -2442,6 +3106,7 @@ class CLAMService(object):
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/output/zip/', 'project_download_zip', self.auth.require_login(Project.download_zip), methods=['GET'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/output/gz/', 'project_download_targz', self.auth.require_login(Project.download_targz), methods=['GET'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/output/bz2/', 'project_download_tarbz2', self.auth.require_login(Project.download_tarbz2), methods=['GET'] )
+        self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/output/xz/', 'project_download_tarxz', self.auth.require_login(Project.download_tarxz), methods=['GET'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/output/<path:filename>', 'project_getoutputfile', self.auth.require_login(Project.getoutputfile), methods=['GET'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/output/<path:filename>', 'project_deleteoutputfile', self.auth.require_login(Project.deleteoutputfile), methods=['DELETE'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/output/', 'project_download_zip4', self.auth.require_login(Project.download_zip), methods=['GET'] )
@@ -2451,6 +3116,8 @@ class CLAMService(object):
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/input/<path:filename>', 'project_addinputfile', self.auth.require_login(Project.addinputfile), methods=['POST'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/input/', 'project_addinputfile2', self.auth.require_login(Project.addinputfile_nofile), methods=['POST','GET'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/status/', 'project_status_json', Project.status_json, methods=['GET'] )
+        self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/status/stream', 'project_status_stream', self.auth.require_login(Project.statusstream), methods=['GET'] )
+        self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/files/', 'project_listfiles', self.auth.require_login(Project.listfiles), methods=['GET'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/upload/', 'project_uploader', uploader, methods=['POST'] ) #has it's own login mechanism
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/', 'project_get', self.auth.require_login(Project.get), methods=['GET'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/', 'project_start', self.auth.require_login(Project.start), methods=['POST'] )
@@ -2567,6 +3234,50 @@ def set_defaults():
         else:
             print("WARNING: clamdispatcher not found!!",file=sys.stderr)
             settings.DISPATCHER = 'clamdispatcher'
+    if not 'DISPATCHER_POLLINTERVAL' in settingkeys:
+        settings.DISPATCHER_POLLINTERVAL = 30
+    if not 'DISPATCHER_MAXRESMEM' in settingkeys:
+        settings.DISPATCHER_MAXRESMEM = 0
+    if not 'DISPATCHER_MAXTIME' in settingkeys:
+        settings.DISPATCHER_MAXTIME = 0
+    if not 'PROJECTSTATE' in settingkeys:
+        settings.PROJECTSTATE = 'sqlite'
+    if not 'NONCEMEMORY' in settingkeys:
+        settings.NONCEMEMORY = 'sqlite'
+    if not 'OUTPUTMETADATA' in settingkeys:
+        settings.OUTPUTMETADATA = 'files'
+    if not 'METADATACACHE_SIZE' in settingkeys:
+        settings.METADATACACHE_SIZE = 10000
+    if not 'DISKUSAGE_RECONCILE' in settingkeys:
+        settings.DISKUSAGE_RECONCILE = 86400
+    if not 'PERFILECOMMAND' in settingkeys:
+        settings.PERFILECOMMAND = None
+    if not 'MAXPARALLEL' in settingkeys:
+        settings.MAXPARALLEL = 0 #number of CPUs
+    if not 'RUNDIR' in settingkeys:
+        settings.RUNDIR = '/dev/shm' if os.path.isdir('/dev/shm') else None #tmpfs for the ephemeral projects of /run
+    if not 'RUNTIMEOUT' in settingkeys:
+        settings.RUNTIMEOUT = 300 #seconds a request to /run may take (queueing included)
+    if not 'ACTIONTHREADS' in settingkeys:
+        settings.ACTIONTHREADS = 8
+    if not 'ACTIONPROCESSES' in settingkeys:
+        settings.ACTIONPROCESSES = multiprocessing.cpu_count()
+    if not 'ACTIONCACHE_SIZE' in settingkeys:
+        settings.ACTIONCACHE_SIZE = 1000 #results of actions with cache=True kept in memory (by each webserver process)
+    if not 'ACTIONCACHE_SHARED' in settingkeys:
+        settings.ACTIONCACHE_SHARED = False
+    if not 'ACTIONJOBEXPIRY' in settingkeys:
+        settings.ACTIONJOBEXPIRY = 86400 #results of asynchronous actions that are never retrieved and deleted are removed after a day
+    if not 'WORKER_FUNCTION' in settingkeys:
+        settings.WORKER_FUNCTION = None #no warm workers, every job starts the dispatcher and COMMAND
+    if not 'WORKERS' in settingkeys:
+        settings.WORKERS = 4
+    if not 'WORKER_MAXJOBS' in settingkeys:
+        settings.WORKER_MAXJOBS = 100
+    if not 'ARCHIVECACHE' in settingkeys:
+        settings.ARCHIVECACHE = 0 #no cache, archives are streamed
+    if not 'SUPERVISOR_SOCKET' in settingkeys:
+        settings.SUPERVISOR_SOCKET = None #no supervisor, every project gets its own dispatcher
     if 'PROJECTS_PUBLIC' in settingkeys:
         print("NOTICE: PROJECTS_PUBLIC directive is obsolete and has no effect. You may be looking for LISTPROJECTS or ALLOWSHARE instead",file=sys.stderr)
     if not 'REALM' in settingkeys:
@@ -2618,6 +3329,8 @@ def set_defaults():
         settings.SECRET_KEY = "%032x" % random.getrandbits(128)
     if not 'INTERFACEOPTIONS' in settingkeys:
         settings.INTERFACEOPTIONS = ""
+    if not 'INTERFACE_POLLWAIT' in settingkeys:
+        settings.INTERFACE_POLLWAIT = 10
     if not 'CUSTOMHTML_INDEX' in settingkeys:
         if os.path.exists(settings.CLAMDIR + '/static/custom/' + settings.SYSTEM_ID  + '_index.html'):
             with io.open(settings.CLAMDIR + '/static/custom/' + settings.SYSTEM_ID  + '_index.html','r',encoding='utf-8') as f:
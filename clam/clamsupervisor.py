@@ -0,0 +1,698 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- CLAM Supervisor --
+#       by Maarten van Gompel (proycon)
+#       http://ilk.uvt.nl/clam
+#       http://ilk.uvt.nl/~mvgompel
+#       Induction for Linguistic Knowledge Research Group
+#       Universiteit van Tilburg
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+#A single long-lived process (one per node) that starts and supervises the jobs
+#of all projects, instead of one clamdispatcher process per project. Jobs are
+#submitted by the webservice over a local unix socket. The on-disk contract is
+#the same as that of clamdispatcher: .pid is written when the job starts, .done
+#(containing the exit code) when it ends, and .aborted when it was aborted.
+#
+#The number of jobs running at once can be capped (globally and per user), jobs
+#beyond the cap wait in a persistent queue and the project gets a .queued file.
+#
+#Services with a WORKER_FUNCTION get a pool of warm workers (clamworker) that
+#run their jobs in-process, instead of starting a new command for each job.
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import sys
+import os
+import datetime
+import subprocess
+import time
+import signal
+import shutil
+import socket
+import select
+import errno
+import json
+import argparse
+import fcntl
+import glob
+import threading
+try:
+    import queue
+except ImportError: #Python 2
+    import Queue as queue #pylint: disable=import-error
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/..')
+
+from clam.common.util import memoryavailable, loadaverage #pylint: disable=wrong-import-position
+import clam.common.state #pylint: disable=wrong-import-position
+import clam.common.archive #pylint: disable=wrong-import-position
+
+VERSION = '2.1'
+
+ABORTCHECKINTERVAL = 10 #seconds between checks for .abort files (aborts submitted over the socket are handled immediately)
+KILLDELAY = 30 #seconds to wait after SIGTERM before an aborted job is killed with SIGKILL
+MAXLINE = 1024 * 1024 #maximum size of a request
+
+class SupervisorError(Exception):
+    """Raised when the supervisor refuses a request (for instance because the queue is full)"""
+    pass
+
+def log(msg):
+    print("[CLAM Supervisor] " + msg + " (" + datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S') + ")", file=sys.stderr)
+    sys.stderr.flush()
+
+def mem(pid):
+    """Returns the resident memory of the process in kilobytes"""
+    try:
+        with open('/proc/%d/status' % pid, 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+        return 0
+    except IOError:
+        #no procfs, fall back to ps
+        try:
+            return int(os.popen('ps -p %d -o rss | tail -1' % pid).read())
+        except ValueError:
+            return 0
+
+def request(socketpath, message, timeout=30):
+    """Send a request (a dictionary) to the supervisor listening on the specified socket and return its reply (a dictionary). Raises socket.error (or IOError) if the supervisor is not reachable."""
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.settimeout(timeout)
+        s.connect(socketpath)
+        s.sendall(json.dumps(message).encode('utf-8') + b"\n")
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = s.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+    finally:
+        s.close()
+    if not data:
+        raise IOError("No reply from supervisor")
+    return json.loads(data.decode('utf-8'))
+
+def submit(socketpath, projectdir, cmd, env=None, maxtime=0, maxresmem=0, pollinterval=30, requirememory=0, maxloadavg=0, state=None, worker=None):
+    """Submit a job for the project in the specified directory to the supervisor. Returns the reply, which has either a ``pid`` (the job started) or ``queued`` and ``position`` (the job waits in the queue). Raises SupervisorError if the job was refused.
+
+    If ``worker`` is set (a dictionary with ``function``, ``settings``, ``pythonpath``, ``size`` and ``maxjobs``), the job is run by a warm worker from the pool for that function if one is available, ``cmd`` is run otherwise."""
+    reply = request(socketpath, {'action': 'submit', 'projectdir': projectdir, 'cmd': cmd, 'env': env, 'maxtime': maxtime, 'maxresmem': maxresmem, 'pollinterval': pollinterval, 'requirememory': requirememory, 'maxloadavg': maxloadavg, 'state': state, 'worker': worker})
+    if not reply.get('success'):
+        raise SupervisorError(reply.get('error','unknown error'))
+    return reply
+
+def abort(socketpath, projectdir):
+    """Ask the supervisor to abort the job of the project in the specified directory, returns True if the job was found"""
+    reply = request(socketpath, {'action': 'abort', 'projectdir': projectdir})
+    return bool(reply.get('success'))
+
+
+STATESTORES = {} #(backend, projectsdir) => clam.common.state.ProjectState, shared by all jobs
+
+def updatestate(job, method, *args):
+    """Update the project state store of the job (if any), failures are not fatal as the .pid/.done files are written regardless"""
+    if job.state:
+        projectdir = os.path.abspath(job.projectdir)
+        user = os.path.basename(os.path.dirname(projectdir))
+        project = os.path.basename(projectdir)
+        key = (job.state, os.path.dirname(os.path.dirname(projectdir)))
+        try:
+            if key not in STATESTORES:
+                STATESTORES[key] = clam.common.state.getbackend(*key)
+            getattr(STATESTORES[key], method)(user, project, *args)
+        except Exception as e: #pylint: disable=broad-except
+            log("Unable to update project state of " + job.projectdir + ": " + str(e))
+
+DISKUSAGEQUEUE = None #finished jobs whose project is still to be measured, see measurediskusage()
+
+def measurediskusage(job):
+    """Have the disk usage of the project of a finished job measured (and stored) in a background thread, scanning a large output directory in the event loop would stall all other jobs"""
+    global DISKUSAGEQUEUE
+    if job.state:
+        if DISKUSAGEQUEUE is None:
+            DISKUSAGEQUEUE = queue.Queue()
+            thread = threading.Thread(target=diskusagemeasurer, args=(DISKUSAGEQUEUE,))
+            thread.daemon = True
+            thread.start()
+        DISKUSAGEQUEUE.put(job)
+
+def diskusagemeasurer(jobs):
+    while True:
+        job = jobs.get()
+        if os.path.isdir(job.projectdir): #may have been deleted in the meantime
+            updatestate(job, 'measure')
+
+
+class Worker(object):
+    """A warm worker process (clamworker) that runs jobs in-process, one at a time"""
+
+    def __init__(self, spec, env=None):
+        cmd = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'clamworker.py'), '--function', spec['function'], '--maxjobs', str(spec.get('maxjobs',0))]
+        if spec.get('settings'):
+            cmd += ['--settings', spec['settings']]
+        if spec.get('pythonpath'):
+            cmd += ['--pythonpath', ':'.join(spec['pythonpath'])]
+        #a process group of its own, so aborting a job (which kills the worker) also reaches any children
+        self.process = subprocess.Popen(cmd, cwd='/', env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, preexec_fn=os.setsid, close_fds=True)
+        self.pid = self.process.pid
+        setnonblocking(self.process.stdout.fileno())
+        self.buffer = b""
+        self.maxjobs = spec.get('maxjobs',0)
+        self.jobs = 0 #number of jobs handed to this worker
+        self.busy = False
+        self.returncode = None #exit code of the current job
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def available(self):
+        """Is the worker idle and will it accept another job? (it exits by itself once it reaches its maximum number of jobs)"""
+        return not self.busy and (not self.maxjobs or self.jobs < self.maxjobs) and self.alive()
+
+    def run(self, projectdir):
+        """Hand a job to the worker, returns the worker, which stands in for the process of the job. Raises IOError/OSError if the worker went away"""
+        self.process.stdin.write(json.dumps({'projectdir': projectdir}).encode('utf-8') + b"\n")
+        self.process.stdin.flush()
+        self.busy = True
+        self.returncode = None
+        self.jobs += 1
+        return self
+
+    def fileno(self):
+        return self.process.stdout.fileno()
+
+    def poll(self):
+        """Returns the exit code of the current job if it has finished, None otherwise"""
+        if self.busy:
+            try:
+                data = os.read(self.fileno(), 4096)
+            except OSError as e:
+                if e.errno != errno.EAGAIN:
+                    raise
+                data = None
+            if data:
+                self.buffer += data
+            if b"\n" in self.buffer:
+                line, self.buffer = self.buffer.split(b"\n",1)
+                self.returncode = json.loads(line.decode('utf-8'))['exitcode']
+                self.busy = False
+            elif data == b"" or not self.alive(): #the worker died during the job (killed on abort for instance)
+                self.process.wait()
+                self.returncode = self.process.returncode if self.process.returncode != 0 else 1 #no result is a failure
+                self.busy = False
+        return self.returncode
+
+    def stop(self):
+        try:
+            self.process.stdin.close() #the worker exits once it reads the end of its input
+        except (IOError, OSError):
+            pass
+
+
+class WorkerPool(object):
+    """The warm workers for a single WORKER_FUNCTION of a service"""
+
+    def __init__(self, spec, env=None):
+        self.spec = spec
+        self.env = env
+        self.size = max(1, spec.get('size',1))
+        self.workers = []
+        self.broken = False #set if workers fail to start, jobs then fall back to their command
+        self.fill()
+
+    def fill(self):
+        """Discard workers that exited (when they reached their maximum number of jobs) and start new ones to keep the pool at its size"""
+        for worker in list(self.workers):
+            if not worker.busy and not worker.alive():
+                self.workers.remove(worker)
+                if worker.jobs == 0 and worker.process.returncode != 0:
+                    log("Worker for " + self.spec['function'] + " failed to start (exit code " + str(worker.process.returncode) + "), no longer using workers for it")
+                    self.broken = True
+        while not self.broken and len(self.workers) < self.size:
+            try:
+                self.workers.append(Worker(self.spec, self.env))
+            except (OSError, IOError) as e:
+                log("Unable to start worker for " + self.spec['function'] + ": " + str(e))
+                self.broken = True
+
+    def acquire(self):
+        """Returns an idle worker, or None if there is none"""
+        if not self.broken:
+            for worker in self.workers:
+                if worker.available():
+                    return worker
+        return None
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+
+
+class Job(object):
+    """A single job, i.e. a running command for a project"""
+
+    def __init__(self, projectdir, cmd, env=None, maxtime=0, maxresmem=0, pollinterval=30, requirememory=0, maxloadavg=0, state=None, queuetime=None, worker=None):
+        if projectdir[-1] != '/':
+            projectdir += '/'
+        self.projectdir = projectdir
+        self.userdir = os.path.dirname(projectdir[:-1]) #projects/$user, per-user limits apply to this
+        self.tmpdir = os.path.join(projectdir,'tmp')
+        self.cmd = cmd
+        self.env = env
+        self.maxtime = maxtime
+        self.maxresmem = maxresmem
+        self.pollinterval = pollinterval
+        self.requirememory = requirememory
+        self.maxloadavg = maxloadavg
+        self.state = state #project state backend used by the webservice (see clam.common.state)
+        self.queuetime = queuetime if queuetime is not None else time.time()
+        self.worker = worker #specification of the warm worker pool to run this job in (see submit()), if any
+        self.spoolfile = None #set when the job is written to the queue on disk
+        self.process = None
+        self.begintime = None
+        self.lastpolltime = 0
+        self.aborted = False
+        self.killtime = None #time at which the job will be killed (SIGKILL) if it did not end after an abort
+        self.statuscode = None #overrides the exit code (2 = memory exceeded, 3 = timed out)
+
+    def todict(self):
+        return {'projectdir': self.projectdir, 'cmd': self.cmd, 'env': self.env, 'maxtime': self.maxtime, 'maxresmem': self.maxresmem, 'pollinterval': self.pollinterval, 'requirememory': self.requirememory, 'maxloadavg': self.maxloadavg, 'state': self.state, 'queuetime': self.queuetime, 'worker': self.worker}
+
+    def admissible(self):
+        """Are there enough system resources to start this job?"""
+        if self.requirememory > 0:
+            memavailable = memoryavailable()
+            if memavailable is not None and self.requirememory * 1024 > memavailable:
+                return False
+        if self.maxloadavg > 0:
+            loadavg = loadaverage()
+            if loadavg is not None and self.maxloadavg < loadavg:
+                return False
+        return True
+
+    def enqueue(self, spooldir, seq):
+        """Write the job to the queue on disk and mark the project as queued"""
+        self.spoolfile = os.path.join(spooldir, "%017.6f-%06d.job" % (self.queuetime, seq))
+        with open(self.spoolfile,'w') as f:
+            json.dump(self.todict(), f)
+        open(self.projectdir + '.queued','w').close()
+        updatestate(self, 'queued')
+
+    def dequeue(self):
+        if self.spoolfile and os.path.exists(self.spoolfile):
+            os.unlink(self.spoolfile)
+        self.spoolfile = None
+        if os.path.exists(self.projectdir + '.queued'):
+            os.unlink(self.projectdir + '.queued')
+
+    def cancel(self):
+        """Abort a job that is still in the queue"""
+        self.dequeue()
+        if os.path.exists(self.projectdir + '.abort'):
+            os.unlink(self.projectdir + '.abort')
+        if os.path.isdir(self.projectdir):
+            open(self.projectdir + '.aborted','w').close()
+            with open(self.projectdir + '.done','w') as f:
+                f.write(str(0))
+            updatestate(self, 'finished', 0, True)
+        log("Job " + self.projectdir + " aborted while queued")
+
+    def start(self, worker=None):
+        """Start the job, in the specified warm worker if given, by running its command otherwise. Returns the pid"""
+        cmd = self.cmd
+        if sys.version[0] == '2' and isinstance(cmd,unicode): #pylint: disable=undefined-variable
+            cmd = cmd.encode('utf-8')
+        if worker is not None:
+            self.process = worker.run(self.projectdir)
+        else:
+            #each job gets its own process group so an abort also reaches the children of the shell
+            self.process = subprocess.Popen(cmd, cwd=self.projectdir, shell=True, env=self.env, preexec_fn=os.setsid, close_fds=True)
+        self.begintime = time.time()
+        self.lastpolltime = self.begintime
+        with open(self.projectdir + '.pid','w') as f:
+            f.write(str(self.process.pid))
+        updatestate(self, 'started', self.process.pid)
+        return self.process.pid
+
+    def signal(self, sig):
+        try:
+            os.killpg(self.process.pid, sig)
+        except OSError:
+            try:
+                os.kill(self.process.pid, sig)
+            except OSError:
+                pass
+
+    def abort(self, statuscode=0):
+        if self.aborted:
+            return
+        self.aborted = True
+        self.statuscode = statuscode #like clamdispatcher, 0 for regular aborts
+        self.signal(signal.SIGTERM)
+        self.killtime = time.time() + KILLDELAY #deathtrap in case the process doesn't listen
+
+    def check(self, now, checkabort):
+        """Enforce abort requests and resource limits, called periodically from the event loop"""
+        if self.aborted:
+            if self.killtime and now >= self.killtime:
+                log("Job " + self.projectdir + " did not end after abort, killing")
+                self.signal(signal.SIGKILL)
+                self.killtime = None
+            return
+        d = now - self.begintime
+        if checkabort and os.path.exists(self.projectdir + '.abort'):
+            log("Aborting job " + self.projectdir + " on signal (" + str(d) + "s)")
+            self.abort()
+        elif self.maxresmem > 0 and now - self.lastpolltime >= self.pollinterval:
+            self.lastpolltime = now
+            resmem = mem(self.process.pid)
+            if resmem > self.maxresmem * 1024:
+                log("Job " + self.projectdir + " exceeds maximum resident memory usage (" + str(resmem) + ' >= ' + str(self.maxresmem) + ')... aborting')
+                self.abort(2)
+        if not self.aborted and self.maxtime > 0 and d > self.maxtime:
+            log("Job " + self.projectdir + " timed out, no completion within " + str(d) + " seconds... aborting")
+            self.abort(3)
+
+    def finish(self):
+        """Write the .done file and clean up, called once the process has been reaped"""
+        returncode = self.process.returncode
+        if self.statuscode is not None:
+            statuscode = self.statuscode
+        elif returncode < 0: #killed by a signal
+            statuscode = 128 - returncode
+        else:
+            statuscode = returncode
+        if self.aborted:
+            if os.path.exists(self.projectdir + '.abort'):
+                os.unlink(self.projectdir + '.abort')
+            open(self.projectdir + '.aborted','w').close()
+        with open(self.projectdir + '.done','w') as f:
+            f.write(str(statuscode))
+        if os.path.exists(self.projectdir + '.pid'): os.unlink(self.projectdir + '.pid')
+        updatestate(self, 'finished', statuscode, self.aborted)
+        measurediskusage(self) #to account for the disk space the output takes
+        clam.common.archive.invalidate(self.projectdir) #the output has changed, cached archives are stale
+
+        if os.path.exists(self.tmpdir):
+            for filename in os.listdir(self.tmpdir):
+                filepath = os.path.join(self.tmpdir,filename)
+                try:
+                    if os.path.isdir(filepath):
+                        shutil.rmtree(filepath)
+                    else:
+                        os.unlink(filepath)
+                except: #pylint: disable=bare-except
+                    log("Unable to remove " + filepath)
+        log("Job " + self.projectdir + " finished, exit code " + str(statuscode) + ", duration " + str(round(time.time() - self.begintime,2)) + "s")
+        return statuscode
+
+
+class Supervisor(object):
+    """The event loop: accepts requests on the socket, reaps children on SIGCHLD and enforces limits"""
+
+    def __init__(self, socketpath, spooldir=None, maxjobs=0, maxjobsperuser=0, maxqueue=1000, scheduler='fifo'):
+        self.socketpath = socketpath
+        self.spooldir = spooldir if spooldir else socketpath + '.queue'
+        self.maxjobs = maxjobs #0 = unlimited
+        self.maxjobsperuser = maxjobsperuser #0 = unlimited
+        self.maxqueue = maxqueue
+        self.scheduler = scheduler #fifo or fairshare
+        self.jobs = {} #pid => Job
+        self.pools = {} #worker specification and environment (as JSON) => WorkerPool
+        self.queue = [] #Jobs in order of submission
+        self.seq = 0
+        self.running = False
+        self.lastabortchecktime = 0
+
+        if not os.path.isdir(self.spooldir):
+            os.makedirs(self.spooldir, 0o700)
+        self.loadqueue()
+
+        #self-pipe: the signal handlers write to it so select() wakes up immediately
+        self.wakeup_r, self.wakeup_w = os.pipe()
+        for fd in (self.wakeup_r, self.wakeup_w):
+            setnonblocking(fd)
+
+        if os.path.exists(socketpath):
+            os.unlink(socketpath) #stale socket from an earlier run
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        oldumask = os.umask(0o177)
+        try:
+            self.listener.bind(socketpath)
+        finally:
+            os.umask(oldumask)
+        self.listener.listen(64)
+
+    def loadqueue(self):
+        """Load the jobs that were still queued when the supervisor last stopped"""
+        for spoolfile in sorted(glob.glob(os.path.join(self.spooldir, '*.job'))):
+            try:
+                with open(spoolfile,'r') as f:
+                    job = Job(**json.load(f))
+            except (ValueError, TypeError, IOError) as e:
+                log("Discarding invalid queue entry " + spoolfile + ": " + str(e))
+                os.unlink(spoolfile)
+                continue
+            if os.path.isdir(job.projectdir) and os.path.exists(job.projectdir + '.queued'):
+                job.spoolfile = spoolfile
+                self.queue.append(job)
+            else:
+                os.unlink(spoolfile) #project was deleted in the meantime
+        if self.queue:
+            log("Loaded " + str(len(self.queue)) + " queued job(s)")
+
+    def userjobs(self, userdir):
+        return sum( 1 for job in self.jobs.values() if job.userdir == userdir )
+
+    def pick(self):
+        """Select the next job to start from the queue, or None if no job may start now"""
+        candidates = []
+        for position, job in enumerate(self.queue):
+            running = self.userjobs(job.userdir)
+            if self.maxjobsperuser == 0 or running < self.maxjobsperuser:
+                if self.scheduler == 'fifo':
+                    return job
+                candidates.append( (running, position, job) )
+        if candidates:
+            #fair share: the user with the fewest running jobs goes first, oldest job first among equals
+            return min(candidates, key=lambda x: x[:2])[2]
+        return None
+
+    def schedule(self):
+        """Start as many queued jobs as the limits and available resources allow"""
+        while self.queue and (self.maxjobs == 0 or len(self.jobs) < self.maxjobs):
+            job = self.pick()
+            if job is None or not job.admissible():
+                break
+            self.queue.remove(job)
+            job.dequeue()
+            self.launch(job)
+
+    def getworker(self, job):
+        """Returns an idle warm worker for the job, or None if it has no worker pool or none is idle. Workers run with the environment of the jobs they were started for, so there is a pool per worker specification and environment"""
+        if not job.worker:
+            return None
+        key = json.dumps([job.worker, job.env], sort_keys=True)
+        if key not in self.pools:
+            log("Starting " + str(job.worker.get('size',1)) + " worker(s) for " + job.worker['function'])
+            self.pools[key] = WorkerPool(job.worker, job.env)
+        return self.pools[key].acquire()
+
+    def launch(self, job):
+        try:
+            worker = self.getworker(job)
+            try:
+                pid = job.start(worker)
+            except (OSError, IOError) as e:
+                if worker is None:
+                    raise
+                #the worker died after it was found idle (broken pipe), run the command instead
+                log("Unable to hand job " + job.projectdir + " to worker " + str(worker.pid) + " (" + str(e) + "), running its command instead")
+                pid = job.start()
+        except (OSError, IOError) as e:
+            log("Unable to launch job " + job.projectdir + ": " + str(e))
+            if os.path.isdir(job.projectdir):
+                with open(job.projectdir + '.done','w') as f:
+                    f.write(str(1))
+                updatestate(job, 'finished', 1)
+            return None
+        self.jobs[pid] = job
+        if isinstance(job.process, Worker):
+            log("Started job " + job.projectdir + " in worker " + str(pid) + " after " + str(round(job.begintime - job.queuetime,2)) + "s in queue")
+        else:
+            log("Started job " + job.projectdir + " with pid " + str(pid) + " after " + str(round(job.begintime - job.queuetime,2)) + "s in queue: " + repr(job.cmd))
+        return pid
+
+    def abort(self, projectdir):
+        """Abort a running or queued job, returns False if there is no such job"""
+        for job in self.jobs.values():
+            if job.projectdir == projectdir:
+                log("Aborting job " + job.projectdir)
+                job.abort()
+                return True
+        for job in self.queue:
+            if job.projectdir == projectdir:
+                self.queue.remove(job)
+                job.cancel()
+                return True
+        return False
+
+    def handle(self, message):
+        """Handle a single request, returns the reply"""
+        action = message.get('action')
+        if action == 'submit':
+            projectdir = message['projectdir']
+            if not os.path.isdir(projectdir):
+                return {'success': False, 'error': "Project directory " + projectdir + " does not exist"}
+            if len(self.queue) >= self.maxqueue:
+                return {'success': False, 'error': "The queue is full (" + str(len(self.queue)) + " jobs waiting)"}
+            job = Job(projectdir, message['cmd'], message.get('env'), message.get('maxtime',0), message.get('maxresmem',0), message.get('pollinterval',30), message.get('requirememory',0), message.get('maxloadavg',0), message.get('state'), worker=message.get('worker'))
+            self.queue.append(job)
+            self.schedule()
+            if job in self.queue:
+                try:
+                    self.seq += 1
+                    job.enqueue(self.spooldir, self.seq)
+                except (OSError, IOError) as e:
+                    self.queue.remove(job)
+                    return {'success': False, 'error': "Unable to queue job: " + str(e)}
+                log("Queued job " + job.projectdir + " at position " + str(len(self.queue)))
+                return {'success': True, 'queued': True, 'position': self.queue.index(job) + 1}
+            elif job.process is None:
+                return {'success': False, 'error': "Unable to launch process"}
+            else:
+                return {'success': True, 'pid': job.process.pid}
+        elif action == 'abort':
+            projectdir = message['projectdir']
+            if projectdir[-1] != '/':
+                projectdir += '/'
+            if self.abort(projectdir):
+                return {'success': True}
+            return {'success': False, 'error': "No such job"}
+        elif action == 'status':
+            return {'success': True, 'jobs': [ {'pid': pid, 'projectdir': job.projectdir, 'duration': time.time() - job.begintime } for pid, job in self.jobs.items() ], 'queue': [ job.projectdir for job in self.queue ] }
+        else:
+            return {'success': False, 'error': "Unknown action"}
+
+    def accept(self):
+        try:
+            conn, _ = self.listener.accept()
+        except socket.error:
+            return
+        try:
+            conn.settimeout(5)
+            data = b""
+            while not data.endswith(b"\n") and len(data) < MAXLINE:
+                chunk = conn.recv(4096)
+                if not chunk:
+                    break
+                data += chunk
+            try:
+                reply = self.handle(json.loads(data.decode('utf-8')))
+            except (ValueError, KeyError) as e:
+                reply = {'success': False, 'error': "Invalid request: " + str(e)}
+            conn.sendall(json.dumps(reply).encode('utf-8') + b"\n")
+        except socket.error as e:
+            log("Error communicating with client: " + str(e))
+        finally:
+            conn.close()
+
+    def reap(self):
+        for pid, job in list(self.jobs.items()):
+            if job.process.poll() is not None:
+                del self.jobs[pid]
+                try:
+                    job.finish()
+                except (OSError, IOError) as e:
+                    log("Error finishing job " + job.projectdir + ": " + str(e))
+
+    def check(self):
+        now = time.time()
+        checkabort = now - self.lastabortchecktime >= ABORTCHECKINTERVAL
+        if checkabort:
+            self.lastabortchecktime = now
+            for job in list(self.queue):
+                if os.path.exists(job.projectdir + '.abort') or not os.path.isdir(job.projectdir):
+                    self.queue.remove(job)
+                    job.cancel()
+        for job in self.jobs.values():
+            job.check(now, checkabort)
+        for pool in self.pools.values():
+            pool.fill()
+        self.schedule()
+
+    def stop(self, signum, frame): #pylint: disable=unused-argument
+        self.running = False
+
+    def run(self):
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None) #a handler is needed for the wakeup fd to be written to
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.set_wakeup_fd(self.wakeup_w)
+        self.running = True
+        log("Started CLAM Supervisor v" + str(VERSION) + ", listening on " + self.socketpath)
+        try:
+            while self.running:
+                #wake up at least once a second to enforce timeouts, idle otherwise
+                try:
+                    busyworkers = [ job.process for job in self.jobs.values() if isinstance(job.process, Worker) ] #they write to their output when a job is done
+                    readable, _, _ = select.select([self.listener, self.wakeup_r] + busyworkers, [], [], 1)
+                except (select.error, OSError) as e:
+                    if e.args[0] == errno.EINTR:
+                        continue
+                    raise
+                if self.wakeup_r in readable:
+                    try:
+                        while os.read(self.wakeup_r, 4096):
+                            pass
+                    except OSError:
+                        pass
+                if self.wakeup_r in readable or any(worker in readable for worker in busyworkers):
+                    self.reap()
+                if self.listener in readable:
+                    self.accept()
+                self.check()
+        finally:
+            for pool in self.pools.values():
+                pool.stop()
+            self.listener.close()
+            if os.path.exists(self.socketpath):
+                os.unlink(self.socketpath)
+            if self.jobs:
+                log("Shutting down with " + str(len(self.jobs)) + " job(s) still running, they will continue unsupervised")
+            if self.queue:
+                log("Shutting down with " + str(len(self.queue)) + " job(s) in the queue, they will be resumed on the next start")
+
+
+def setnonblocking(fd):
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+def main():
+    parser = argparse.ArgumentParser(description="CLAM Supervisor: starts and supervises the jobs of all CLAM projects on this node. Set SUPERVISOR_SOCKET in the service configuration to the same socket to make use of it.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-s','--socket', type=str,help="Path of the unix socket to listen on", action='store',default='/tmp/clamsupervisor.sock')
+    parser.add_argument('-j','--maxjobs', type=int,help="Maximum number of jobs running at the same time (0 = unlimited)", action='store',default=0)
+    parser.add_argument('-u','--maxjobsperuser', type=int,help="Maximum number of jobs running at the same time for a single user (0 = unlimited)", action='store',default=0)
+    parser.add_argument('-q','--maxqueue', type=int,help="Maximum number of jobs waiting in the queue, further submissions are refused", action='store',default=1000)
+    parser.add_argument('--scheduler', type=str,help="Order in which queued jobs are started: fifo (first come, first served) or fairshare (users with the fewest running jobs first)", action='store',choices=('fifo','fairshare'),default='fifo')
+    parser.add_argument('--spooldir', type=str,help="Directory in which the queue is kept so it survives a restart (default: the socket path with a .queue suffix)", action='store',default=None)
+    args = parser.parse_args()
+
+    supervisor = Supervisor(args.socket, args.spooldir, args.maxjobs, args.maxjobsperuser, args.maxqueue, args.scheduler)
+    supervisor.run()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
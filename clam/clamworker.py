@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- CLAM Worker --
+#       by Maarten van Gompel (proycon)
+#       http://ilk.uvt.nl/clam
+#       http://ilk.uvt.nl/~mvgompel
+#       Induction for Linguistic Knowledge Research Group
+#       Universiteit van Tilburg
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+#A warm worker: a long-lived Python process that has already imported the
+#service configuration and the wrapper function (WORKER_FUNCTION), so jobs do
+#not pay for starting a dispatcher and a wrapper and importing everything again.
+#Workers are started and fed by the supervisor (clamsupervisor): jobs are read
+#from stdin as JSON lines ({"projectdir": ...}) and run in-process one at a
+#time, the exit code of each is written back as a JSON line ({"exitcode": ...}).
+#After --maxjobs jobs the worker exits, so it is recycled by the supervisor.
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import sys
+import os
+import io
+import json
+import argparse
+import importlib
+import traceback
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/..')
+
+import clam.common.data #pylint: disable=wrong-import-position
+
+VERSION = '2.1'
+
+
+def loadfunction(spec):
+    """Imports and returns the function specified as module.function (or module:function)"""
+    if ':' in spec:
+        modulename, functionname = spec.split(':',1)
+    else:
+        modulename, functionname = spec.rsplit('.',1)
+    return getattr(importlib.import_module(modulename), functionname)
+
+def runjob(function, projectdir):
+    """Runs the wrapper function for the project in the specified directory, like clamdispatcher would run COMMAND: from within the project directory and with the error output going to output/error.log. Returns the exit code"""
+    if projectdir[-1] != '/':
+        projectdir += '/'
+    cwd = os.getcwd()
+    savedfds = (os.dup(1), os.dup(2))
+    errorlog = os.open(projectdir + 'output/error.log', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    os.dup2(errorlog, 1)
+    os.dup2(errorlog, 2)
+    os.close(errorlog)
+    try:
+        os.chdir(projectdir)
+        clamdata = clam.common.data.getclamdata(projectdir + 'clam.xml')
+        exitcode = function(clamdata, projectdir + '.status', projectdir + 'output/')
+        if not isinstance(exitcode, int):
+            exitcode = 0
+    except SystemExit as e:
+        if e.code is None:
+            exitcode = 0
+        elif isinstance(e.code, int):
+            exitcode = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            exitcode = 1
+    except Exception: #pylint: disable=broad-except
+        traceback.print_exc()
+        exitcode = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(savedfds[0], 1)
+        os.dup2(savedfds[1], 2)
+        for fd in savedfds:
+            os.close(fd)
+        os.chdir(cwd)
+    return exitcode
+
+def main():
+    parser = argparse.ArgumentParser(description="CLAM Worker: runs the wrapper function of a CLAM service for jobs handed to it by the supervisor. Not meant to be started manually.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-f','--function', type=str,help="The wrapper function (module.function), it is called with the CLAMData, the status file and the output directory of each job", action='store',required=True)
+    parser.add_argument('-s','--settings', type=str,help="The settings module of the service", action='store',default=None)
+    parser.add_argument('-P','--pythonpath', type=str,help="Extra directories to add to the python path (colon-separated)", action='store',default="")
+    parser.add_argument('-n','--maxjobs', type=int,help="Exit after this many jobs (0 = never)", action='store',default=0)
+    args = parser.parse_args()
+
+    #the protocol gets its own copy of stdout, anything else that is printed goes to stderr (or the error log of the job) instead
+    protocol = io.open(os.dup(1), 'wb', 0)
+    os.dup2(2, 1)
+
+    for path in args.pythonpath.split(':'):
+        if path:
+            sys.path.append(path)
+    if args.settings:
+        settings = importlib.import_module(args.settings)
+        if getattr(settings, 'CUSTOM_FORMATS', None):
+            clam.common.data.CUSTOM_FORMATS = settings.CUSTOM_FORMATS
+    function = loadfunction(args.function)
+
+    jobs = 0
+    while True:
+        line = sys.stdin.readline()
+        if not line: #the supervisor went away
+            break
+        job = json.loads(line)
+        exitcode = runjob(function, job['projectdir'])
+        protocol.write(json.dumps({'exitcode': exitcode}).encode('utf-8') + b"\n")
+        jobs += 1
+        if args.maxjobs and jobs >= args.maxjobs:
+            break
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,258 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Streaming archives --
+#       by Maarten van Gompel (proycon)
+#       http://ilk.uvt.nl/~mvgompel
+#       Induction for Linguistic Knowledge Research Group
+#       Universiteit van Tilburg
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+#Builds zip and tar archives on the fly: the archive is yielded in chunks
+#while the files are being read, so a download can start right away and no
+#archive has to be written to disk first. Alternatively, archives can be
+#kept in a cache (ArchiveCache) so repeated downloads of the same output do
+#not build the same archive over and over again.
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import os
+import io
+import sys
+import time
+import shutil
+import hashlib
+import fcntl
+import zipfile
+import tarfile
+try:
+    import lzma #pylint: disable=unused-import
+except ImportError: #not available on Python 2
+    lzma = None
+
+CHUNKSIZE = 64 * 1024
+
+FORMATS = ('zip','tar','tar.gz','tar.bz2','tar.xz')
+
+#files with these extensions are already compressed, deflating them again is a waste of time
+COMPRESSED_EXTENSIONS = ('.zip','.gz','.tgz','.bz2','.xz','.lzma','.7z','.rar','.jpg','.jpeg','.png','.gif','.webp','.mp3','.ogg','.opus','.flac','.mp4','.mkv','.webm','.avi','.docx','.xlsx','.pptx','.odt','.ods','.odp','.epub')
+
+
+class StreamBuffer(object):
+    """Write-only file-like object that holds what is written to it until it is taken out with pop()"""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0 #number of bytes held
+        self.position = 0 #number of bytes written in total
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return data
+
+
+def supported(format):
+    """Can archives in this format be made here?"""
+    if format == 'tar.xz' and lzma is None:
+        return False
+    return format in FORMATS
+
+def listfiles(path, exclude=(), prefix=""):
+    """Yields (filename, name in archive) tuples for all files under path, recursively, in sorted order. Hidden files (and those with a name in exclude) are skipped. Symbolic links are followed"""
+    for name in sorted(os.listdir(path)):
+        if name[0] == '.' or name in exclude:
+            continue
+        filename = os.path.join(path, name)
+        if os.path.isdir(filename):
+            for result in listfiles(filename, exclude, prefix + name + '/'):
+                yield result
+        elif os.path.isfile(filename):
+            yield filename, prefix + name
+
+def stream(path, format, exclude=()):
+    """Returns a generator yielding an archive (in the specified format, see FORMATS) of all files under path"""
+    if format == 'zip':
+        chunks = streamzip(path, exclude)
+    elif format == 'tar':
+        chunks = streamtar(path, '', exclude)
+    elif format in FORMATS:
+        chunks = streamtar(path, format.split('.')[1], exclude)
+    else:
+        raise ValueError("Unsupported archive format: " + format)
+    return ( chunk for chunk in chunks if chunk )
+
+def streamzip(path, exclude=()):
+    buffer = StreamBuffer()
+    archive = zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED, True) #the buffer is not seekable, sizes and checksums are written after each file
+    for filename, arcname in listfiles(path, exclude):
+        if os.path.splitext(filename)[1].lower() in COMPRESSED_EXTENSIONS:
+            compression = zipfile.ZIP_STORED
+        else:
+            compression = zipfile.ZIP_DEFLATED
+        try:
+            f = io.open(filename,'rb')
+        except IOError: #disappeared in the meantime
+            continue
+        with f:
+            if sys.version_info >= (3,6):
+                zinfo = zipfile.ZipInfo.from_file(filename, arcname)
+                zinfo.compress_type = compression
+                with archive.open(zinfo, 'w') as member:
+                    while True:
+                        data = f.read(CHUNKSIZE)
+                        if not data:
+                            break
+                        member.write(data)
+                        if buffer.size >= CHUNKSIZE:
+                            yield buffer.pop()
+            else:
+                #older versions can not write members incrementally, so each file is held in memory once
+                stat = os.fstat(f.fileno())
+                zinfo = zipfile.ZipInfo(arcname, time.localtime(stat.st_mtime)[:6])
+                zinfo.external_attr = (stat.st_mode & 0xFFFF) << 16
+                zinfo.compress_type = compression
+                archive.writestr(zinfo, f.read())
+        yield buffer.pop()
+    archive.close() #writes the central directory
+    yield buffer.pop()
+
+def streamtar(path, compression='', exclude=()):
+    buffer = StreamBuffer()
+    archive = tarfile.open(fileobj=buffer, mode='w|' + compression)
+    for filename, arcname in listfiles(path, exclude):
+        try:
+            f = io.open(filename,'rb')
+        except IOError: #disappeared in the meantime
+            continue
+        with f:
+            #this does what TarFile.addfile() does, but yields in between
+            tarinfo = archive.gettarinfo(arcname=arcname, fileobj=f)
+            header = tarinfo.tobuf(archive.format, archive.encoding, archive.errors)
+            archive.fileobj.write(header)
+            remaining = tarinfo.size
+            while remaining > 0:
+                data = f.read(min(CHUNKSIZE, remaining))
+                if not data: #file shrunk in the meantime, the size in the header is what counts
+                    data = tarfile.NUL * min(CHUNKSIZE, remaining)
+                archive.fileobj.write(data)
+                remaining -= len(data)
+                if buffer.size >= CHUNKSIZE:
+                    yield buffer.pop()
+            blocks, remainder = divmod(tarinfo.size, tarfile.BLOCKSIZE)
+            if remainder > 0:
+                archive.fileobj.write(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+                blocks += 1
+            archive.offset += len(header) + blocks * tarfile.BLOCKSIZE
+        yield buffer.pop()
+    archive.close() #writes the end-of-archive blocks and flushes the compressor
+    yield buffer.pop()
+
+def manifest(path, exclude=()):
+    """Returns a hash of the names, sizes and modification times of all files that go into an archive of path, it changes whenever any of these files changes"""
+    checksum = hashlib.sha1()
+    for filename, arcname in listfiles(path, exclude):
+        try:
+            stat = os.stat(filename)
+        except OSError: #disappeared in the meantime
+            continue
+        checksum.update(("%s\t%d\t%d\n" % (arcname, stat.st_size, int(stat.st_mtime * 1000000))).encode('utf-8'))
+    return checksum.hexdigest()
+
+def cachedir(projectdir):
+    """Returns the directory where archives of a project are cached: $ROOT/archives/$USER/$PROJECT/ for project directory $ROOT/projects/$USER/$PROJECT/"""
+    projectdir = os.path.abspath(projectdir)
+    userdir = os.path.dirname(projectdir)
+    root = os.path.dirname(os.path.dirname(userdir))
+    return os.path.join(root, 'archives', os.path.basename(userdir), os.path.basename(projectdir)) + '/'
+
+def invalidate(projectdir):
+    """Removes all cached archives of a project, to be called whenever its output changes"""
+    shutil.rmtree(cachedir(projectdir), ignore_errors=True)
+
+
+class ArchiveCache(object):
+    """Cache of output archives, keyed by the manifest of the output directory so any change in the output results in a new archive. The least recently used archives are removed when the cache grows beyond maxsize (bytes)"""
+
+    def __init__(self, root, maxsize):
+        self.root = root
+        self.maxsize = maxsize
+
+    def get(self, projectdir, format, exclude=()):
+        """Returns the filename of the cached archive of the project's output in the specified format, building it first if needed. Concurrent requests for the same archive wait for a single build"""
+        path = os.path.join(projectdir, 'output') + '/'
+        directory = cachedir(projectdir)
+        filename = directory + manifest(path, exclude) + '.' + format
+        if not os.path.isfile(filename):
+            if not os.path.isdir(directory):
+                try:
+                    os.makedirs(directory)
+                except OSError: #created by a concurrent request
+                    pass
+            with io.open(filename + '.lock','wb') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX) #blocks while another process is building this archive
+                try:
+                    if not os.path.isfile(filename): #not built by whoever held the lock before us
+                        self.build(path, format, exclude, filename)
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+            self.evict(filename)
+        else:
+            os.utime(filename, None) #marks it as recently used
+        return filename
+
+    def build(self, path, format, exclude, filename):
+        tmpfilename = filename + '.' + str(os.getpid()) + '.tmp'
+        try:
+            with io.open(tmpfilename,'wb') as f:
+                for chunk in stream(path, format, exclude):
+                    f.write(chunk)
+            os.rename(tmpfilename, filename) #atomic, so an archive is never served half-written
+        except:
+            if os.path.exists(tmpfilename):
+                os.unlink(tmpfilename)
+            raise
+
+    def evict(self, keep=None):
+        """Removes the least recently used archives until the cache is within its size budget, the archive named by keep is never removed"""
+        archives = []
+        total = 0
+        for directory, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith('.lock') or name.endswith('.tmp'):
+                    continue
+                filename = os.path.join(directory, name)
+                try:
+                    stat = os.stat(filename)
+                except OSError:
+                    continue
+                archives.append( (stat.st_mtime, stat.st_size, filename) )
+                total += stat.st_size
+        archives.sort()
+        for _, size, filename in archives:
+            if total <= self.maxsize:
+                break
+            if filename == keep:
+                continue
+            try:
+                os.unlink(filename)
+            except OSError:
+                pass
+            total -= size
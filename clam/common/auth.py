@@ -18,6 +18,9 @@ from hashlib import md5
 from random import Random, SystemRandom
 from glob import glob
 import time
+import threading
+import sqlite3
+import importlib
 import flask
 
 import clam.common.oauth
@@ -149,7 +152,7 @@ class HTTPDigestAuth(HTTPAuth):
         else:
             self.nonceexpiration = 900
 
-        self.noncememory = NonceMemory(noncedir, self.nonceexpiration)
+        self.noncememory = getnoncememory(kwargs.get('noncememory'), noncedir, self.nonceexpiration)
 
         self.printdebug("Initialising Digest Authentication with realm " + self.realm)
 
@@ -374,11 +377,10 @@ class OAuth2(HTTPAuth):
             return f(*args,**kwargs)
         return decorated
 
-class NonceMemory:
-    """File-based nonce-memory (so it can work with multiple workers). Includes expiration per nonce and and IP-check"""
+class NonceMemory(object):
+    """Abstract base class for nonce memories. Includes expiration per nonce and and IP-check"""
 
-    def __init__(self, path, expiration,debug=False):
-        self.path = path
+    def __init__(self, expiration, debug=False):
         self.expiration = expiration
         self.debug = debug
 
@@ -390,16 +392,12 @@ class NonceMemory:
 
     def getnew(self, expiration=None, opaque=None):
         if expiration is None: expiration = self.expiration
-        self.cleanup() #first cleanup current nonces before making a new one, this has some I/O overhead but amount of nonces should be limited
         nonce = md5(str(self.random.random()).encode('utf-8')).hexdigest()
         if self.debug: print("Generated new nonce " + nonce,file=sys.stderr)
         if opaque is None:
             #Generate a random opaque if none was given
             opaque = md5(str(self.random.random()).encode('utf-8')).hexdigest()
-        with open(self.path + '/' + nonce + '.nonce','w') as f:
-            f.write(opaque + "\n")
-            f.write(flask.request.remote_addr + "\n")
-            f.write(str(time.time() + expiration) + "\n")
+        self.add(nonce, opaque, flask.request.remote_addr, time.time() + expiration)
         return nonce
 
     def validate(self, nonce):
@@ -418,9 +416,38 @@ class NonceMemory:
             else:
                 return True
         except KeyError:
-            if self.debug: print("Nonce " + nonce + " does not exist",file=sys.stderr)
+            if self.debug: print("Nonce " + str(nonce) + " does not exist",file=sys.stderr)
             return False
 
+    def add(self, nonce, opaque, ip, expiretime):
+        raise NotImplementedError
+
+    def get(self, nonce):
+        """Returns an (opaque,ip,expiretime) tuple, raises KeyError if the nonce does not exist"""
+        raise NotImplementedError
+
+    def remove(self, nonce):
+        raise NotImplementedError
+
+
+class FileNonceMemory(NonceMemory):
+    """File-based nonce-memory, one file per nonce (so it can work with multiple workers)"""
+
+    CLEANUPINTERVAL = 60 #seconds between scans for expired nonce files
+
+    def __init__(self, path, expiration, debug=False):
+        super(FileNonceMemory, self).__init__(expiration, debug)
+        self.path = path
+        self.lastcleanup = 0
+
+    def add(self, nonce, opaque, ip, expiretime):
+        if time.time() - self.lastcleanup > self.CLEANUPINTERVAL:
+            self.cleanup()
+        with open(self.path + '/' + nonce + '.nonce','w') as f:
+            f.write(opaque + "\n")
+            f.write(ip + "\n")
+            f.write(str(expiretime) + "\n")
+
     def remove(self, nonce):
         noncefile = self.path + '/' + nonce + '.nonce'
         if os.path.exists(noncefile):
@@ -444,9 +471,112 @@ class NonceMemory:
 
     def cleanup(self):
         """Delete expired nonces"""
-        t = time.time()
+        t = self.lastcleanup = time.time()
         for noncefile in glob(self.path + '/*.nonce'):
-            if os.path.getmtime(noncefile) + self.expiration > t:
-                os.unlink(noncefile)
+            if os.path.getmtime(noncefile) + self.expiration < t:
+                try:
+                    os.unlink(noncefile)
+                except OSError: #removed by another worker in the meantime
+                    pass
+
+
+class DictNonceMemory(NonceMemory):
+    """In-memory nonce-memory, for services that run in a single process. Expired nonces are dropped using a time wheel, so all operations are O(1)"""
+
+    def __init__(self, expiration, debug=False, granularity=10):
+        super(DictNonceMemory, self).__init__(expiration, debug)
+        self.nonces = {} #nonce => (opaque, ip, expiretime)
+        self.wheel = {} #slot => nonces that expire during that slot (of granularity seconds)
+        self.granularity = granularity
+        self.slot = int(time.time() // granularity) #the first slot that has not been expired yet
+        self.lock = threading.Lock()
+
+    def expire(self):
+        """Drop the nonces of all slots that have passed (call with the lock held)"""
+        now = int(time.time() // self.granularity)
+        if now - self.slot > len(self.wheel):
+            slots = [ slot for slot in self.wheel if slot < now ]
+        else:
+            slots = range(self.slot, now)
+        for slot in slots:
+            for nonce in self.wheel.pop(slot, ()):
+                self.nonces.pop(nonce, None)
+        self.slot = max(self.slot, now)
+
+    def add(self, nonce, opaque, ip, expiretime):
+        with self.lock:
+            self.expire()
+            self.nonces[nonce] = (opaque, ip, expiretime)
+            self.wheel.setdefault(max(self.slot, int(expiretime // self.granularity)), []).append(nonce)
+
+    def get(self, nonce):
+        if not nonce: raise KeyError("No nonce supplied")
+        with self.lock:
+            self.expire()
+            try:
+                return self.nonces[nonce]
+            except KeyError:
+                raise KeyError("No such nonce: " + nonce)
+
+    def remove(self, nonce):
+        with self.lock:
+            self.nonces.pop(nonce, None)
+
+
+class SQLiteNonceMemory(NonceMemory):
+    """Nonce-memory in an SQLite database (in WAL mode), shared by all workers"""
+
+    CLEANUPINTERVAL = 60 #seconds between deletions of expired nonces
+
+    def __init__(self, dbfile, expiration, debug=False):
+        super(SQLiteNonceMemory, self).__init__(expiration, debug)
+        self.dbfile = dbfile
+        self.local = threading.local()
+        self.lastcleanup = 0
+        db = self.connection()
+        db.execute("CREATE TABLE IF NOT EXISTS nonces (nonce TEXT NOT NULL PRIMARY KEY, opaque TEXT NOT NULL, ip TEXT NOT NULL, expires REAL NOT NULL)")
+        db.execute("CREATE INDEX IF NOT EXISTS expires ON nonces (expires)")
+
+    def connection(self):
+        #one connection per thread and per process (connections must not be shared with forked children)
+        if getattr(self.local, 'pid', None) != os.getpid():
+            db = sqlite3.connect(self.dbfile, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db = db
+            self.local.pid = os.getpid()
+        return self.local.db
+
+    def add(self, nonce, opaque, ip, expiretime):
+        db = self.connection()
+        if time.time() - self.lastcleanup > self.CLEANUPINTERVAL:
+            self.lastcleanup = time.time()
+            db.execute("DELETE FROM nonces WHERE expires < ?", (self.lastcleanup,))
+        db.execute("INSERT OR REPLACE INTO nonces (nonce, opaque, ip, expires) VALUES (?, ?, ?, ?)", (nonce, opaque, ip, expiretime))
+
+    def get(self, nonce):
+        if not nonce: raise KeyError("No nonce supplied")
+        row = self.connection().execute("SELECT opaque, ip, expires FROM nonces WHERE nonce = ?", (nonce,)).fetchone()
+        if row is None:
+            raise KeyError("No such nonce: " + nonce)
+        return tuple(row)
+
+    def remove(self, nonce):
+        self.connection().execute("DELETE FROM nonces WHERE nonce = ?", (nonce,))
+
+
+def getnoncememory(name, sessiondir, expiration, debug=False):
+    """Instantiate a nonce-memory by name: 'sqlite' (default), 'memory' (single process only), 'files', or the full module path of a NonceMemory subclass (e.g. mymodule.MyNonceMemory), which is passed the session directory and expiration"""
+    if not name or name == 'sqlite':
+        return SQLiteNonceMemory(os.path.join(sessiondir, 'nonces.sqlite'), expiration, debug)
+    elif name == 'memory':
+        return DictNonceMemory(expiration, debug)
+    elif name == 'files':
+        return FileNonceMemory(sessiondir, expiration, debug)
+    elif '.' in name:
+        modulename, classname = name.rsplit('.',1)
+        return getattr(importlib.import_module(modulename), classname)(sessiondir, expiration, debug)
+    else:
+        raise ValueError("No such nonce memory: " + name)
 
 
@@ -20,6 +20,8 @@ from __future__ import print_function, unicode_literals, division, absolute_impo
 
 import os.path
 import sys
+import json
+import time
 import requests
 import certifi
 from requests_toolbelt import MultipartEncoder #pylint: disable=import-error
@@ -172,7 +174,7 @@ class CLAMClient:
             raise clam.common.data.ServerError(r.text)
         elif r.status_code == 405:
             raise clam.common.data.ServerError("Server returned 405: Method not allowed for " + method + " on " + self.url + url)
-        elif r.status_code == 408:
+        elif r.status_code in (408, 504):
             raise clam.common.data.TimeOut()
         elif not (r.status_code >= 200 and r.status_code <= 299):
             raise Exception("An error occured, return code " + str(r.status_code))
@@ -195,14 +197,23 @@ class CLAMClient:
         else:
             return True
 
-    def index(self):
-        """Get index of projects. Returns a ``CLAMData`` instance. Use CLAMData.projects for the index of projects."""
+    def index(self, offset=0, limit=None):
+        """Get index of projects. Returns a ``CLAMData`` instance. Use CLAMData.projects for the index of projects. Set ``limit`` to retrieve only one page of projects, starting at ``offset``; CLAMData.projectcount then holds the total number of projects."""
+        if offset or limit:
+            return self.request('?offset=' + str(int(offset)) + ('&limit=' + str(int(limit)) if limit else ''))
         return self.request('')
 
-    def get(self, project):
-        """Query the project status. Returns a ``CLAMData`` instance or raises an exception according to the returned HTTP Status code"""
+    def get(self, project, statusloglimit=None, pagesize=None, files=None):
+        """Query the project status. Returns a ``CLAMData`` instance or raises an exception according to the returned HTTP Status code. Set ``statusloglimit`` to only retrieve the most recent entries of the status log. Set ``pagesize`` to only retrieve the first ``pagesize`` input and output files, further pages are then fetched as ``CLAMData.input``/``CLAMData.output`` are accessed. Set ``files`` to ``none``, ``input`` or ``output`` to not list all files"""
+        params = []
+        if statusloglimit:
+            params.append('statusloglimit=' + str(int(statusloglimit)))
+        if pagesize:
+            params.append('limit=' + str(int(pagesize)))
+        if files:
+            params.append('files=' + files)
         try:
-            data = self.request(project + '/')
+            data = self.request(project + '/' + ('?' + '&'.join(params) if params else ''))
         except:
             raise
         if not isinstance(data, clam.common.data.CLAMData):
@@ -211,6 +222,17 @@ class CLAMClient:
             return data
 
 
+    def files(self, project, files='all', offset=0, limit=None, template=None, since=None):
+        """Get a compact listing of the input and/or output files (``files`` is ``all``, ``input`` or ``output``) of a project, at most ``limit`` of them starting at ``offset``, optionally only those of the specified ``template`` or modified after ``since`` (unix time). Returns a dictionary with, per kind, the total ``count`` and the ``files`` on the page (each with ``name``, ``template``, ``size`` and ``modified``)"""
+        url = project + '/files/?files=' + files + '&offset=' + str(int(offset))
+        if limit:
+            url += '&limit=' + str(int(limit))
+        if template:
+            url += '&template=' + template
+        if since:
+            url += '&since=' + str(since)
+        return json.loads(self.request(url, parse=False))
+
     def create(self,project):
         """Create a new project::
 
@@ -274,6 +296,33 @@ class CLAMClient:
             raise
 
 
+    def wait(self, project, timeout=None, callback=None, interval=60):
+        """Wait until the project is done (or no longer running at least), without polling: the server holds each request until there is news (long polling). Returns the final ``CLAMData`` (as ``get()``). If ``timeout`` (seconds) expires first, the ``CLAMData`` at that point is returned, check its ``status``. If set, ``callback`` is called with a dictionary (``statuscode``, ``statusmsg``, ``statuslog`` with only the new entries, ``completion``) on every update::
+
+            client.start("myprojectname")
+            data = client.wait("myprojectname")
+        """
+        begintime = time.time()
+        since = 0
+        statuscode = None
+        while True:
+            wait = interval
+            if timeout is not None:
+                wait = min(wait, int(begintime + timeout - time.time()))
+                if wait <= 0:
+                    break
+            url = project + '/status/stream?wait=' + str(wait) + '&since=' + str(since)
+            if statuscode is not None:
+                url += '&statuscode=' + str(statuscode)
+            update = json.loads(self.request(url, parse=False))
+            if callback is not None and (update['statuscode'] != statuscode or update['offset'] != since):
+                callback(update)
+            since = update['offset']
+            statuscode = update['statuscode']
+            if statuscode not in (clam.common.status.RUNNING, clam.common.status.QUEUED):
+                break
+        return self.get(project)
+
     def delete(self,project):
         """aborts AND deletes a project::
 
@@ -293,7 +342,7 @@ class CLAMClient:
         """Download all output files as a single archive:
 
         * *targetfile* - path for the new local file to be written
-        * *archiveformat* - the format of the archive, can be 'zip','gz','bz2'
+        * *archiveformat* - the format of the archive, can be 'zip','gz','bz2','xz'
 
         Example::
 
@@ -310,6 +359,69 @@ class CLAMClient:
                 targetfile.flush()
         targetfile.close()
 
+    def run(self, inputfiles, targetfile, archiveformat=None, **parameters):
+        """Process input files in a single request, without creating a project, and download the output. Meant for small inputs, the request lasts until the system is done.
+
+        * *inputfiles* - list of ``(inputtemplate, sourcefile)`` or ``(inputtemplate, sourcefile, filename)`` tuples, where inputtemplate is an ID or ``InputTemplate`` instance, and sourcefile a filename or file object
+        * *targetfile* - path for the new local file to be written (or a file object)
+        * *archiveformat* - always receive an archive in this format ('zip','tar.gz','tar.bz2','tar.xz'), by default a single output file is received as is and multiple output files as a zip archive
+
+        Keyword arguments are the global parameters, metadata parameters for the input files are passed as ``inputtemplate_parameter``. Returns the name of the received file (the output file or archive).
+
+        Example::
+
+            client.run([("textinput","/path/to/local/file")], "result.txt", textinput_encoding="utf-8", parameter1="blah")
+
+        """
+        files = []
+        for inputfile in inputfiles:
+            inputtemplate, sourcefile = inputfile[:2]
+            if isinstance(inputtemplate, clam.common.data.InputTemplate):
+                inputtemplate = inputtemplate.id
+            if not isinstance(sourcefile, IOBase):
+                sourcefile = open(sourcefile,'rb')
+            filename = inputfile[2] if len(inputfile) > 2 else os.path.basename(getattr(sourcefile,'name',inputtemplate))
+            files.append( (inputtemplate, (filename, sourcefile)) )
+        for key in parameters:
+            if isinstance(parameters[key],list) or isinstance(parameters[key],tuple):
+                parameters[key] = ",".join(parameters[key])
+        if archiveformat:
+            parameters['format'] = archiveformat
+
+        requestparams = self.initrequest(parameters)
+        requestparams['files'] = files
+        r = requests.post(self.url + 'run/', stream=True, **requestparams)
+        for _, (_, sourcefile) in files:
+            sourcefile.close()
+
+        if r.status_code == 400:
+            raise clam.common.data.BadRequest()
+        elif r.status_code == 401:
+            raise clam.common.data.AuthRequired()
+        elif r.status_code == 403:
+            self._parse(r.text) #raises ParameterError on parameter errors
+            raise clam.common.data.PermissionDenied(r.text)
+        elif r.status_code == 404:
+            raise clam.common.data.NotFound(r.text)
+        elif r.status_code == 500:
+            raise clam.common.data.ServerError(r.text)
+        elif r.status_code == 504:
+            raise clam.common.data.TimeOut()
+        elif not (r.status_code >= 200 and r.status_code <= 299):
+            raise Exception("An error occured, return code " + str(r.status_code))
+
+        if isinstance(targetfile,str) or (sys.version < '3' and isinstance(targetfile,unicode)): #pylint: disable=undefined-variable
+            targetfile = open(targetfile,'wb')
+        CHUNK = 16 * 1024
+        for chunk in r.iter_content(chunk_size=CHUNK):
+            if chunk: # filter out keep-alive new chunks
+                targetfile.write(chunk)
+        targetfile.close()
+        disposition = r.headers.get('Content-Disposition','')
+        if 'filename="' in disposition:
+            return disposition.split('filename="',1)[1].rstrip('"')
+        return None
+
     def getinputfilename(self, inputtemplate, filename):
         """Determine the final filename for an input file given an inputtemplate and a given filename.
 
@@ -24,6 +24,11 @@ import os.path
 import io
 import json
 import time
+import shutil
+import sqlite3
+import threading
+import mmap
+import array
 from copy import copy
 from lxml import etree as ElementTree
 if sys.version < '3':
@@ -47,6 +52,38 @@ DISALLOWINSHELLSAFE = ('|','&',';','!','<','>','{','}','`','\n','\r','\t')
 
 CUSTOM_FORMATS = []  #will be injected
 
+FORMATREGISTRY = {} #format class name => format class, built by getformatclass() from CUSTOM_FORMATS and clam.common.formats
+FORMATREGISTRY_SOURCE = None #the CUSTOM_FORMATS the registry was built from
+
+METADATASTORES = clam.common.util.LRUCache(100) #(store path, mtime, size) => read-only MetadataStore, see MetadataStore.reader()
+METADATACACHE = clam.common.util.LRUCache(10000) #(metadata file, mtime, size) => (format class, data), of metadata read from disk; the webservice sets the size from METADATACACHE_SIZE (0 to disable)
+
+def getformatclass(dataformat):
+    """Returns the format class with the specified name (custom formats take precedence over those in clam.common.formats), or None"""
+    global FORMATREGISTRY, FORMATREGISTRY_SOURCE #pylint: disable=global-statement
+    if FORMATREGISTRY_SOURCE != (id(CUSTOM_FORMATS), len(CUSTOM_FORMATS)):
+        #(re)build the registry, CUSTOM_FORMATS was injected or changed since
+        registry = {}
+        for name, C in vars(clam.common.formats).items():
+            if isinstance(C, type) and issubclass(C, CLAMMetaData):
+                registry[name] = C
+        for C in reversed(CUSTOM_FORMATS):
+            registry[C.__name__] = C
+        FORMATREGISTRY = registry
+        FORMATREGISTRY_SOURCE = (id(CUSTOM_FORMATS), len(CUSTOM_FORMATS))
+    return FORMATREGISTRY.get(dataformat)
+
+def indextemplates(profiles):
+    """Returns an (inputtemplates, outputtemplates) tuple of dictionaries mapping template IDs to the (first) template with that ID in the profiles, to pass to CLAMFile.attachviewers()"""
+    inputtemplates = {}
+    outputtemplates = {}
+    for profile in profiles:
+        for t in profile.input:
+            inputtemplates.setdefault(t.id, t)
+        for t in profile.outputtemplates():
+            outputtemplates.setdefault(t.id, t)
+    return inputtemplates, outputtemplates
+
 class BadRequest(Exception):
     def __init__(self):
         super(BadRequest, self).__init__()
@@ -171,6 +208,9 @@ class AuthenticationRequired(Exception):
     """This Exception is raised when authentication is required but has not been provided"""
     pass
 
+#typecode for line indices (unsigned 64-bit offsets, Python 2 has no 'Q' typecode)
+LINEINDEXTYPE = str('Q') if sys.version_info[0] >= 3 else str('L')
+
 class CLAMFile:
     basedir = ''
 
@@ -195,9 +235,23 @@ class CLAMFile:
         self.converters = []
 
 
-    def attachviewers(self, profiles):
-        """Attach viewers *and converters* to file, automatically scan all profiles for outputtemplate or inputtemplate"""
-        if self.metadata:
+    def attachviewers(self, profiles, templates=None):
+        """Attach viewers *and converters* to file, automatically scan all profiles for outputtemplate or inputtemplate (or look them up in templates, as returned by indextemplates(profiles))"""
+        if self.metadata and templates is not None:
+            template = None
+            if isinstance(self, CLAMInputFile):
+                template = templates[0].get(self.metadata.inputtemplate)
+            elif isinstance(self, CLAMOutputFile) and self.metadata.provenance:
+                template = templates[1].get(self.metadata.provenance.outputtemplate_id)
+            elif profiles:
+                raise NotImplementedError #Is ok, nothing to implement for now
+            if template and template.viewers:
+                for viewer in template.viewers:
+                    self.viewers.append(viewer)
+            if template and template.converters:
+                for converter in template.converters:
+                    self.converters.append(converter)
+        elif self.metadata:
             template = None
             for profile in profiles:
                 if isinstance(self, CLAMInputFile):
@@ -228,16 +282,54 @@ class CLAMFile:
         metafilename += '.' + os.path.basename(self.filename) + '.METADATA'
         return metafilename
 
+    def lineindexfilename(self):
+        """Returns the filename for the cached line index (not full path). Only used for local files."""
+        indexfilename = os.path.dirname(self.filename)
+        if indexfilename: indexfilename += '/'
+        indexfilename += '.' + os.path.basename(self.filename) + '.LINEINDEX'
+        return indexfilename
+
     def loadmetadata(self):
         """Load metadata for this file. This is usually called automatically upon instantiation, except if explicitly disabled. Works both locally as well as for clients connecting to a CLAM service."""
         if not self.remote:
             metafile = self.projectpath + self.basedir + '/' + self.metafilename()
-            if os.path.exists(metafile):
-                f = io.open(metafile, 'r',encoding='utf-8')
-                xml = "".join(f.readlines())
-                f.close()
+            xml = None
+            try:
+                stat = os.stat(metafile)
+            except OSError:
+                stat = None
+            store = None
+            if stat is not None:
+                cachekey = (metafile, getattr(stat, 'st_mtime_ns', stat.st_mtime), stat.st_size)
             else:
+                store = MetadataStore.reader(self.projectpath + self.basedir)
+                cachekey = store.key + (self.filename,) if store is not None else None
+            if cachekey is not None:
+                #metadata that was parsed before is reused as long as the file (or the store) is unchanged
+                cached = METADATACACHE.get(cachekey) if METADATACACHE.maxsize else None
+                if cached is not None:
+                    formatclass, data = cached
+                    self.metadata = formatclass(self, **CLAMMetaData.copydata(data)) #the cached data is shared, its provenance must not be
+                    return
+                if store is None:
+                    f = io.open(metafile, 'r',encoding='utf-8')
+                    xml = "".join(f.readlines())
+                    f.close()
+                else:
+                    try:
+                        xml = store.get(self.filename)
+                    except sqlite3.Error:
+                        pass
+            if xml is None:
                 raise IOError(2, "No metadata found, expected " + metafile )
+            try:
+                formatclass, data = CLAMMetaData.parsexml(xml)
+            except ElementTree.XMLSyntaxError:
+                raise ValueError("Metadata is not XML! Contents: " + xml)
+            if METADATACACHE.maxsize:
+                METADATACACHE.set(cachekey, (formatclass, data))
+            self.metadata = formatclass(self, **CLAMMetaData.copydata(data)) #the cached data is shared, its provenance must not be
+            return
         else:
             if self.client:
                 requestparams = self.client.initrequest()
@@ -257,39 +349,117 @@ class CLAMFile:
         except ElementTree.XMLSyntaxError:
             raise ValueError("Metadata is not XML! Contents: " + xml)
 
-    def __iter__(self):
-        """Read the lines of the file, one by one without loading the file into memory."""
+    def open(self, binary=False):
+        """Open the file for reading and return a file-like object. Files with an encoding in their metadata are opened in text mode (decoding on the fly), other files (or all if binary is set) in binary mode. Works for local as well as remote files, remote files are streamed"""
         if not self.remote:
             fullpath = self.projectpath + self.basedir + '/' + self.filename
             if not os.path.exists(fullpath):
                 raise FileNotFoundError("No such file or directory: " + fullpath )
-            if self.metadata and 'encoding' in self.metadata:
-                for line in io.open(fullpath, 'r', encoding=self.metadata['encoding']).readlines():
-                    yield line
+            if not binary and self.metadata and 'encoding' in self.metadata:
+                return io.open(fullpath, 'r', encoding=self.metadata['encoding'])
             else:
-                for line in io.open(fullpath, 'rb').readlines():
-                    yield line
+                return io.open(fullpath, 'rb')
         else:
-            fullpath = self.projectpath + self.basedir + '/' + self.filename
             if self.client:
                 requestparams = self.client.initrequest()
             else:
                 requestparams = {}
             requestparams['stream'] = True
             response = requests.get(self.projectpath + self.basedir + '/' + self.filename, **requestparams)
-            if self.metadata and 'encoding' in self.metadata:
-                for line in response.iter_lines():
-                    #\n is stripped, re-add (should also work fine on binary files)
-                    if sys.version[0] < '3' and not isinstance(line,unicode): #pylint: disable=undefined-variable
-                        yield unicode(line, self.metadata['encoding']) + "\n" #pylint: disable=undefined-variable
-                    elif sys.version[0] >= '3' and not isinstance(line,str):
-                        yield str(line, self.metadata['encoding']) + "\n"
-                    else:
-                        yield line + b'\n'
+            if response.status_code != 200:
+                raise HTTPError(2, "Can't download " + self.filename + " (HTTP " + str(response.status_code) + ")")
+            response.raw.decode_content = True
+            response.raw.auto_close = False #only closed when the caller closes it, buffered data may still be pending when the body is exhausted
+            if not binary and self.metadata and 'encoding' in self.metadata:
+                return io.TextIOWrapper(response.raw, encoding=self.metadata['encoding'])
             else:
-                CHUNKSIZE = 64*1024
-                for line in response.iter_content(CHUNKSIZE):
-                    yield line
+                return response.raw
+
+    def __iter__(self):
+        """Read the lines of the file, one by one without loading the file into memory."""
+        with self.open() as f:
+            for line in f:
+                yield line
+
+    def iterchunks(self, blocksize=64*1024):
+        """Read the file in binary blocks of the specified size, without loading the file into memory."""
+        with self.open(binary=True) as f:
+            while True:
+                data = f.read(blocksize)
+                if not data:
+                    break
+                yield data
+
+    def mmap(self):
+        """Map the file into memory, read-only, and return the mmap object. It can be sliced (or wrapped in a memoryview) to access any part of the file without copying it. Only works for local, non-empty files"""
+        if self.remote:
+            raise NotImplementedError("Remote files can not be memory-mapped")
+        with self.open(binary=True) as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) #the mapping remains valid after the file is closed
+
+    def lineindex(self):
+        """Returns an array with the byte offset at which each line starts. The index is built once and cached alongside the file's metadata, it is rebuilt when the file changes. Only works for local files"""
+        if self.remote:
+            raise NotImplementedError("No line index for remote files")
+        fullpath = self.projectpath + self.basedir + '/' + self.filename
+        indexfile = self.projectpath + self.basedir + '/' + self.lineindexfilename()
+        stat = os.stat(fullpath)
+        signature = (stat.st_size, int(stat.st_mtime * 1000000))
+        index = array.array(LINEINDEXTYPE)
+        try:
+            with io.open(indexfile,'rb') as f:
+                if sys.version_info[0] >= 3:
+                    index.frombytes(f.read())
+                else:
+                    index.fromstring(f.read())
+            if tuple(index[:2]) == signature:
+                return index[2:]
+        except (IOError, OSError, ValueError): #not cached yet, or unreadable
+            pass
+
+        index = array.array(LINEINDEXTYPE, signature)
+        if stat.st_size > 0:
+            data = self.mmap()
+            try:
+                offset = 0
+                while offset < stat.st_size:
+                    index.append(offset)
+                    offset = data.find(b'\n', offset) + 1
+                    if offset == 0: #last line has no trailing newline
+                        break
+            finally:
+                data.close()
+        try:
+            tmpfile = indexfile + '.' + str(os.getpid()) + '.tmp'
+            with io.open(tmpfile,'wb') as f:
+                if sys.version_info[0] >= 3:
+                    f.write(index.tobytes())
+                else:
+                    f.write(index.tostring())
+            os.rename(tmpfile, indexfile)
+        except (IOError, OSError): #no write permission, just don't cache it
+            pass
+        return index[2:]
+
+    def linerange(self, begin, end=None):
+        """Returns the (begin, end) byte offsets of lines begin up to (but not including) end, for instance to hand contiguous parts of a file to different workers. Line numbers are 0-indexed"""
+        index = self.lineindex()
+        size = os.path.getsize(str(self))
+        begin = index[begin] if begin < len(index) else size
+        end = index[end] if end is not None and end < len(index) else size
+        return (begin, end)
+
+    def line(self, nr):
+        """Returns line nr (0-indexed) of the file, using the line index. Decoded if the file has an encoding in its metadata. Only works for local files"""
+        begin, end = self.linerange(nr, nr+1)
+        if begin == end:
+            raise IndexError("No such line: " + str(nr))
+        with self.open(binary=True) as f:
+            f.seek(begin)
+            data = f.read(end - begin)
+        if self.metadata and 'encoding' in self.metadata:
+            return data.decode(self.metadata['encoding'])
+        return data
 
     def delete(self):
         """Delete this file"""
@@ -299,15 +469,26 @@ class CLAMFile:
             else:
                 os.unlink(self.projectpath + self.basedir + '/' + self.filename)
 
-            #Remove metadata
-            metafile = self.projectpath + self.basedir + '/' + self.metafilename()
-            if os.path.exists(metafile):
-                os.unlink(metafile)
-
-            #also remove any .*.INPUTTEMPLATE.* links that pointed to this file: simply remove all dead links
-            for linkf,realf in clam.common.util.globsymlinks(self.projectpath + self.basedir + '/.*.INPUTTEMPLATE.*'):
-                if not os.path.exists(realf):
-                    os.unlink(linkf)
+            #Remove metadata and line index
+            for metafile in (self.projectpath + self.basedir + '/' + self.metafilename(), self.projectpath + self.basedir + '/' + self.lineindexfilename()):
+                if os.path.exists(metafile):
+                    os.unlink(metafile)
+            if MetadataStore.exists(self.projectpath + self.basedir):
+                store = MetadataStore(self.projectpath + self.basedir)
+                try:
+                    store.remove(self.filename)
+                finally:
+                    store.close()
+
+            #also remove the .*.INPUTTEMPLATE.* links that pointed to this file
+            if self.basedir == 'input':
+                linkprefix = os.path.dirname(self.filename)
+                if linkprefix: linkprefix += '/'
+                linkprefix = self.projectpath + self.basedir + '/' + linkprefix + '.' + os.path.basename(self.filename) + '.INPUTTEMPLATE.'
+                for inputtemplate_id, seqnr in InputManifest(self.projectpath).inputtemplates(self.filename):
+                    if os.path.islink(linkprefix + inputtemplate_id + '.' + str(seqnr)):
+                        os.unlink(linkprefix + inputtemplate_id + '.' + str(seqnr))
+                InputManifest.remove(self.projectpath, self.filename)
 
             return True
         else:
@@ -324,25 +505,18 @@ class CLAMFile:
         return list(iter(self))
 
     def read(self):
-        """Loads all lines in memory"""
-        return "\n".join(iter(self))
+        """Loads the entire file in memory"""
+        with self.open() as f:
+            return f.read()
 
-    def copy(self, target, timeout=500):
-        """Copy or download this file to a new local file"""
-
-        if self.metadata and 'encoding' in self.metadata:
-            with io.open(target,'w', encoding=self.metadata['encoding']) as f:
-                for line in self:
-                    f.write(line)
+    def copy(self, target, timeout=500): #pylint: disable=unused-argument
+        """Copy or download this file to a new local file, byte for byte"""
+        if not self.remote:
+            shutil.copyfile(str(self), target) #uses sendfile() where the platform supports it
         else:
-            with io.open(target,'wb') as f:
-                for line in self:
-                    if sys.version < '3' and isinstance(line,unicode): #pylint: disable=undefined-variable
-                        f.write(line.encode('utf-8'))
-                    elif sys.version >= '3' and isinstance(line,str):
-                        f.write(line.encode('utf-8'))
-                    else:
-                        f.write(line)
+            with self.open(binary=True) as source:
+                with io.open(target,'wb') as f:
+                    shutil.copyfileobj(source, f, 64*1024)
 
     def validate(self):
         """Validate this file. Returns a boolean."""
@@ -361,6 +535,195 @@ class CLAMInputFile(CLAMFile):
 class CLAMOutputFile(CLAMFile):
     basedir = "output"
 
+class InputManifest(object):
+    """Index of the input files of a project by input template. It is kept in input/.inputmanifest, a log of JSON lines to which each added or deleted file appends an entry, so finding the files of a template needs no directory scans. Instantiating it loads a snapshot of the index."""
+
+    FILENAME = '.inputmanifest'
+
+    def __init__(self, projectpath):
+        self.templates = {} #inputtemplate id => {(seqnr, filename): metadata digest}, filenames relative to the input directory (like the links, a file may be added more than once)
+        self.byfile = {} #filename => set of (inputtemplate id, seqnr)
+        self.projectpath = projectpath
+        self.inputfiles = {} #filename => CLAMInputFile, loaded once per snapshot
+        self.sortedfiles = {} #inputtemplate id => result of files()
+        try:
+            with io.open(InputManifest.path(projectpath),'r',encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        self.apply(json.loads(line))
+        except IOError:
+            #no manifest (yet), the project predates it: derive it from the .*.INPUTTEMPLATE.* links
+            for entry in InputManifest.scan(projectpath):
+                self.apply(entry)
+
+    @staticmethod
+    def path(projectpath):
+        return os.path.join(projectpath, 'input', InputManifest.FILENAME)
+
+    @staticmethod
+    def scan(projectpath):
+        """Yields manifest entries for the files linked to input templates"""
+        inputpath = os.path.join(projectpath, 'input') + '/'
+        for linkf,realf in clam.common.util.globsymlinks(inputpath + '.*.INPUTTEMPLATE.*'):
+            inputtemplate_id, seqnr = linkf.split('.INPUTTEMPLATE.')[-1].rsplit('.',1)
+            yield ['+', inputtemplate_id, int(seqnr), realf[len(inputpath):], None]
+
+    def apply(self, entry):
+        if entry[0] == '+':
+            _, inputtemplate_id, seqnr, filename, digest = entry
+            self.templates.setdefault(inputtemplate_id, {})[(seqnr, filename)] = digest
+            self.byfile.setdefault(filename, set()).add( (inputtemplate_id, seqnr) )
+        elif entry[0] == '-':
+            for inputtemplate_id, seqnr in self.byfile.pop(entry[1], ()):
+                del self.templates[inputtemplate_id][(seqnr, entry[1])]
+        elif entry[0] == '-dir':
+            prefix = entry[1].rstrip('/') + '/'
+            for filename in [ filename for filename in self.byfile if filename.startswith(prefix) ]:
+                self.apply(['-', filename])
+
+    def files(self, inputtemplate_id):
+        """Returns a sorted list of (seqnr, filename) tuples for the input template"""
+        if inputtemplate_id not in self.sortedfiles:
+            self.sortedfiles[inputtemplate_id] = sorted(self.templates.get(inputtemplate_id, {}))
+        return self.sortedfiles[inputtemplate_id]
+
+    def inputfile(self, filename):
+        """Returns a CLAMInputFile for the input file (shared by all callers of this snapshot, so its metadata is only read once)"""
+        if filename not in self.inputfiles:
+            self.inputfiles[filename] = CLAMInputFile(self.projectpath, filename)
+        return self.inputfiles[filename]
+
+    def inputtemplates(self, filename):
+        """Returns (inputtemplate id, seqnr) tuples for all templates the file was added for"""
+        return sorted(self.byfile.get(filename, ()))
+
+    @staticmethod
+    def append(projectpath, *entries):
+        manifestfile = InputManifest.path(projectpath)
+        if not os.path.exists(manifestfile):
+            entries = list(InputManifest.scan(projectpath)) + list(entries)
+        #a single write of each line in append mode, so concurrent uploads do not clobber each other's entries
+        with io.open(manifestfile,'a',encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+
+    @staticmethod
+    def add(projectpath, inputtemplate_id, seqnr, filename, digest=None):
+        """Register an input file (filename relative to the input directory)"""
+        InputManifest.append(projectpath, ['+', inputtemplate_id, seqnr, filename, digest])
+
+    @staticmethod
+    def remove(projectpath, filename, directory=False):
+        """Unregister an input file, or all input files in a directory"""
+        InputManifest.append(projectpath, ['-dir' if directory else '-', filename])
+
+class MetadataStore(object):
+    """The metadata of the files in a directory, kept in a single SQLite database (.METADATA.sqlite) rather than in a .METADATA file per file. The profiler uses it for the output files if OUTPUTMETADATA = 'sqlite'"""
+
+    FILENAME = '.METADATA.sqlite'
+
+    def __init__(self, directory, readonly=False):
+        self.lock = threading.Lock() #read-only stores are shared between threads, see reader()
+        self.key = None
+        if readonly:
+            try:
+                self.db = sqlite3.connect('file:' + requests.compat.quote(MetadataStore.path(directory)) + '?mode=ro', timeout=30, isolation_level=None, check_same_thread=False, uri=True)
+            except TypeError: #Python 2, no URI support
+                self.db = sqlite3.connect(MetadataStore.path(directory), timeout=30, isolation_level=None, check_same_thread=False)
+            return
+        self.db = sqlite3.connect(MetadataStore.path(directory), timeout=30, isolation_level=None)
+        #the provenance data, which lists the metadata of all input files, is shared by all output files of an output template, so it is stored only once
+        self.db.execute("CREATE TABLE IF NOT EXISTS provenance (id INTEGER PRIMARY KEY, xml TEXT NOT NULL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS metadata (filename TEXT NOT NULL PRIMARY KEY, xml TEXT NOT NULL, provenance INTEGER)")
+
+    @staticmethod
+    def path(directory):
+        return os.path.join(directory, MetadataStore.FILENAME)
+
+    @staticmethod
+    def exists(directory):
+        return os.path.exists(MetadataStore.path(directory))
+
+    @staticmethod
+    def reader(directory):
+        """Returns a read-only store for the directory, or None if it has none. The store is shared (by all threads) until the database changes, its key attribute identifies that version (path, mtime, size)"""
+        path = MetadataStore.path(directory)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = (path, getattr(stat, 'st_mtime_ns', stat.st_mtime), stat.st_size)
+        store = METADATASTORES.get(key)
+        if store is None:
+            try:
+                store = MetadataStore(directory, True)
+            except sqlite3.Error:
+                return None
+            store.key = key
+            METADATASTORES.set(key, store)
+        return store
+
+    def get(self, filename):
+        """Returns the metadata XML for the file (relative to the directory), or None"""
+        with self.lock:
+            row = self.db.execute("SELECT metadata.xml, provenance.xml FROM metadata LEFT JOIN provenance ON metadata.provenance = provenance.id WHERE filename = ?", (filename,)).fetchone()
+        if row is None:
+            return None
+        xml, provenancexml = row
+        if provenancexml:
+            #insert it where CLAMMetaData.xml() would have
+            xml = xml[:-len("</CLAMMetaData>")] + provenancexml + "</CLAMMetaData>"
+        return xml
+
+    def update(self, items):
+        """Stores metadata XML for many files at once. Items is an iterable of (filename, xml) tuples, or of (filename, xml, provenance xml) tuples where xml was rendered without provenance (identical provenance is stored once)"""
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            provenanceids = {} #provenance xml => id
+            rows = []
+            for item in items:
+                filename, xml = item[:2]
+                provenancexml = item[2] if len(item) > 2 else None
+                if provenancexml and provenancexml not in provenanceids:
+                    provenanceids[provenancexml] = self.db.execute("INSERT INTO provenance (xml) VALUES (?)", (provenancexml,)).lastrowid
+                rows.append( (filename, xml, provenanceids.get(provenancexml)) )
+            self.db.executemany("INSERT OR REPLACE INTO metadata (filename, xml, provenance) VALUES (?, ?, ?)", rows)
+        except:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+
+    def remove(self, filename):
+        self.db.execute("DELETE FROM metadata WHERE filename = ?", (filename,))
+
+    def close(self):
+        self.db.close()
+
+    @staticmethod
+    def convert(directory):
+        """Moves all .METADATA files in the directory (and its subdirectories) into the store, returns the number of files converted"""
+        items = []
+        metafiles = []
+        for root, _, filenames in os.walk(directory):
+            for metafilename in filenames:
+                if metafilename[0] == '.' and metafilename.endswith('.METADATA'):
+                    metafile = os.path.join(root, metafilename)
+                    with io.open(metafile,'r',encoding='utf-8') as f:
+                        xml = f.read()
+                    filename = os.path.relpath(os.path.join(root, metafilename[1:-len('.METADATA')]), directory)
+                    items.append( (filename, xml) )
+                    metafiles.append(metafile)
+        if items:
+            store = MetadataStore(directory)
+            try:
+                store.update(items)
+            finally:
+                store.close()
+            for metafile in metafiles:
+                os.unlink(metafile)
+        return len(items)
+
 def getclamdata(filename, custom_formats=None):
     global CUSTOM_FORMATS  #pylint: disable=global-statement
     """This function reads the CLAM Data from an XML file. Use this to read
@@ -453,22 +816,72 @@ def processparameters(postdata, parameters, user=None):
 
     return errors, newparameters, commandlineparams
 
+class FileListing(object):
+    """A read-only list of the input or output files of a remote project, of which the CLAM XML response only included the first page. Further pages are fetched from the service (using ``CLAMClient.files()``) only once they are accessed"""
+
+    def __init__(self, client, project, kind, firstpage, count, pagesize, projecturl, loadmetadata=True):
+        self.client = client
+        self.project = project
+        self.kind = kind #input or output
+        self.count = count
+        self.pagesize = pagesize
+        self.projecturl = projecturl
+        self.loadmetadata = loadmetadata
+        self.pages = {0: firstpage}
+
+    def page(self, i):
+        """Returns the i-th page of files, fetching it if needed"""
+        if i not in self.pages:
+            result = self.client.files(self.project, self.kind, i * self.pagesize, self.pagesize)
+            if self.kind == 'input':
+                self.pages[i] = [ CLAMInputFile(self.projecturl, entry['name'], self.loadmetadata, self.client, True) for entry in result.get('input',{}).get('files',[]) ]
+            else:
+                self.pages[i] = [ CLAMOutputFile(self.projecturl, entry['name'], self.loadmetadata, self.client) for entry in result.get('output',{}).get('files',[]) ]
+        return self.pages[i]
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        i = 0
+        while i * self.pagesize < self.count:
+            page = self.page(i)
+            if not page: #the project changed in the meantime
+                break
+            for file in page:
+                yield file
+            i += 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [ self[i] for i in range(*index.indices(self.count)) ]
+        if index < 0:
+            index += self.count
+        if index < 0 or index >= self.count:
+            raise IndexError(index)
+        page = self.page(index // self.pagesize)
+        try:
+            return page[index % self.pagesize]
+        except IndexError:
+            raise IndexError(index)
+
 class CLAMData(object):
     """Instances of this class hold all the CLAM Data that is automatically extracted from CLAM
     XML responses. Its member variables are:
 
         * ``baseurl``         - The base URL to the service (string)
         * ``projecturl``      - The full URL to the selected project, if any  (string)
-        * ``status``          - Can be: ``clam.common.status.READY`` (0),``clam.common.status.RUNNING`` (1), or ``clam.common.status.DONE`` (2)
+        * ``status``          - Can be: ``clam.common.status.READY`` (0),``clam.common.status.RUNNING`` (1), ``clam.common.status.DONE`` (2) or ``clam.common.status.QUEUED`` (3)
         * ``statusmessage``   - The latest status message (string)
         * ``completion``      - An integer between 0 and 100 indicating
                           the percentage towards completion.
         * ``parameters``      - List of parameters (but use the methods instead)
         * ``profiles``        - List of profiles (``[ Profile ]``)
         * ``program``         - A Program instance (or None). Describes the expected outputfiles given the uploaded inputfiles. This is the concretisation of the matching profiles.
-        * ``input``           - List of input files  (``[ CLAMInputFile ]``); use ``inputfiles()`` instead for easier access
-        * ``output``          - List of output files (``[ CLAMOutputFile ]``)
-        * ``projects``        - List of project IDs (``[ string ]``)
+        * ``input``           - List of input files  (``[ CLAMInputFile ]``, or a ``FileListing`` that fetches further pages on demand if the response held only the first page); use ``inputfiles()`` instead for easier access
+        * ``output``          - List of output files (``[ CLAMOutputFile ]``, or a ``FileListing`` as for ``input``)
+        * ``projects``        - List of project IDs (``[ string ]``), may be only a page of them if an offset/limit was requested
+        * ``projectcount``    - Total number of projects of the user (``int``, or None if unknown)
         * ``corpora``         - List of pre-installed corpora
         * ``errors``          - Boolean indicating whether there are errors in parameter specification
         * ``errormsg``        - String containing an error message
@@ -498,7 +911,7 @@ class CLAMData(object):
         #: String containing the full URL to the project, if a project was indeed selected
         self.projecturl = ''
 
-        #: The current status of the service, returns clam.common.status.READY (1), clam.common.status.RUNNING (2), or clam.common.status.DONE (3)
+        #: The current status of the service, returns clam.common.status.READY (0), clam.common.status.RUNNING (1), clam.common.status.DONE (2) or clam.common.status.QUEUED (3)
         self.status = clam.common.status.READY
 
         #: The current status of the service in a human readable message
@@ -529,6 +942,9 @@ class CLAMData(object):
         #: List of projects ([ string ])
         self.projects = None
 
+        #: Total number of projects, projects may hold just one page of them (int)
+        self.projectcount = None
+
         #: Boolean indicating whether there are errors in parameter specification
         self.errors = False
 
@@ -615,14 +1031,18 @@ class CLAMData(object):
                         for n in filenode:
                             if n.tag == 'name':
                                 self.input.append( CLAMInputFile( self.projecturl, n.text, self.loadmetadata, self.client,True) )
+                self.input = self.filelisting(node, 'input', self.input)
             elif node.tag == 'output':
                 for filenode in node:
                     if filenode.tag == 'file':
                         for n in filenode:
                             if n.tag == 'name':
                                 self.output.append( CLAMOutputFile( self.projecturl, n.text, self.loadmetadata, self.client ) )
+                self.output = self.filelisting(node, 'output', self.output)
             elif node.tag == 'projects':
                 self.projects = []
+                if 'count' in node.attrib:
+                    self.projectcount = int(node.attrib['count'])
                 for projectnode in node:
                     if projectnode.tag == 'project':
                         self.projects.append(projectnode.text)
@@ -638,6 +1058,12 @@ class CLAMData(object):
                         if not inputfound:
                             self.program.add(outputfilenode.attrib['name'],outputfilenode.attrib['template'])
 
+    def filelisting(self, node, kind, files):
+        """Returns the files listed in an input/output node, wrapped in a FileListing if they are only the first page of them"""
+        if self.client is not None and self.project and 'count' in node.attrib and 'limit' in node.attrib and int(node.attrib.get('offset',0)) == 0 and int(node.attrib['count']) > len(files):
+            return FileListing(self.client, self.project, kind, files, int(node.attrib['count']), int(node.attrib['limit']), self.projecturl, self.loadmetadata)
+        return files
+
     def outputtemplate(self, template_id):
         """Get an output template by ID"""
         for profile in self.profiles:
@@ -765,17 +1191,24 @@ def sanitizeparameters(parameters):
 
 
 
-def profiler(profiles, projectpath,parameters,serviceid,servicename,serviceurl,printdebug=None):
-    """Given input files and parameters, produce metadata for outputfiles. Returns a list of matched profiles (empty if none match), and a program."""
+def profiler(profiles, projectpath,parameters,serviceid,servicename,serviceurl,printdebug=None, outputmetadata='files'):
+    """Given input files and parameters, produce metadata for outputfiles. Returns a list of matched profiles (empty if none match), and a program. The metadata is stored in a .METADATA file per output file, or in a single MetadataStore if outputmetadata is set to 'sqlite'."""
 
     parameters = sanitizeparameters(parameters)
 
     matched = []
     program = Program(projectpath)
-    for profile in profiles:
-        if profile.match(projectpath, parameters)[0]:
-            matched.append(profile)
-            program.update( profile.generate(projectpath,parameters,serviceid,servicename,serviceurl) )
+    manifest = InputManifest(projectpath) #one snapshot of the input files for all profiles
+    metadatastore = MetadataStore(os.path.join(projectpath, 'output')) if outputmetadata == 'sqlite' else None
+    try:
+        for profile in profiles:
+            match = profile.match(projectpath, parameters, manifest)
+            if match[0]:
+                matched.append(profile)
+                program.update( profile.generate(projectpath,parameters,serviceid,servicename,serviceurl, manifest, match, metadatastore) )
+    finally:
+        if metadatastore is not None:
+            metadatastore.close()
 
     return matched, program
 
@@ -833,16 +1266,17 @@ class Profile(object):
 
 
 
-    def match(self, projectpath, parameters):
+    def match(self, projectpath, parameters, manifest=None):
         """Check if the profile matches all inputdata *and* produces output given the set parameters. Returns a boolean"""
         parameters = sanitizeparameters(parameters)
+        if manifest is None: manifest = InputManifest(projectpath)
 
         mandatory_absent = [] #list of input templates that are missing but mandatory
         optional_absent = [] #list of absent but optional input templates
 
         #check if profile matches inputdata (if there are no inputtemplate, this always matches intentionally!)
         for inputtemplate in self.input:
-            if not inputtemplate.matchingfiles(projectpath):
+            if not inputtemplate.matchingfiles(projectpath, manifest):
                 if inputtemplate.optional:
                     optional_absent.append(inputtemplate)
                 else:
@@ -867,11 +1301,12 @@ class Profile(object):
 
         return False, optional_absent
 
-    def matchingfiles(self, projectpath):
+    def matchingfiles(self, projectpath, manifest=None):
         """Return a list of all inputfiles matching the profile (filenames)"""
+        if manifest is None: manifest = InputManifest(projectpath)
         l = []
         for inputtemplate in self.input:
-            l += inputtemplate.matchingfiles(projectpath)
+            l += inputtemplate.matchingfiles(projectpath, manifest)
         return l
 
     def outputtemplates(self):
@@ -886,23 +1321,28 @@ class Profile(object):
         return outputtemplates
 
 
-    def generate(self, projectpath, parameters, serviceid, servicename,serviceurl):
-        """Generate output metadata on the basis of input files and parameters. Projectpath must be absolute. Returns a Program instance.  """
+    def generate(self, projectpath, parameters, serviceid, servicename,serviceurl, manifest=None, match=None, metadatastore=None):
+        """Generate output metadata on the basis of input files and parameters. Projectpath must be absolute. Returns a Program instance. If the result of match() is already known, it can be passed. The metadata is written to a .METADATA file per output file, or all at once to the MetadataStore that is passed."""
 
         #Make dictionary of parameters
         parameters = sanitizeparameters(parameters)
+        if manifest is None: manifest = InputManifest(projectpath)
 
         program = Program(projectpath, [self])
 
-        match, optional_absent = self.match(projectpath, parameters) #Does the profile match?
+        if match is None:
+            match = self.match(projectpath, parameters, manifest) #Does the profile match?
+        match, optional_absent = match
         if match: #pylint: disable=too-many-nested-blocks
 
             #gather all input files that match
-            inputfiles = self.matchingfiles(projectpath) #list of (seqnr, filename,inputtemplate) tuples
+            inputfiles = self.matchingfiles(projectpath, manifest) #list of (seqnr, filename,inputtemplate) tuples
+
+            storedmetadata = [] #(outputfilename, xml, provenance xml) tuples for the metadatastore
 
             inputfiles_full = [] #We need the full CLAMInputFiles for generating provenance data
             for seqnr, filename, inputtemplate in inputfiles: #pylint: disable=unused-variable
-                inputfiles_full.append(CLAMInputFile(projectpath, filename))
+                inputfiles_full.append(manifest.inputfile(filename))
 
             for outputtemplate in self.output:
                 if isinstance(outputtemplate, ParameterCondition):
@@ -920,18 +1360,27 @@ class Profile(object):
                                 create = False
 
                         if create:
-                            for inputtemplate, inputfilename, outputfilename, metadata in outputtemplate.generate(self, parameters, projectpath, inputfiles, provenancedata):
-                                clam.common.util.printdebug("Writing metadata for outputfile " + outputfilename)
+                            for inputtemplate, inputfilename, outputfilename, metadata in outputtemplate.generate(self, parameters, projectpath, inputfiles, provenancedata, manifest):
                                 metafilename = os.path.dirname(outputfilename)
                                 if metafilename: metafilename += '/'
                                 metafilename += '.' + os.path.basename(outputfilename) + '.METADATA'
-                                f = io.open(projectpath + '/output/' + metafilename,'w',encoding='utf-8')
-                                f.write(metadata.xml())
-                                f.close()
+                                if metadatastore is not None:
+                                    storedmetadata.append( (outputfilename, metadata.xml(provenance=False), metadata.provenance.xml("  ") if metadata.provenance else None) )
+                                    if os.path.exists(projectpath + '/output/' + metafilename): #would take precedence over the store
+                                        os.unlink(projectpath + '/output/' + metafilename)
+                                else:
+                                    clam.common.util.printdebug("Writing metadata for outputfile " + outputfilename)
+                                    f = io.open(projectpath + '/output/' + metafilename,'w',encoding='utf-8')
+                                    f.write(metadata.xml())
+                                    f.close()
                                 program.add(outputfilename, outputtemplate, inputfilename, inputtemplate)
                     else:
                         raise TypeError("OutputTemplate expected, but got " + outputtemplate.__class__.__name__)
 
+            if storedmetadata:
+                clam.common.util.printdebug("Storing metadata for " + str(len(storedmetadata)) + " outputfiles")
+                metadatastore.update(storedmetadata)
+
         return program
 
 
@@ -1025,6 +1474,15 @@ class Program(dict):
         for inputfilename, inputtemplate in self[outputfilename][1]:
             yield inputfilename, inputtemplate
 
+    def tasks(self):
+        """Splits the program into independent tasks, one per output file. Returns a sorted list of (inputfilename, outputfilename) pairs, or None if there is an output file that does not derive from exactly one input file"""
+        tasks = []
+        for outputfilename, (_, inputfiles) in self.items():
+            if len(inputfiles) != 1:
+                return None
+            tasks.append( (next(iter(inputfiles)), outputfilename) )
+        return sorted(tasks)
+
     def getoutputfiles(self, loadmetadata=True, client=None,requiremetadata=False):
         """Iterates over all output files and their output template. Yields (CLAMOutputFile, str:outputtemplate_id) tuples. The last three arguments are passed to its constructor."""
         for outputfilename, outputtemplate in self.outputpairs():
@@ -1098,9 +1556,27 @@ class CLAMProvenanceData(object):
             assert all([ isinstance(x, tuple) and len(x) == 2 and isinstance(x[1], CLAMMetaData) for x in inputfiles ])
             self.inputfiles = inputfiles
 
+        self.xmlcache = {} #indent => serialisation, the profiler attaches the same provenance data to many output files
+
+    def copy(self):
+        """Returns a copy that can be changed without affecting this instance (the metadata of the input files and the parameters are copied too)"""
+        provenance = copy(self)
+        provenance.inputfiles = []
+        for filename, metadata in self.inputfiles:
+            metadata = copy(metadata)
+            metadata.data = dict(metadata.data)
+            provenance.inputfiles.append( (filename, metadata) )
+        if isinstance(self.parameters, dict):
+            provenance.parameters = dict( (key, copy(parameter)) for key, parameter in self.parameters.items() )
+        else:
+            provenance.parameters = [ copy(parameter) for parameter in self.parameters ]
+        provenance.xmlcache = {}
+        return provenance
 
     def xml(self, indent = ""):
         """Serialise provenance data to XML. This is included in CLAM Metadata files"""
+        if indent in self.xmlcache:
+            return self.xmlcache[indent]
         xml = indent + "<provenance type=\"clam\" id=\""+self.serviceid+"\" name=\"" +self.servicename+"\" url=\"" + self.serviceurl+"\" outputtemplate=\""+self.outputtemplate_id+"\" outputtemplatelabel=\""+self.outputtemplate_label+"\" timestamp=\""+str(self.timestamp)+"\">"
         for filename, metadata in self.inputfiles:
             xml += indent + " <inputfile name=\"" + clam.common.util.xmlescape(filename) + "\">"
@@ -1116,6 +1592,7 @@ class CLAMProvenanceData(object):
                 xml += parameter.xml(indent +"  ") + "\n"
             xml += indent + " </parameters>\n"
         xml += indent + "</provenance>"
+        self.xmlcache[indent] = xml
         return xml
 
     @staticmethod
@@ -1259,8 +1736,8 @@ class CLAMMetaData(object):
         assert not isinstance(value, list)
         self.data[key] = value
 
-    def xml(self, indent = ""):
-        """Render an XML representation of the metadata""" #(independent of web.py for support in CLAM API)
+    def xml(self, indent = "", provenance=True):
+        """Render an XML representation of the metadata (with or without the provenance data)""" #(independent of web.py for support in CLAM API)
         if not indent:
             xml = '<?xml version="1.0" encoding="UTF-8"?>\n'
         else:
@@ -1277,7 +1754,7 @@ class CLAMMetaData(object):
         for key, value in self.data.items():
             xml += indent + "  <meta id=\""+clam.common.util.xmlescape(key)+"\">"+clam.common.util.xmlescape(str(value))+"</meta>\n"
 
-        if self.provenance:
+        if self.provenance and provenance:
             xml += self.provenance.xml(indent + "  ")
 
         xml += indent +  "</CLAMMetaData>"
@@ -1306,18 +1783,18 @@ class CLAMMetaData(object):
     @staticmethod
     def fromxml(node, file=None):
         """Read metadata from XML. Static method returning an CLAMMetaData instance (or rather; the appropriate subclass of CLAMMetaData) from the given XML description. Node can be a string or an etree._Element."""
+        formatclass, data = CLAMMetaData.parsexml(node)
+        return formatclass(file, **data)
+
+    @staticmethod
+    def parsexml(node):
+        """Read metadata from XML, returns a (format class, data) tuple, from which the metadata is instantiated as formatclass(file, **data). Node can be a string or an etree._Element."""
         if not isinstance(node,ElementTree._Element): #pylint: disable=protected-access
             node = parsexmlstring(node)
         if node.tag == 'CLAMMetaData':
             dataformat = node.attrib['format']
 
-            formatclass = None
-            for C in CUSTOM_FORMATS: #CUSTOM_FORMATS will be injected by clamservice.py
-                if C.__name__ == dataformat:
-                    formatclass = C
-                    break
-            if formatclass is None and dataformat in vars(clam.common.formats) and issubclass(vars(clam.common.formats)[dataformat], CLAMMetaData):
-                formatclass = vars(clam.common.formats)[dataformat]
+            formatclass = getformatclass(dataformat) #CUSTOM_FORMATS will be injected by clamservice.py
             if formatclass is None:
                 raise Exception("Format class " + dataformat + " not found!")
 
@@ -1336,10 +1813,18 @@ class CLAMMetaData(object):
                     data[key] = value
                 elif subnode.tag == 'provenance':
                     data['provenance'] = CLAMProvenanceData.fromxml(subnode)
-            return formatclass(file, **data)
+            return formatclass, data
         else:
             raise Exception("Invalid CLAM Metadata!")
 
+    @staticmethod
+    def copydata(data):
+        """Returns a copy of data as returned by parsexml(), metadata instantiated from it shares no provenance data with other instances"""
+        data = dict(data)
+        if data.get('provenance') is not None:
+            data['provenance'] = data['provenance'].copy()
+        return data
+
     def httpheaders(self):
         """HTTP headers to output for this format. Yields (key,value) tuples. Should be overridden in sub-classes!"""
         yield ("Content-Type", self.mimetype)
@@ -1472,16 +1957,9 @@ class InputTemplate(object):
             kwargs['acceptarchive'] = node.attrib['acceptarchive'].lower() == 'yes' or node.attrib['acceptarchive'].lower() == 'true' or node.attrib['acceptarchive'].lower() == '1'
 
         #find formatclass
-        formatcls = None
-        for C in CUSTOM_FORMATS: #CUSTOM_FORMATS will be injected by clamservice.py
-            if C.__name__ == dataformat:
-                formatcls = C
-                break
+        formatcls = getformatclass(dataformat) #CUSTOM_FORMATS will be injected by clamservice.py
         if formatcls is None:
-            if dataformat in vars(clam.common.formats):
-                formatcls = vars(clam.common.formats)[dataformat]
-            else:
-                raise Exception("Expected format class '" + dataformat+ "', but not defined!")
+            raise Exception("Expected format class '" + dataformat+ "', but not defined!")
 
         args = []
         for subnode in node:
@@ -1532,19 +2010,10 @@ class InputTemplate(object):
         assert isinstance(metadata, self.formatclass)
         return self.generate(metadata,user)
 
-    def matchingfiles(self, projectpath):
-        """Checks if the input conditions are satisfied, i.e the required input files are present. We use the symbolic links .*.INPUTTEMPLATE.id.seqnr to determine this. Returns a list of matching results (seqnr, filename, inputtemplate)."""
-        results = []
-
-        if projectpath[-1] == '/':
-            inputpath = projectpath + 'input/'
-        else:
-            inputpath = projectpath + '/input/'
-
-        for linkf,realf in clam.common.util.globsymlinks(inputpath + '/.*.INPUTTEMPLATE.' + self.id + '.*'):
-            seqnr = int(linkf.split('.')[-1])
-            results.append( (seqnr, realf[len(inputpath):], self) )
-        results = sorted(results)
+    def matchingfiles(self, projectpath, manifest=None):
+        """Checks if the input conditions are satisfied, i.e the required input files are present. We use the input manifest (or a snapshot of it that is passed) to determine this. Returns a list of matching results (seqnr, filename, inputtemplate)."""
+        if manifest is None: manifest = InputManifest(projectpath)
+        results = [ (seqnr, filename, self) for seqnr, filename in manifest.files(self.id) ]
         if self.unique and len(results) != 1:
             return []
         else:
@@ -1815,16 +2284,9 @@ class OutputTemplate(object):
             kwargs['unique'] = node.attrib['unique'].lower() == 'yes' or node.attrib['unique'].lower() == 'true' or node.attrib['unique'].lower() == '1'
 
         #find formatclass
-        formatcls = None
-        for C in CUSTOM_FORMATS: #CUSTOM_FORMATS will be injected by clamservice.py
-            if C.__name__ == dataformat:
-                formatcls = C
-                break
+        formatcls = getformatclass(dataformat) #CUSTOM_FORMATS will be injected by clamservice.py
         if formatcls is None:
-            if dataformat in vars(clam.common.formats):
-                formatcls = vars(clam.common.formats)[dataformat]
-            else:
-                raise Exception("Specified format not defined! (" + dataformat + ")")
+            raise Exception("Specified format not defined! (" + dataformat + ")")
 
         args = []
         for subnode in node:
@@ -1859,10 +2321,11 @@ class OutputTemplate(object):
                 return inputtemplate
         raise Exception("Parent InputTemplate '"+self.parent+"' not found!")
 
-    def generate(self, profile, parameters, projectpath, inputfiles, provenancedata=None):
+    def generate(self, profile, parameters, projectpath, inputfiles, provenancedata=None, manifest=None):
         """Yields (inputtemplate, inputfilename, outputfilename, metadata) tuples"""
 
         project = os.path.basename(projectpath)
+        if manifest is None: manifest = InputManifest(projectpath)
 
         if self.parent: #pylint: disable=too-many-nested-blocks
             #We have a parent, infer the correct filename
@@ -1871,27 +2334,34 @@ class OutputTemplate(object):
             parent = self.getparent(profile)
 
             #get input files for the parent InputTemplate
-            parentinputfiles = parent.matchingfiles(projectpath)
+            parentinputfiles = parent.matchingfiles(projectpath, manifest)
             if not parentinputfiles:
                 raise Exception("OutputTemplate '"+self.id + "' has parent '" + self.parent + "', but no matching input files were found!")
 
+            #Group the input files by sequence number, so the relevant ones for each parent file can be found right away
+            inputfilesbyseqnr = {}
+            for i, (seqnr2, inputfilename2, inputtemplate2) in enumerate(inputfiles):
+                inputfilesbyseqnr.setdefault(seqnr2, []).append( (i, inputtemplate2, inputfilename2) )
+
+            metafields = self.evaluatemetafields(parameters)
+
             #Do we specify a full filename?
             for seqnr, inputfilename, inputtemplate in parentinputfiles: #pylint: disable=unused-variable
 
                 if self.filename:
                     filename = self.filename
-                    parentfile = CLAMInputFile(projectpath, inputfilename)
+                    parentfile = manifest.inputfile(inputfilename)
                 elif parent:
                     filename = inputfilename
-                    parentfile = CLAMInputFile(projectpath, inputfilename)
+                    parentfile = manifest.inputfile(inputfilename)
                 else:
                     raise Exception("OutputTemplate '"+self.id + "' has no parent nor filename defined!")
 
-                #Make actual CLAMInputFile objects of ALL relevant input files, that is: all unique=True files and all unique=False files with the same sequence number
-                relevantinputfiles = []
-                for seqnr2, inputfilename2, inputtemplate2 in inputfiles:
-                    if seqnr2 == 0 or seqnr2 == seqnr:
-                        relevantinputfiles.append( (inputtemplate2, CLAMInputFile(projectpath, inputfilename2)) )
+                #Make actual CLAMInputFile objects of ALL relevant input files, that is: all unique=True files and all unique=False files with the same sequence number (in their original order)
+                relevant = inputfilesbyseqnr.get(0, [])
+                if seqnr != 0:
+                    relevant = sorted(relevant + inputfilesbyseqnr.get(seqnr, []), key=lambda x: x[0])
+                relevantinputfiles = [ (inputtemplate2, manifest.inputfile(inputfilename2)) for _, inputtemplate2, inputfilename2 in relevant ]
 
                 #resolve # in filename (done later)
                 #if not self.unique:
@@ -1917,7 +2387,7 @@ class OutputTemplate(object):
 
 
                 #Now we create the actual metadata
-                metadata = self.generatemetadata(parameters, parentfile, relevantinputfiles, provenancedata)
+                metadata = self.generatemetadata(parameters, parentfile, relevantinputfiles, provenancedata, metafields)
 
                 #Resolve filename
                 filename = resolveoutputfilename(filename, parameters, metadata, self, seqnr, project, inputfilename)
@@ -1936,8 +2406,20 @@ class OutputTemplate(object):
             raise Exception("Unable to generate from OutputTemplate, no parent or filename specified")
 
 
-    def generatemetadata(self, parameters, parentfile, relevantinputfiles, provenancedata = None):
-        """Generate metadata, given a filename, parameters and a dictionary of inputdata (necessary in case we copy from it)"""
+    def evaluatemetafields(self, parameters):
+        """Returns the metafields that apply given the parameters (i.e. with all ParameterConditions evaluated)"""
+        metafields = []
+        for metafield in self.metafields:
+            if isinstance(metafield, ParameterCondition):
+                metafield = metafield.evaluate(parameters)
+                if not metafield:
+                    continue
+            assert isinstance(metafield, AbstractMetaField)
+            metafields.append(metafield)
+        return metafields
+
+    def generatemetadata(self, parameters, parentfile, relevantinputfiles, provenancedata = None, metafields = None):
+        """Generate metadata, given a filename, parameters and a dictionary of inputdata (necessary in case we copy from it). Metafields can be passed if they were already evaluated (see evaluatemetafields())"""
         assert isinstance(provenancedata,CLAMProvenanceData) or provenancedata is None
 
         data = {}
@@ -1947,12 +2429,9 @@ class OutputTemplate(object):
             for key, value in parentfile.metadata.items():
                 data[key] = value
 
-        for metafield in self.metafields:
-            if isinstance(metafield, ParameterCondition):
-                metafield = metafield.evaluate(parameters)
-                if not metafield:
-                    continue
-            assert isinstance(metafield, AbstractMetaField)
+        if metafields is None:
+            metafields = self.evaluatemetafields(parameters)
+        for metafield in metafields:
             metafield.resolve(data, parameters, parentfile, relevantinputfiles)
 
         if provenancedata:
@@ -2246,6 +2725,48 @@ class Action(object):
         else:
             self.tmpdir = False
 
+        #Asynchronous actions (commands only) respond right away with the URL of a job from which the result can be retrieved later. ('async' is accepted as well, but is a reserved word in Python 3.7+)
+        if 'asynchronous' in kwargs:
+            self.asynchronous = bool(kwargs['asynchronous'])
+        elif 'async' in kwargs:
+            self.asynchronous = bool(kwargs['async'])
+        else:
+            self.asynchronous = False
+
+        #Streaming actions (commands only) send their output to the client as it is produced
+        if 'stream' in kwargs:
+            self.stream = bool(kwargs['stream'])
+        else:
+            self.stream = False
+
+        #Functions can run in a shared thread or process pool (executor='thread' or 'process') instead of in the request thread
+        if 'executor' in kwargs and kwargs['executor']:
+            if kwargs['executor'] not in ('thread','process'):
+                raise Exception("Invalid executor for action " + self.id + ": " + kwargs['executor'])
+            self.executor = kwargs['executor']
+        else:
+            self.executor = None
+
+        if 'timeout' in kwargs:
+            self.timeout = kwargs['timeout'] #seconds to wait for the function (executor only), 0 = no limit
+        else:
+            self.timeout = 0
+
+        if 'maxconcurrency' in kwargs:
+            self.maxconcurrency = int(kwargs['maxconcurrency']) #maximum number of concurrent calls (executor only), 0 = as many as the pool allows
+        else:
+            self.maxconcurrency = 0
+
+        #The results of actions that are pure functions of their parameters can be cached (cache=True), for cachettl seconds (0 = until evicted)
+        if 'cache' in kwargs:
+            self.cache = bool(kwargs['cache'])
+        else:
+            self.cache = False
+
+        if 'cachettl' in kwargs:
+            self.cachettl = kwargs['cachettl']
+        else:
+            self.cachettl = 0
 
 
     def xml(self, indent = ""):
@@ -2257,7 +2778,12 @@ class Action(object):
             allowanonymous = "allowanoymous=\"yes\""
         else:
             allowanonymous = ""
-        xml = indent + "<action id=\"" + self.id + "\" " + method + " name=\"" + self.name + "\" description=\"" +self.description + "\" mimetype=\"" + self.mimetype + "\" " + allowanonymous + ">\n"
+        mode = ""
+        if self.asynchronous:
+            mode += " asynchronous=\"yes\""
+        if self.stream:
+            mode += " stream=\"yes\""
+        xml = indent + "<action id=\"" + self.id + "\" " + method + " name=\"" + self.name + "\" description=\"" +self.description + "\" mimetype=\"" + self.mimetype + "\" " + allowanonymous + mode + ">\n"
         for parameter in self.parameters:
             xml += parameter.xml(indent+ "    ") + "\n"
         xml += indent + "</action>\n"
@@ -0,0 +1,92 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Executor pools for actions --
+#       by Maarten van Gompel (proycon)
+#       http://ilk.uvt.nl/~mvgompel
+#       Induction for Linguistic Knowledge Research Group
+#       Universiteit van Tilburg
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+#Thread and process pools in which the Python functions of actions run, so
+#they do not run in the request thread. Pools never queue work: when all
+#workers are busy (or an action reaches its own maximum concurrency), a
+#submission is refused with Saturated, which the webservice turns into a 503.
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import threading
+try:
+    import concurrent.futures
+    from concurrent.futures import TimeoutError #pylint: disable=redefined-builtin,unused-import
+except ImportError: #Python 2 without the futures backport
+    concurrent = None
+    TimeoutError = None #pylint: disable=redefined-builtin,invalid-name
+
+KINDS = ('thread','process')
+
+class Saturated(Exception):
+    """Raised when a pool (or the share of a pool an action may use) is fully occupied"""
+    pass
+
+def supported():
+    return concurrent is not None
+
+class Pool(object):
+    """A thread or process pool that refuses work, rather than queueing it, when all of its workers are busy"""
+
+    def __init__(self, kind, size):
+        if concurrent is None:
+            raise ValueError("Executor pools require concurrent.futures (pip install futures on Python 2)")
+        if kind == 'thread':
+            self.executor = concurrent.futures.ThreadPoolExecutor(size)
+        elif kind == 'process':
+            try:
+                #spawn rather than fork, forked workers would inherit (and outlive the service with) its listening socket and locks
+                import multiprocessing
+                self.executor = concurrent.futures.ProcessPoolExecutor(size, mp_context=multiprocessing.get_context('spawn'))
+            except (TypeError, AttributeError): #Python < 3.7 (or the Python 2 backport)
+                self.executor = concurrent.futures.ProcessPoolExecutor(size)
+        else:
+            raise ValueError("Invalid executor: " + kind)
+        self.kind = kind
+        self.size = size
+        self.slots = threading.BoundedSemaphore(size)
+        self.limits = {} #key => BoundedSemaphore, for keys with a maximum concurrency
+        self.lock = threading.Lock()
+
+    def submit(self, function, args=(), key=None, maxconcurrency=0):
+        """Run the function with the specified arguments in the pool, returns a Future. At most maxconcurrency functions with the same key run at once (0 = no limit but the size of the pool). Raises Saturated if the function can not start right away"""
+        limit = None
+        if maxconcurrency:
+            with self.lock:
+                if key not in self.limits:
+                    self.limits[key] = threading.BoundedSemaphore(maxconcurrency)
+                limit = self.limits[key]
+            if not limit.acquire(False):
+                raise Saturated(str(key) + " is already running " + str(maxconcurrency) + " time(s)")
+        if not self.slots.acquire(False):
+            if limit:
+                limit.release()
+            raise Saturated("All " + str(self.size) + " " + self.kind + "s are busy")
+
+        def release(future): #pylint: disable=unused-argument
+            #called once the function is done, which may be long after a timeout
+            self.slots.release()
+            if limit:
+                limit.release()
+
+        try:
+            future = self.executor.submit(function, *args)
+        except: #pylint: disable=bare-except
+            release(None)
+            raise
+        future.add_done_callback(release)
+        return future
+
+    def shutdown(self, wait=False):
+        self.executor.shutdown(wait)
@@ -0,0 +1,335 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Project state store --
+#       by Maarten van Gompel (proycon)
+#       http://ilk.uvt.nl/~mvgompel
+#       Induction for Linguistic Knowledge Research Group
+#       Universiteit van Tilburg
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+#Keeps track of the state of all projects (status, pid, exit code, completion,
+#timestamps, disk usage). The webservice, the dispatcher and the supervisor all
+#update it. The .pid/.done/.aborted/.queued files in the project directories are
+#still written as well, the 'files' backend derives the state from those alone.
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import os
+import time
+import sqlite3
+import threading
+import importlib
+
+import clam.common.status
+import clam.common.util
+
+FIELDS = ('user','project','status','pid','exitcode','aborted','completion','created','started','finished','modified','diskusage')
+
+class ProjectState(object):
+    """Abstract base class for project state backends. The state of a project is a dictionary with the keys in FIELDS"""
+
+    def __init__(self, projectsdir):
+        if projectsdir[-1] != '/':
+            projectsdir += '/'
+        self.projectsdir = projectsdir #$ROOT/projects/
+
+    def path(self, user, project):
+        return self.projectsdir + user + '/' + project + '/'
+
+    def get(self, user, project):
+        """Returns the state of the project, or None if it is unknown"""
+        raise NotImplementedError
+
+    def getall(self, user):
+        """Returns the states of all projects of the user"""
+        raise NotImplementedError
+
+    def create(self, user, project):
+        pass
+
+    def queued(self, user, project):
+        pass
+
+    def started(self, user, project, pid):
+        pass
+
+    def finished(self, user, project, exitcode, aborted=False):
+        pass
+
+    def reset(self, user, project):
+        pass
+
+    def delete(self, user, project):
+        pass
+
+    def setdiskusage(self, user, project, diskusage):
+        pass
+
+    def adddiskusage(self, user, project, delta):
+        """Files were added to (positive delta, in MB) or removed from (negative delta) the project"""
+        state = self.get(user, project)
+        if state and state['diskusage'] is not None:
+            self.setdiskusage(user, project, max(0.0, state['diskusage'] + delta))
+
+    def measure(self, user, project):
+        """Scans the project directory and stores and returns its actual disk usage (MB)"""
+        diskusage = clam.common.util.computediskusage(self.path(user, project))
+        self.setdiskusage(user, project, diskusage)
+        return diskusage
+
+    def totaldiskusage(self, user):
+        """Returns the total disk usage of all projects of the user (MB)"""
+        return sum( state['diskusage'] if state['diskusage'] is not None else self.measure(user, state['project']) for state in self.getall(user) )
+
+    def reconcile(self, maxage, limit=100):
+        """Rescans the projects (at most limit) whose disk usage is unknown or was last measured more than maxage seconds ago, to correct any drift in the accounting. Returns the number of projects rescanned"""
+        return 0
+
+    def lookup(self, user, project):
+        """Returns the state of the project, checking whether a process that is supposedly running still exists"""
+        state = self.get(user, project)
+        if state and state['status'] == clam.common.status.RUNNING and state['pid']:
+            try:
+                os.kill(state['pid'], 0) #raises error if pid doesn't exist
+            except OSError:
+                #the process ended without its dispatcher reporting it (crashed, or a custom dispatcher), it may have left a .done file though
+                donefile = self.path(user, project) + '.done'
+                try:
+                    with open(donefile,'r') as f:
+                        exitcode = int(f.read(1024))
+                except (IOError, ValueError):
+                    exitcode = 1
+                    if os.path.isdir(self.path(user, project)):
+                        with open(donefile,'w') as f:
+                            f.write(str(exitcode))
+                pidfile = self.path(user, project) + '.pid'
+                if os.path.exists(pidfile):
+                    os.unlink(pidfile)
+                self.finished(user, project, exitcode, os.path.exists(self.path(user, project) + '.aborted'))
+                state = self.get(user, project)
+        return state
+
+    def close(self):
+        pass
+
+
+class FileProjectState(ProjectState):
+    """Derives the state from the .pid/.done/.aborted/.queued files in the project directory (the classic behaviour), keeps nothing itself"""
+
+    def get(self, user, project):
+        path = self.path(user, project)
+        if not os.path.isdir(path):
+            return None
+        state = dict.fromkeys(FIELDS)
+        state.update({'user': user, 'project': project, 'status': clam.common.status.READY, 'pid': 0, 'aborted': False, 'completion': 0})
+        if os.path.isfile(path + '.done'):
+            state['status'] = clam.common.status.DONE
+            try:
+                with open(path + '.done','r') as f:
+                    state['exitcode'] = int(f.read(1024))
+            except ValueError:
+                state['exitcode'] = 1
+            state['aborted'] = os.path.isfile(path + '.aborted')
+        elif os.path.isfile(path + '.queued'):
+            state['status'] = clam.common.status.QUEUED
+        elif os.path.isfile(path + '.pid'):
+            try:
+                with open(path + '.pid','r') as f:
+                    state['pid'] = int(f.read(1024))
+                state['status'] = clam.common.status.RUNNING
+            except ValueError:
+                pass
+        state['modified'] = os.stat(path).st_mtime
+        if os.path.isfile(path + '.du'):
+            with open(path + '.du','r') as f:
+                state['diskusage'] = float(f.read().strip())
+        return state
+
+    def getall(self, user):
+        states = []
+        if os.path.isdir(self.projectsdir + user):
+            for project in os.listdir(self.projectsdir + user):
+                if project[0] != '.' and os.path.isdir(self.path(user, project)):
+                    states.append(self.get(user, project))
+        return states
+
+    def finished(self, user, project, exitcode, aborted=False):
+        pass #the .done file is written by whoever calls this
+
+    def setdiskusage(self, user, project, diskusage):
+        path = self.path(user, project)
+        if diskusage is None:
+            if os.path.exists(path + '.du'):
+                os.unlink(path + '.du')
+        elif os.path.isdir(path):
+            with open(path + '.du','w') as f:
+                f.write(str(diskusage))
+
+
+class SQLiteProjectState(ProjectState):
+    """Keeps the state of all projects in a single SQLite database ($ROOT/projects/.state.sqlite), safe for use by multiple processes and threads"""
+
+    def __init__(self, projectsdir, dbfile=None):
+        super(SQLiteProjectState, self).__init__(projectsdir)
+        self.dbfile = dbfile if dbfile else self.projectsdir + '.state.sqlite'
+        self.local = threading.local()
+        self.fallback = FileProjectState(projectsdir) #for projects from before the state store was used
+        with self.transaction() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS projects (user TEXT NOT NULL, project TEXT NOT NULL, status INTEGER NOT NULL DEFAULT 0, pid INTEGER NOT NULL DEFAULT 0, exitcode INTEGER, aborted INTEGER NOT NULL DEFAULT 0, completion INTEGER NOT NULL DEFAULT 0, created REAL, started REAL, finished REAL, modified REAL, diskusage REAL, reconciled REAL, PRIMARY KEY (user, project))")
+            db.execute("CREATE INDEX IF NOT EXISTS reconciled ON projects (reconciled)")
+            db.execute("CREATE TABLE IF NOT EXISTS users (user TEXT NOT NULL PRIMARY KEY, indexed REAL)") #users whose project directories have been scanned once
+
+    def connection(self):
+        #one connection per thread and per process (connections must not be shared with forked children)
+        if getattr(self.local, 'pid', None) != os.getpid():
+            db = sqlite3.connect(self.dbfile, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db = db
+            self.local.pid = os.getpid()
+        return self.local.db
+
+    def transaction(self):
+        return Transaction(self.connection())
+
+    def get(self, user, project):
+        row = self.connection().execute("SELECT * FROM projects WHERE user = ? AND project = ?", (user, project)).fetchone()
+        if row is None:
+            state = self.fallback.get(user, project)
+            if state is not None:
+                self.insert(state)
+            return state
+        return rowtodict(row)
+
+    def getall(self, user):
+        db = self.connection()
+        self.index(user)
+        return [ rowtodict(row) for row in db.execute("SELECT * FROM projects WHERE user = ? ORDER BY project", (user,)) ]
+
+    def index(self, user):
+        """Picks up all projects of the user from before the state store was used, only done once per user"""
+        if self.connection().execute("SELECT indexed FROM users WHERE user = ?", (user,)).fetchone() is not None:
+            return
+        states = self.fallback.getall(user)
+        with self.transaction() as db:
+            for state in states:
+                db.execute("INSERT OR IGNORE INTO projects (" + ",".join(FIELDS) + ") VALUES (" + ",".join("?" * len(FIELDS)) + ")", tuple( state[key] for key in FIELDS ))
+            db.execute("INSERT OR REPLACE INTO users (user, indexed) VALUES (?, ?)", (user, time.time()))
+
+    def insert(self, state):
+        with self.transaction() as db:
+            db.execute("INSERT OR REPLACE INTO projects (" + ",".join(FIELDS) + ") VALUES (" + ",".join("?" * len(FIELDS)) + ")", tuple( state[key] for key in FIELDS ))
+
+    def update(self, user, project, **fields):
+        now = time.time()
+        fields['modified'] = now
+        with self.transaction() as db:
+            if db.execute("UPDATE projects SET " + ", ".join( key + " = ?" for key in fields) + " WHERE user = ? AND project = ?", tuple(fields.values()) + (user, project)).rowcount == 0:
+                #unknown project: only add it if it still exists (from before the state store was used), a late report about a deleted project must not bring it back
+                if os.path.isdir(self.path(user, project)):
+                    db.execute("INSERT OR IGNORE INTO projects (user, project, created, modified) VALUES (?, ?, ?, ?)", (user, project, now, now))
+                    db.execute("UPDATE projects SET " + ", ".join( key + " = ?" for key in fields) + " WHERE user = ? AND project = ?", tuple(fields.values()) + (user, project))
+
+    def create(self, user, project):
+        now = time.time()
+        with self.transaction() as db:
+            db.execute("INSERT OR IGNORE INTO projects (user, project, created, modified) VALUES (?, ?, ?, ?)", (user, project, now, now))
+
+    def queued(self, user, project):
+        self.update(user, project, status=clam.common.status.QUEUED, pid=0, exitcode=None, aborted=0, completion=0)
+
+    def started(self, user, project, pid):
+        self.update(user, project, status=clam.common.status.RUNNING, pid=pid, exitcode=None, aborted=0, completion=0, started=time.time())
+
+    def finished(self, user, project, exitcode, aborted=False):
+        self.update(user, project, status=clam.common.status.DONE, pid=0, exitcode=exitcode, aborted=int(bool(aborted)), completion=100, finished=time.time())
+
+    def reset(self, user, project):
+        self.update(user, project, status=clam.common.status.READY, pid=0, exitcode=None, aborted=0, completion=0, started=None, finished=None)
+
+    def delete(self, user, project):
+        with self.transaction() as db:
+            db.execute("DELETE FROM projects WHERE user = ? AND project = ?", (user, project))
+
+    def setdiskusage(self, user, project, diskusage):
+        with self.transaction() as db:
+            db.execute("UPDATE projects SET diskusage = ?, reconciled = ? WHERE user = ? AND project = ?", (diskusage, time.time() if diskusage is not None else None, user, project))
+
+    def adddiskusage(self, user, project, delta):
+        with self.transaction() as db:
+            #an unknown disk usage (NULL) stays unknown, it will be measured when needed
+            db.execute("UPDATE projects SET diskusage = MAX(0.0, diskusage + ?), modified = ? WHERE user = ? AND project = ?", (delta, time.time(), user, project))
+
+    def totaldiskusage(self, user):
+        db = self.connection()
+        self.index(user)
+        for row in db.execute("SELECT project FROM projects WHERE user = ? AND diskusage IS NULL", (user,)).fetchall():
+            self.measure(user, row['project'])
+        return db.execute("SELECT COALESCE(SUM(diskusage), 0.0) FROM projects WHERE user = ?", (user,)).fetchone()[0]
+
+    def reconcile(self, maxage, limit=100):
+        with self.transaction() as db:
+            #claim the projects first, so other processes running a reconciler don't scan the same ones
+            rows = db.execute("SELECT user, project FROM projects WHERE reconciled IS NULL OR reconciled < ? LIMIT ?", (time.time() - maxage, limit)).fetchall()
+            for row in rows:
+                db.execute("UPDATE projects SET reconciled = ? WHERE user = ? AND project = ?", (time.time(), row['user'], row['project']))
+        for row in rows:
+            if os.path.isdir(self.path(row['user'], row['project'])):
+                self.measure(row['user'], row['project'])
+            else: #removed behind our back
+                self.delete(row['user'], row['project'])
+        return len(rows)
+
+    def close(self):
+        if getattr(self.local, 'pid', None) == os.getpid():
+            self.local.db.close()
+            del self.local.db
+            self.local.pid = None
+
+
+class Transaction(object):
+    """Context manager for a write transaction, the write lock is taken right away so concurrent read-modify-write cycles are serialised"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.db.execute("COMMIT")
+        else:
+            self.db.execute("ROLLBACK")
+        return False
+
+
+def rowtodict(row):
+    state = dict(zip(row.keys(), tuple(row)))
+    state['aborted'] = bool(state['aborted'])
+    return state
+
+def getbackend(name, projectsdir):
+    """Instantiate a project state backend by name: 'sqlite' (default), 'files', or the full module path of a ProjectState subclass (e.g. mymodule.MyProjectState)"""
+    if not name or name == 'sqlite':
+        return SQLiteProjectState(projectsdir)
+    elif name == 'files':
+        return FileProjectState(projectsdir)
+    elif '.' in name:
+        modulename, classname = name.rsplit('.',1)
+        return getattr(importlib.import_module(modulename), classname)(projectsdir)
+    else:
+        raise ValueError("No such project state backend: " + name)
+
+def forproject(name, projectdir):
+    """Instantiate a project state backend for use by the dispatcher or supervisor, which only know the project directory ($ROOT/projects/$USER/$PROJECT/). Returns a (backend, user, project) tuple"""
+    projectdir = os.path.abspath(projectdir)
+    userdir = os.path.dirname(projectdir)
+    return getbackend(name, os.path.dirname(userdir)), os.path.basename(userdir), os.path.basename(projectdir)
@@ -1,12 +1,19 @@
 from __future__ import print_function, unicode_literals, division, absolute_import
 
 import io
+import os
+import re
 import time
 import sys
+import datetime
+import threading
+
+import clam.common.util
 
 READY = 0
 RUNNING = 1
 DONE = 2
+QUEUED = 3 #waiting in the supervisor's queue for a free slot
 
 
 def write(statusfile, statusmessage, completion = 0, timestamp = False, encoding = 'utf-8'):
@@ -21,3 +28,96 @@ def write(statusfile, statusmessage, completion = 0, timestamp = False, encoding
         f.write(str(completion) + "%\t" + str(timestamp) + "\t" + statusmessage + "\n")
         f.close()
 
+
+
+DATEMATCH = re.compile(r'^[\d\.\-\s:]*$')
+
+LOGCACHE = clam.common.util.LRUCache(256) #statusfile => StatusLog, so status polls only need to parse what was appended since the last poll
+
+class StatusLog(object):
+    """The parsed contents of a status file, updated incrementally: only lines appended since the last update are read and parsed"""
+
+    def __init__(self):
+        self.inode = None
+        self.offset = 0 #number of bytes parsed so far
+        self.entries = [] #(message, timestamp, completion) tuples, oldest first
+        self.completion = 0
+        self.prevmsg = None
+        self.lock = threading.Lock()
+
+    def clear(self):
+        self.inode = None
+        self.offset = 0
+        self.entries = []
+        self.completion = 0
+        self.prevmsg = None
+
+    def update(self, statusfile):
+        with self.lock:
+            try:
+                stat = os.stat(statusfile)
+            except OSError:
+                self.clear()
+                return
+            if stat.st_ino != self.inode or stat.st_size < self.offset:
+                #file was replaced or truncated, start over
+                self.clear()
+                self.inode = stat.st_ino
+            if stat.st_size > self.offset:
+                with io.open(statusfile,'rb') as f:
+                    f.seek(self.offset)
+                    data = f.read(stat.st_size - self.offset)
+                end = data.rfind(b"\n") + 1 #an incomplete last line is left for the next update
+                if end:
+                    self.offset += end
+                    for line in data[:end].decode('utf-8', errors='replace').split("\n"):
+                        self.parseline(line)
+
+    def parseline(self, line):
+        line = line.strip()
+        if line:
+            message = ""
+            completion = 0
+            timestamp = ""
+            for field in line.split("\t"):
+                if field:
+                    if field[-1] == '%' and field[:-1].isdigit():
+                        completion = int(field[:-1])
+                        if completion > 0:
+                            self.completion = completion
+                    elif DATEMATCH.match(field):
+                        if field.isdigit():
+                            try:
+                                d = datetime.datetime.fromtimestamp(float(field))
+                                timestamp = d.strftime("%d/%b/%Y %H:%M:%S")
+                            except ValueError:
+                                pass
+                    else:
+                        message += " " + field
+            if message and (message != self.prevmsg):
+                self.entries.append( (message.strip(), timestamp, completion) )
+                self.prevmsg = message
+
+    def get(self, limit=None):
+        """Returns a list of (message, timestamp, completion) tuples, most recent first, and the total completion"""
+        with self.lock:
+            if limit:
+                entries = self.entries[-limit:]
+            else:
+                entries = self.entries[:]
+        entries.reverse()
+        return entries, self.completion
+
+
+def getlog(statusfile):
+    """Returns the StatusLog for a status file, brought up to date"""
+    log = LOGCACHE.get(statusfile)
+    if log is None:
+        log = StatusLog()
+        LOGCACHE.set(statusfile, log)
+    log.update(statusfile)
+    return log
+
+def read(statusfile, limit=None):
+    """Reads a status file, returns a list of (message, timestamp, completion) tuples (most recent first, at most limit if set) and the total completion. Parsed status files are cached, later calls only parse the lines that were appended in the meantime"""
+    return getlog(statusfile).get(limit)
@@ -21,6 +21,17 @@ import os
 import sys
 import datetime
 import io
+import time
+import errno
+import select
+import threading
+import ctypes
+import ctypes.util
+from collections import OrderedDict
+try:
+    from os import scandir
+except ImportError: #Python < 3.5
+    scandir = None
 
 if sys.version < '3':
     from codecs import getwriter
@@ -43,12 +54,189 @@ def globsymlinks(pattern, recursion=True):
                     yield linkf,realf
 
 def computediskusage(path):
+    """Returns the total size of all files under path, in MB. Symbolic links are not followed"""
+    return diskusage(path) / 1024 / 1024 #MB
+
+def diskusage(path):
+    """Returns the total size of all files under path in bytes, using os.scandir where available so no extra stat calls are needed on most platforms"""
     total_size = 0
-    for dirpath, dirnames, filenames in os.walk(path): #pylint: disable=unused-variable
-        for f in filenames:
-            fp = os.path.join(dirpath, f)
-            total_size += os.path.getsize(fp)
-    return total_size / 1024 / 1024 #MB
+    if scandir is None:
+        for dirpath, dirnames, filenames in os.walk(path): #pylint: disable=unused-variable
+            for f in filenames:
+                total_size += filesize(os.path.join(dirpath, f))
+        return total_size
+    try:
+        entries = list(scandir(path))
+    except OSError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                total_size += diskusage(entry.path)
+            else:
+                total_size += entry.stat(follow_symlinks=False).st_size
+        except OSError: #file disappeared in the meantime
+            pass
+    return total_size
+
+def filesize(path):
+    """Returns the size of the file in bytes (of the link itself for symbolic links), or 0 if it does not exist"""
+    try:
+        return os.lstat(path).st_size
+    except OSError:
+        return 0
+
+def memoryavailable():
+    """Returns the amount of free memory (including the page cache) in kB, or None if this can not be determined (no /proc/meminfo)"""
+    if not os.path.exists('/proc/meminfo'):
+        return None
+    memfree = cached = 0.0
+    with open('/proc/meminfo') as f:
+        for line in f:
+            if line[0:8] == "MemFree:":
+                memfree = float(line[9:].replace('kB','').strip()) #in kB
+            if line[0:8] == "Cached:":
+                cached = float(line[9:].replace('kB','').strip()) #in kB
+    return memfree + cached
+
+def loadaverage():
+    """Returns the load average over the last minute, or None if this can not be determined (no /proc/loadavg)"""
+    if not os.path.exists('/proc/loadavg'):
+        return None
+    with open('/proc/loadavg') as f:
+        line = f.readline()
+        return float(line.split(' ')[0])
+
+
+class LRUCache(object):
+    """Thread-safe cache that keeps at most maxsize items, discarding the least recently used ones first. If ttl (seconds) is set, items also expire after that time"""
+
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict() #key => (time, value), least recently used first
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                t, value = self.data.pop(key)
+            except KeyError:
+                return default
+            if self.ttl is not None and time.time() - t > self.ttl:
+                return default
+            self.data[key] = (t, value) #reinsert as most recently used
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            if key in self.data:
+                del self.data[key]
+            elif len(self.data) >= self.maxsize:
+                self.data.popitem(last=False)
+            self.data[key] = (time.time(), value)
+
+    def pop(self, key, default=None):
+        with self.lock:
+            try:
+                return self.data.pop(key)[1]
+            except KeyError:
+                return default
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
+
+    def __len__(self):
+        return len(self.data)
+
+
+INOTIFY_MASK = 0x2 | 0x4 | 0x8 | 0x80 | 0x100 | 0x200 #IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+INOTIFY_FLAGS = 0o4000 | 0o2000000 #IN_NONBLOCK | IN_CLOEXEC
+
+LIBC = None
+
+class DirectoryWatcher(object):
+    """Waits for files in a directory to be created, modified or deleted. Uses inotify where available (Linux), otherwise (or if we run out of inotify instances) it falls back to periodically checking the modification time and size of the directory and of the specified files"""
+
+    def __init__(self, path, files=(), pollinterval=0.5):
+        global LIBC
+        self.path = path
+        self.files = [ os.path.join(path, f) for f in files ]
+        self.pollinterval = pollinterval
+        self.fd = None
+        if LIBC is None:
+            try:
+                LIBC = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+                LIBC.inotify_init1 #pylint: disable=pointless-statement
+            except (OSError, AttributeError):
+                LIBC = False
+        if LIBC:
+            fd = LIBC.inotify_init1(INOTIFY_FLAGS)
+            if fd >= 0:
+                if LIBC.inotify_add_watch(fd, path.encode('utf-8'), INOTIFY_MASK) >= 0:
+                    self.fd = fd
+                else:
+                    os.close(fd)
+        if self.fd is None:
+            self.snapshot = self.stat()
+
+    def stat(self):
+        snapshot = []
+        for f in [self.path] + self.files:
+            try:
+                s = os.stat(f)
+                snapshot.append( (s.st_mtime, s.st_size) )
+            except OSError:
+                snapshot.append(None)
+        return snapshot
+
+    def wait(self, timeout):
+        """Waits at most timeout seconds for a change, returns True if something changed, False if the timeout expired"""
+        if self.fd is not None:
+            #poll rather than select, in a long-running server the descriptor may well exceed FD_SETSIZE
+            poller = select.poll()
+            poller.register(self.fd, select.POLLIN)
+            try:
+                ready = poller.poll(max(0, timeout) * 1000)
+            except (select.error, OSError) as e:
+                if e.args[0] != errno.EINTR:
+                    raise
+                return False
+            if ready:
+                try:
+                    while os.read(self.fd, 4096): #drain all pending events
+                        pass
+                except OSError as e:
+                    if e.errno != errno.EAGAIN:
+                        raise
+                return True
+            return False
+        else:
+            endtime = time.time() + timeout
+            while True:
+                snapshot = self.stat()
+                if snapshot != self.snapshot:
+                    self.snapshot = snapshot
+                    return True
+                remaining = endtime - time.time()
+                if remaining <= 0:
+                    return False
+                time.sleep(min(self.pollinterval, remaining))
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
 
 def setlog(log):
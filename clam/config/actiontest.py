@@ -28,6 +28,7 @@ from clam.common.viewers import *
 from clam.common.data import *
 from clam.common.digestauth import pwhash
 import sys
+import time
 
 REQUIRE_VERSION = "0.99"
 
@@ -125,15 +126,38 @@ PARAMETERS =  []
 
 def multiply(x,y):
     return x * y
+
+def wait(seconds):
+    time.sleep(seconds)
+    return seconds
 # ======== ACTIONS ===========
 
 ACTIONS = [
     Action(id="uppercase",name="Uppercaser",description="Convert a string to upper case", tmpdir=True, command="echo $text$ | tr '[:lower:]' '[:upper:]'", parameters=[
             StringParameter(id="text", name="Text", required=True),
     ]),
+    Action(id="uppercase_async",name="Uppercaser",description="Convert a string to upper case, in the background", asynchronous=True, command="echo $text$ | tr '[:lower:]' '[:upper:]'", parameters=[
+            StringParameter(id="text", name="Text", required=True),
+    ]),
+    Action(id="count",name="Counter",description="Count to the specified number, streaming the output", stream=True, command="seq $n$", parameters=[
+            IntegerParameter(id="n", name="Number", required=True),
+    ]),
+    Action(id="countfail",name="Failing counter",description="Count to the specified number, streaming the output, and then fail", stream=True, tmpdir=True, command="seq $n$; echo 'failed on purpose' >&2; exit 3", parameters=[
+            IntegerParameter(id="n", name="Number", required=True),
+    ]),
+    Action(id="timestamp",name="Timestamp",description="The time of the first call with the specified key", cache=True, cachettl=60, command="date +%s%N", parameters=[
+            StringParameter(id="key", name="Key", required=True),
+    ]),
     Action(id="multiply",name="Multiplier",description="Multiply two numbers", function=multiply, parameters=[
             IntegerParameter(id="x", name="First value", required=True),
             IntegerParameter(id="y", name="Second value", required=True)
+    ]),
+    Action(id="multiply_process",name="Multiplier",description="Multiply two numbers, in a separate process", function=multiply, executor='process', parameters=[
+            IntegerParameter(id="x", name="First value", required=True),
+            IntegerParameter(id="y", name="Second value", required=True)
+    ]),
+    Action(id="wait",name="Wait",description="Wait the specified number of seconds", function=wait, executor='thread', timeout=1, maxconcurrency=1, parameters=[
+            FloatParameter(id="seconds", name="Seconds", required=True),
     ])
 ]
 
@@ -95,6 +95,18 @@ ADMINS = None #List of usernames that are administrator and can access the admin
 
 #USERS = { user1': '4f8dh8337e2a5a83734b','user2': pwhash('username', REALM, 'secret') }
 
+#The nonces handed out by HTTP Digest Authentication are kept in an SQLite database in SESSIONDIR by default, which all
+#workers share. Set to 'memory' to keep them in memory instead, which is only suitable if the service runs in a single
+#process, to 'files' to store one file per nonce in SESSIONDIR (as older versions did), or to the module path of your own
+#clam.common.auth.NonceMemory subclass.
+#NONCEMEMORY = 'sqlite'
+
+#Alternatively, users and (hashed) passwords can be looked up in a MySQL table (pip install mysqlclient). Connections are
+#kept open in a pool of (at most) poolsize connections, and passwords (and unknown users) are cached for cachettl
+#(negativecachettl) seconds, so changes to the table may take that long to take effect:
+#USERS_MYSQL = { 'host': 'localhost', 'user': 'clam', 'password': 'secret', 'database': 'clam', 'table': 'users',
+#                'userfield': 'username', 'passwordfield': 'password', 'poolsize': 4, 'cachettl': 60, 'negativecachettl': 10 }
+
 #Amount of free memory required prior to starting a new process (in MB!), Free Memory + Cached (without swap!). Set to 0 to disable this check (not recommended)
 REQUIREMEMORY = 10
 
@@ -133,6 +145,11 @@ STYLE = 'classic'
 #Here you can specify additional interface options (space separated list), see the documentation for all allowed options
 #INTERFACEOPTIONS = "inputfromweb" #allow CLAM to download its input from a user-specified url
 
+#The web interface waits for status updates by long polling, each open project page holds a request (and
+#thus a worker of your WSGI server) for at most this many seconds before asking again (default: 10).
+#Keep this low if you run with only a few synchronous workers.
+#INTERFACE_POLLWAIT = 10
+
 # ======== PREINSTALLED DATA ===========
 
 #INPUTSOURCES = [
@@ -197,6 +214,18 @@ COMMAND = WEBSERVICEDIR + "/your-wrapper-script.py $DATAFILE $STATUSFILE $OUTPUT
 
 #Or if you only use the action paradigm, set COMMAND = None
 
+#If every output file derives from exactly one input file (output templates with a parent input template), the
+#system can instead be run once for each output file, with several of those runs in parallel. Set PERFILECOMMAND to
+#enable this, it supports the same variables as COMMAND plus:
+#     $INPUTFILE       - The input file to process
+#     $OUTPUTFILE      - The output file to produce
+#     $STATUSFILE      - (refers to a separate status file for each run, CLAM merges them into the project status)
+#If a run of the project has output files that depend on multiple input files, COMMAND is used as usual.
+#PERFILECOMMAND = WEBSERVICEDIR + "/your-wrapper-script.py $DATAFILE $STATUSFILE $INPUTFILE $OUTPUTFILE"
+
+#The maximum number of runs of PERFILECOMMAND at once for a single project (0 = the number of CPUs, default)
+#MAXPARALLEL = 0
+
 # ======== PARAMETER DEFINITIONS ===========
 
 #The global parameters (for the project paradigm) are subdivided into several
@@ -219,10 +248,31 @@ PARAMETERS =  [
 #It has no notion of projects or files and must respond in real-time. The syntax
 #for commands is equal to those of COMMAND above, any file or project specific
 #variables are not available though, so there is no $DATAFILE, $STATUSFILE, $INPUTDIRECTORY, $OUTPUTDIRECTORY or $PROJECT.
+#
+#Commands that take long should not keep a request (and a worker of the webserver) waiting. Set asynchronous=True on
+#such actions: the response is then a 202 with the URL of a job in the Location header. A GET on that URL returns 202 as
+#long as the command runs, and its result afterwards; a DELETE cancels the job and removes the result (results that
+#are never deleted are removed after ACTIONJOBEXPIRY seconds, default 86400).
+#Set stream=True instead to send the output of the command to the client as it is produced, rather than once it is done
+#(the HTTP status is then always 200, regardless of the exit code).
+#
+#Functions run in the request thread by default. Set executor='thread' to run them in a shared thread pool (ACTIONTHREADS
+#threads, default 8), or executor='process' for CPU-bound functions, to run them in a shared pool of ACTIONPROCESSES
+#processes (default: the number of CPUs; the function and its return value must be picklable then, so no lambdas).
+#With an executor, timeout= sets the number of seconds after which the request is answered with 504 (the function itself
+#is not interrupted), and maxconcurrency= the number of calls of the action that may run at once. Requests that can not
+#start right away because the pool (or the action's share of it) is full are answered with 503 and a Retry-After header.
+#
+#If the result of an action only depends on its parameters, set cache=True to keep the result of each distinct call (and
+#cachettl= to the number of seconds it remains valid, 0 = until it is evicted). Each webserver process keeps the
+#ACTIONCACHE_SIZE (default 1000) most recently used results in memory; set ACTIONCACHE_SHARED = True to also share them
+#between processes through SESSIONDIR (where expired results, and the least recently used ones beyond ACTIONCACHE_SIZE,
+#are removed every minute). Cached results carry an ETag, so clients can revalidate them with If-None-Match.
 
 ACTIONS = [
     #Action(id='multiply',name='Multiply',parameters=[IntegerParameter(id='x',name='Value'),IntegerParameter(id='y',name='Multiplier'), command=sys.path[0] + "/actions/multiply.sh $PARAMETERS" ])
     #Action(id='multiply',name='Multiply',parameters=[IntegerParameter(id='x',name='Value'),IntegerParameter(id='y',name='Multiplier'), function=lambda x,y: x*y ])
+    #Action(id='analyse',name='Analyse',parameters=[StringParameter(id='text',name='Text')], function=analyse, executor='process', timeout=30, maxconcurrency=2)
 ]
 
 
@@ -236,6 +286,61 @@ ACTIONS = [
 #DISPATCHER_MAXTIME = 0      #maximum number of seconds a process may run, it will be aborted if this duration is exceeded.   (0=unlimited, default)
 #DISPATCHER_PYTHONPATH = []        #list of extra directories to add to the python path prior to launch of dispatcher
 
+#Instead of launching a separate dispatcher process for every project, jobs can be handed to a single supervisor
+#daemon (one per node) that supervises all of them. Start it with: clamsupervisor -s /path/to/socket
+#(as the same user the webservice runs as) and set the socket here. The DISPATCHER_MAX* limits above still apply.
+#If the supervisor can not be reached, CLAM falls back to the dispatcher.
+#The supervisor can also limit the number of jobs running at once (clamsupervisor --maxjobs N --maxjobsperuser N),
+#jobs beyond that limit wait in a queue (status QUEUED) instead of being refused. With a supervisor, REQUIREMEMORY
+#and MAXLOADAVG also no longer refuse jobs but keep them in the queue until the system is available again.
+#SUPERVISOR_SOCKET = '/tmp/clamsupervisor.sock'
+
+#If your wrapper is written in Python, the supervisor can keep a pool of warm worker processes that have already imported
+#this configuration and your wrapper, so jobs start without the overhead of launching the dispatcher and a new Python
+#interpreter. Set WORKER_FUNCTION to the wrapper's entry point (module.function, importable from the directory of this
+#configuration or DISPATCHER_PYTHONPATH), it is called as function(clamdata, statusfile, outputdir) from within the project
+#directory and its return value is the exit code. Requires SUPERVISOR_SOCKET, COMMAND is still used when no worker is idle.
+#WORKER_FUNCTION = 'yourwrapper.main'
+#WORKERS = 4            #number of warm workers (default: 4)
+#WORKER_MAXJOBS = 100   #each worker is replaced by a fresh one after this many jobs, to contain leaks (0 = never, default: 100)
+
+#The state of all projects (status, exit code, disk usage, etc) is kept in a single SQLite database in ROOT/projects/ by default.
+#Set to 'files' to derive it from the files in the project directories instead, as older versions did (use this if ROOT is
+#on a network filesystem on which SQLite does not work reliably), or to the module path of your own
+#clam.common.state.ProjectState subclass.
+#PROJECTSTATE = 'sqlite'
+
+#When a project starts, the metadata of every output file it will produce is written to a hidden .METADATA file next to
+#it. For services that produce very many output files, set this to 'sqlite' to write the metadata of all output files
+#of a project to a single database (output/.METADATA.sqlite) in one go instead. Existing projects can be converted with
+#the clammetadata tool.
+#OUTPUTMETADATA = 'files'
+
+#The metadata of input and output files that was read from disk is kept in memory, for as long as the metadata file is
+#unchanged, so listing the files of a project does not parse it again each time. This sets the maximum number of files
+#whose metadata is kept (per process, 0 to disable).
+#METADATACACHE_SIZE = 10000
+
+#The disk usage of projects is kept up to date incrementally as files are added and removed. A background thread rescans
+#projects whose disk usage was last measured more than this many seconds ago, to correct any drift (for instance due to
+#files changed outside of CLAM). Set to 0 to disable. (Requires the sqlite project state)
+#DISKUSAGE_RECONCILE = 86400
+
+#Downloads of all output as a single archive are normally built on the fly while they are sent. Set this to a size (in MB) to
+#instead keep the archives that are built in a cache ($ROOT/archives/), so repeated downloads of the same output are sent right away.
+#The least recently used archives are removed when the cache grows beyond this size. Set to 0 to disable.
+#ARCHIVECACHE = 0
+
+#Small inputs can be processed in a single request with POST /run: it takes the input files (in fields named after their
+#input template) and the parameters, runs the system in a temporary project and responds with the output file (or an archive of
+#all output files). The temporary project is kept in this directory, a tmpfs by default (/dev/shm). Set to None to keep it
+#in ROOT/projects/ like other projects. (The project name 'run' is reserved for this)
+#RUNDIR = '/dev/shm'
+
+#Maximum number of seconds a request to /run may take, including the time the job waits in the queue. The job is aborted and
+#the request answered with 504 (Gateway Timeout) after that. Set to 0 for no limit (default: 300)
+#RUNTIMEOUT = 300
+
 #Run background process on a remote host? Then set the following (leave the lambda in):
 #REMOTEHOST = lambda: return 'some.remote.host'
 #REMOTEUSER = 'username'
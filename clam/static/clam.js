@@ -162,7 +162,10 @@ function setlocalinputsource(selector, target) {//eslint-disable-line no-unused-
     }
 }
 
+var statuslogoffset = 0; //number of status log entries seen so far
+
 function pollstatus() {
+    /* Long polling: the server answers as soon as there is news, or after at most pollwait seconds (INTERFACE_POLLWAIT) */
     $.ajax({
         type: 'GET',
         url: baseurl + '/' + project + "/status/",
@@ -172,9 +175,10 @@ function pollstatus() {
           withCredentials: true
         },
         dataType: 'json',
-        data: {accesstoken: accesstoken, user: user},
+        data: {accesstoken: accesstoken, user: user, wait: (typeof pollwait !== 'undefined') ? pollwait : 10, since: statuslogoffset, statuscode: stage},
         success: function(response){
-                if (response.statuscode !== 1) {
+                statuslogoffset = response.offset;
+                if (response.statuscode !== stage) {
                     if (oauth_access_token !== "") {
                       window.location.href = baseurl + '/' + project + '/?oauth_access_token=' + oauth_access_token; /* refresh */
                     } else {
@@ -193,7 +197,7 @@ function pollstatus() {
                     }
                     $('#statuslogtable').html(statuslogcontent);
                 }
-                setTimeout(pollstatus,2000);
+                setTimeout(pollstatus,500);
         },
         error: function(response,errortype){ //eslint-disable-line no-unused-vars
             alert("Error obtaining status");
@@ -454,6 +458,8 @@ function initclam() { //eslint-disable-line no-unused-vars, complexity
       if (stage === 1) {
             $('#progressbar').progressbar({value: progress});
             setTimeout(pollstatus,2000);
+       } else if (stage === 3) { //queued
+            setTimeout(pollstatus,2000);
        }
     }
 
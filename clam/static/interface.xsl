@@ -33,7 +33,7 @@
 				         <li class="disabled">3. Processing</li>
 				         <li class="disabled">4. Output &amp; Visualisation</li>
 				        </xsl:when>
-				        <xsl:when test="status/@code = 1">  
+				        <xsl:when test="status/@code = 1 or status/@code = 3">  
 				         <li class="disabled">2. Input &amp; Parameters</li>
 				         <li class="active">3. Processing</li>
 				         <li class="disabled">4. Output &amp; Visualisation</li>
@@ -105,7 +105,7 @@
 <xsl:template name="head">
   <head>
     <meta http-equiv="Content-Type" content="text/html; charset=utf-8" />
-    <xsl:if test="status/@code = 1 and (contains(/clam/@interfaceoptions,'secureonly') or contains(/clam/@interfaceoptions,'simplepolling'))" >
+    <xsl:if test="(status/@code = 1 or status/@code = 3) and (contains(/clam/@interfaceoptions,'secureonly') or contains(/clam/@interfaceoptions,'simplepolling'))" >
       <meta http-equiv="refresh" content="2" />            
     </xsl:if>
     <title><xsl:value-of select="@name"/> :: <xsl:value-of select="@project"/></title>
@@ -141,6 +141,9 @@
         <xsl:if test="status/@code = 2">        
                 stage = 2;
         </xsl:if>
+        <xsl:if test="status/@code = 3">
+                stage = 3;
+        </xsl:if>
         <xsl:if test="/clam/@project">
                 project = '<xsl:value-of select="/clam/@project" />';                
         </xsl:if>
@@ -260,6 +263,14 @@
         <div id="statusmessage" class="done"><xsl:value-of select="@message"/></div>
         <xsl:call-template name="log" />
       </xsl:when>
+      <xsl:when test="@code = 3">
+        <div id="actions">
+        	<input id="abortbutton" type="button" value="Cancel" />
+        </div>
+        <div id="statusmessage" class="running"><xsl:value-of select="@message"/></div>
+        <img class="progress" src="{/clam/@baseurl}/static/progress.gif" />
+        <p>You may safely close your browser or shut down your computer while waiting, the system will start processing on the server when it is available and the results will be there when you return another time.</p>
+      </xsl:when>
       <xsl:otherwise>
         <div id="statusmessage" class="other"><xsl:value-of select="@message"/></div>
       </xsl:otherwise>
@@ -425,10 +436,10 @@
         <p>(Download all as archive:
           <xsl:choose>
           <xsl:when test="/clam/@oauth_access_token = ''">
-            <a href="output/zip/">zip</a> | <a href="output/gz/">tar.gz</a> | <a href="output/bz2/">tar.bz2</a>)
+            <a href="output/zip/">zip</a> | <a href="output/gz/">tar.gz</a> | <a href="output/bz2/">tar.bz2</a> | <a href="output/xz/">tar.xz</a>)
           </xsl:when>
           <xsl:otherwise>
-            <a href="output/zip/?oauth_access_token={/clam/@oauth_access_token}">zip</a> | <a href="output/gz/?oauth_access_token={/clam/@oauth_access_token}">tar.gz</a> | <a href="output/bz2/?oauth_access_token={/clam/@oauth_access_token}">tar.bz2</a>)
+            <a href="output/zip/?oauth_access_token={/clam/@oauth_access_token}">zip</a> | <a href="output/gz/?oauth_access_token={/clam/@oauth_access_token}">tar.gz</a> | <a href="output/bz2/?oauth_access_token={/clam/@oauth_access_token}">tar.bz2</a> | <a href="output/xz/?oauth_access_token={/clam/@oauth_access_token}">tar.xz</a>)
           </xsl:otherwise>
           </xsl:choose>
         </p>
@@ -647,6 +658,11 @@
                                <span class="done">done</span>
                            </xsl:when>
                        </xsl:choose>
+                       <xsl:choose>
+                           <xsl:when test="@status = 3">
+                               <span class="running">queued</span>
+                           </xsl:when>
+                       </xsl:choose>
                     </td>
                    <td><xsl:value-of select="@size" /> MB</td>
                    <td><xsl:value-of select="@time" /></td>
@@ -654,6 +670,17 @@
            </xsl:for-each>
           </tbody>
         </table>
+        <xsl:if test="/clam/projects/@limit">
+        <div class="pager">
+            Projects <xsl:value-of select="/clam/projects/@offset + 1" /> to <xsl:value-of select="/clam/projects/@offset + count(/clam/projects/project)" /> of <xsl:value-of select="/clam/projects/@count" />
+            <xsl:if test="/clam/projects/@offset > 0">
+                <a><xsl:attribute name="href"><xsl:value-of select="/clam/@baseurl" />/?offset=<xsl:value-of select="(/clam/projects/@offset - /clam/projects/@limit) * (/clam/projects/@offset > /clam/projects/@limit)" />&amp;limit=<xsl:value-of select="/clam/projects/@limit" /><xsl:if test="/clam/@oauth_access_token != ''">&amp;oauth_access_token=<xsl:value-of select="/clam/@oauth_access_token"/></xsl:if></xsl:attribute>previous</a>
+            </xsl:if>
+            <xsl:if test="/clam/projects/@count > /clam/projects/@offset + /clam/projects/@limit">
+                <a><xsl:attribute name="href"><xsl:value-of select="/clam/@baseurl" />/?offset=<xsl:value-of select="/clam/projects/@offset + /clam/projects/@limit" />&amp;limit=<xsl:value-of select="/clam/projects/@limit" /><xsl:if test="/clam/@oauth_access_token != ''">&amp;oauth_access_token=<xsl:value-of select="/clam/@oauth_access_token"/></xsl:if></xsl:attribute>next</a>
+            </xsl:if>
+        </div>
+        </xsl:if>
         <div class="diskusage">
             <span>Disk size used: <xsl:value-of select="/clam/projects/@totalsize" /> MB</span><br />
             <button onclick="showquickdelete()">Show delete buttons</button>
@@ -18,7 +18,10 @@ from __future__ import print_function, unicode_literals, division, absolute_impo
 
 import sys
 import os
+import time
+import glob
 import unittest
+import requests
 
 #We may need to do some path magic in order to find the clam.* imports
 
@@ -53,5 +56,70 @@ class ActionServiceTest(unittest.TestCase):
         result = self.client.action('multiply',x=2,y=3)
         self.assertEqual(result.strip(), "6")
 
+    def test4_asynchronous(self):
+        """Action Test (Command) - Asynchronous"""
+        r = requests.post(self.url + '/actions/uppercase_async/', data={'text': 'test'})
+        self.assertEqual(r.status_code, 202)
+        joburl = r.headers['Location']
+        for _ in range(50):
+            r = requests.get(joburl)
+            if r.status_code != 202:
+                break
+            time.sleep(0.1)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.text.strip(), "TEST")
+        self.assertEqual(requests.delete(joburl).status_code, 200)
+        self.assertEqual(requests.get(joburl).status_code, 404)
+
+    def test5_stream(self):
+        """Action Test (Command) - Streaming"""
+        r = requests.get(self.url + '/actions/count/', params={'n': 10000}, stream=True)
+        self.assertEqual(r.status_code, 200)
+        lines = r.text.split()
+        self.assertEqual(len(lines), 10000)
+        self.assertEqual(lines[-1], "10000")
+
+    def test5b_streamfailure(self):
+        """Action Test (Command) - Streaming of a failing command, cleaning up afterwards"""
+        sessiondir = '/tmp/clamactiontest.projects/sessions/' #SESSIONDIR of the actiontest service
+        tmpdirs = set(glob.glob(sessiondir + 'atmp.*')) #left behind by earlier runs, if any
+        r = requests.get(self.url + '/actions/countfail/', params={'n': 100}, stream=True)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.text.split()[:3], ['1','2','3'])
+        for _ in range(20): #the temporary directory is removed once the response is complete
+            if not set(glob.glob(sessiondir + 'atmp.*')) - tmpdirs:
+                break
+            time.sleep(0.1)
+        self.assertEqual(set(glob.glob(sessiondir + 'atmp.*')) - tmpdirs, set())
+        #the service is still fine
+        self.assertEqual(requests.get(self.url + '/actions/count/', params={'n': 3}).text.split(), ['1','2','3'])
+
+    def test6_executor(self):
+        """Action Test (Function) - Process executor"""
+        r = requests.post(self.url + '/actions/multiply_process/', data={'x': 2, 'y': 3})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.text.strip(), "6")
+
+    def test7_executorlimits(self):
+        """Action Test (Function) - Executor timeout and concurrency"""
+        self.assertEqual(requests.post(self.url + '/actions/wait/', data={'seconds': 0.1}).status_code, 200)
+        self.assertEqual(requests.post(self.url + '/actions/wait/', data={'seconds': 2}).status_code, 504)
+        #the previous call is still running, only one may run at once
+        r = requests.post(self.url + '/actions/wait/', data={'seconds': 0.1})
+        self.assertEqual(r.status_code, 503)
+        self.assertTrue('Retry-After' in r.headers)
+
+    def test8_cache(self):
+        """Action Test (Command) - Cached results and revalidation"""
+        r = requests.post(self.url + '/actions/timestamp/', data={'key': 'a'})
+        self.assertEqual(r.status_code, 200)
+        r2 = requests.post(self.url + '/actions/timestamp/', data={'key': 'a'})
+        self.assertEqual(r2.text, r.text)
+        self.assertEqual(r2.headers['ETag'], r.headers['ETag'])
+        r3 = requests.post(self.url + '/actions/timestamp/', data={'key': 'b'})
+        self.assertNotEqual(r3.text, r.text)
+        r4 = requests.get(self.url + '/actions/timestamp/', params={'key': 'a'}, headers={'If-None-Match': r.headers['ETag']})
+        self.assertEqual(r4.status_code, 304)
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
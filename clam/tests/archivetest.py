@@ -0,0 +1,99 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Streaming archive tests --
+#       by Maarten van Gompel (proycon)
+#       http://ilk.uvt.nl/~mvgompel
+#       Induction for Linguistic Knowledge Research Group
+#       Universiteit van Tilburg
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+import unittest
+import sys
+import os
+import io
+import shutil
+import tempfile
+import zipfile
+import tarfile
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/../../')
+os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
+
+import clam.common.archive
+
+class StreamingArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.outputdir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.outputdir, 'sub'))
+        with open(os.path.join(self.outputdir, 'test.txt'),'wb') as f:
+            f.write(b"Hello world\n" * 100000)
+        with open(os.path.join(self.outputdir, 'sub', 'test.gz'),'wb') as f:
+            f.write(os.urandom(200000))
+        with open(os.path.join(self.outputdir, '.test.txt.METADATA'),'wb') as f:
+            f.write(b"<CLAMMetaData />")
+
+    def tearDown(self):
+        shutil.rmtree(self.outputdir)
+
+    def test1_zip(self):
+        """Streaming archive - Zip archive built in several chunks"""
+        chunks = list(clam.common.archive.stream(self.outputdir, 'zip'))
+        self.assertTrue(len(chunks) > 1)
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+        self.assertEqual(archive.namelist(), ['sub/test.gz','test.txt'])
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(archive.getinfo('sub/test.gz').compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(archive.read('test.txt'), b"Hello world\n" * 100000)
+
+    def test2_tar(self):
+        """Streaming archive - Compressed tar archives"""
+        for format in ('tar.gz','tar.bz2'):
+            archive = tarfile.open(fileobj=io.BytesIO(b"".join(clam.common.archive.stream(self.outputdir, format))))
+            self.assertEqual(archive.getnames(), ['sub/test.gz','test.txt'])
+            self.assertEqual(archive.extractfile('test.txt').read(), b"Hello world\n" * 100000)
+
+
+class ArchiveCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.projectdir = os.path.join(self.root, 'projects', 'anonymous', 'test') + '/'
+        os.makedirs(self.projectdir + 'output')
+        with open(self.projectdir + 'output/test.txt','wb') as f:
+            f.write(b"Hello world\n" * 1000)
+        self.cache = clam.common.archive.ArchiveCache(os.path.join(self.root, 'archives'), 1024 * 1024)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test1_reuse(self):
+        """Archive cache - Archives are built once and reused until the output changes"""
+        filename = self.cache.get(self.projectdir, 'zip')
+        self.assertTrue(filename.startswith(os.path.join(self.root, 'archives', 'anonymous', 'test')))
+        self.assertEqual(zipfile.ZipFile(filename).namelist(), ['test.txt'])
+        self.assertEqual(self.cache.get(self.projectdir, 'zip'), filename)
+        self.assertNotEqual(self.cache.get(self.projectdir, 'tar.gz'), filename)
+        with open(self.projectdir + 'output/test2.txt','wb') as f:
+            f.write(b"Bye world\n")
+        filename2 = self.cache.get(self.projectdir, 'zip')
+        self.assertNotEqual(filename2, filename)
+        self.assertEqual(zipfile.ZipFile(filename2).namelist(), ['test.txt','test2.txt'])
+        clam.common.archive.invalidate(self.projectdir)
+        self.assertFalse(os.path.exists(filename2))
+
+    def test2_evict(self):
+        """Archive cache - Least recently used archives are evicted beyond the size budget"""
+        self.cache.maxsize = 1
+        filename = self.cache.get(self.projectdir, 'tar')
+        self.assertTrue(os.path.exists(filename)) #the archive that was just built is kept
+        filename2 = self.cache.get(self.projectdir, 'zip')
+        self.assertTrue(os.path.exists(filename2))
+        self.assertFalse(os.path.exists(filename))
+
+if __name__ == '__main__':
+    unittest.main()
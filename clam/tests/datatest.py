@@ -13,8 +13,12 @@
 ###############################################################
 
 import unittest
+import sqlite3
 import sys
 import os
+import io
+import shutil
+import tempfile
 
 #We may need to do some path magic in order to find the clam.* imports
 sys.path.append(sys.path[0] + '/../../')
@@ -221,8 +225,188 @@ class ParametersInFilename(unittest.TestCase):
         self.assertEqual(filename,'test.utf-8.fr.txt')
 
 
+class ProgramTest(unittest.TestCase):
+    def test1_tasks(self):
+        """Program - Splitting into per-file tasks"""
+        program = clam.common.data.Program('/tmp/')
+        program.add('b.txt.stats','statsbydoc','b.txt','textinput')
+        program.add('a.txt.stats','statsbydoc','a.txt','textinput')
+        program.add('a.txt.freqlist','freqlistbydoc','a.txt','textinput')
+        self.assertEqual(program.tasks(), [('a.txt','a.txt.freqlist'),('a.txt','a.txt.stats'),('b.txt','b.txt.stats')])
+        program.add('overall.stats','overallstats','a.txt','textinput')
+        program.add('overall.stats','overallstats','b.txt','textinput')
+        self.assertIsNone(program.tasks())
 
 
+class LocalFileTest(unittest.TestCase):
+    def setUp(self):
+        self.projectdir = tempfile.mkdtemp() + '/'
+        os.mkdir(self.projectdir + 'input')
+        with io.open(self.projectdir + 'input/test.txt','w',encoding='utf-8') as f:
+            f.write("On espère que tout ça marche bien.\n" * 1000)
+        with io.open(self.projectdir + 'input/.test.txt.METADATA','w',encoding='utf-8') as f:
+            f.write(clam.common.formats.PlainTextFormat(None, encoding='utf-8').xml())
+
+    def tearDown(self):
+        shutil.rmtree(self.projectdir)
+
+    def test1_iteration(self):
+        """Local file - Line and chunk iteration"""
+        inputfile = clam.common.data.CLAMInputFile(self.projectdir, 'test.txt')
+        self.assertEqual(inputfile.metadata['encoding'], 'utf-8')
+        lines = list(inputfile)
+        self.assertEqual(len(lines), 1000)
+        self.assertEqual(lines[0], "On espère que tout ça marche bien.\n")
+        self.assertEqual(inputfile.read(), "".join(lines))
+        chunks = list(inputfile.iterchunks(1024))
+        self.assertTrue(all(len(chunk) == 1024 for chunk in chunks[:-1]))
+        self.assertEqual(b"".join(chunks).decode('utf-8'), inputfile.read())
+
+    def test2_copy(self):
+        """Local file - Copy"""
+        inputfile = clam.common.data.CLAMInputFile(self.projectdir, 'test.txt')
+        inputfile.copy(self.projectdir + 'copy.txt')
+        with io.open(self.projectdir + 'copy.txt','rb') as f:
+            with inputfile.open(binary=True) as original:
+                self.assertEqual(f.read(), original.read())
+
+
+    def test3_lineindex(self):
+        """Local file - Line index and memory map"""
+        inputfile = clam.common.data.CLAMInputFile(self.projectdir, 'test.txt')
+        linelength = len("On espère que tout ça marche bien.\n".encode('utf-8'))
+        index = inputfile.lineindex()
+        self.assertEqual(len(index), 1000)
+        self.assertEqual(index[10], 10 * linelength)
+        self.assertTrue(os.path.exists(self.projectdir + 'input/.test.txt.LINEINDEX'))
+        self.assertEqual(list(clam.common.data.CLAMInputFile(self.projectdir, 'test.txt').lineindex()), list(index)) #from cache
+        self.assertEqual(inputfile.line(999), "On espère que tout ça marche bien.\n")
+        self.assertEqual(inputfile.linerange(2,4), (2 * linelength, 4 * linelength))
+        data = inputfile.mmap()
+        self.assertEqual(data[index[5]:index[6]], "On espère que tout ça marche bien.\n".encode('utf-8'))
+        data.close()
+
+
+class InputManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.projectpath = tempfile.mkdtemp() + '/'
+        os.makedirs(self.projectpath + 'input/sub')
+        for filename in ('a.txt','b.txt','sub/c.txt'):
+            with io.open(self.projectpath + 'input/' + filename,'w',encoding='utf-8') as f:
+                f.write("test")
+
+    def tearDown(self):
+        shutil.rmtree(self.projectpath)
+
+    def test1_manifest(self):
+        """Input manifest - Files are added and removed per input template"""
+        clam.common.data.InputManifest.add(self.projectpath, 'test', 2, 'b.txt')
+        clam.common.data.InputManifest.add(self.projectpath, 'test', 1, 'a.txt')
+        clam.common.data.InputManifest.add(self.projectpath, 'other', 1, 'sub/c.txt')
+        manifest = clam.common.data.InputManifest(self.projectpath)
+        self.assertEqual(manifest.files('test'), [(1,'a.txt'),(2,'b.txt')])
+        self.assertEqual(manifest.inputtemplates('sub/c.txt'), [('other',1)])
+        clam.common.data.InputManifest.remove(self.projectpath, 'a.txt')
+        clam.common.data.InputManifest.remove(self.projectpath, 'sub', True)
+        manifest = clam.common.data.InputManifest(self.projectpath)
+        self.assertEqual(manifest.files('test'), [(2,'b.txt')])
+        self.assertEqual(manifest.files('other'), [])
+
+    def test2_legacy(self):
+        """Input manifest - Projects without a manifest are indexed by their links"""
+        os.symlink(self.projectpath + 'input/a.txt', self.projectpath + 'input/.a.txt.INPUTTEMPLATE.test.1')
+        self.assertEqual(clam.common.data.InputManifest(self.projectpath).files('test'), [(1,'a.txt')])
+        clam.common.data.InputManifest.add(self.projectpath, 'test', 2, 'b.txt')
+        self.assertEqual(clam.common.data.InputManifest(self.projectpath).files('test'), [(1,'a.txt'),(2,'b.txt')])
+
+class MetadataStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.projectpath = tempfile.mkdtemp() + '/'
+        os.makedirs(self.projectpath + 'output/sub')
+        for filename in ('a.txt','sub/b.txt'):
+            with io.open(self.projectpath + 'output/' + filename,'w',encoding='utf-8') as f:
+                f.write("test")
+            clam.common.formats.PlainTextFormat(None, encoding='utf-8', language=filename[-5]).save(self.projectpath + 'output/' + clam.common.data.CLAMOutputFile(self.projectpath, filename, False).metafilename())
+
+    def tearDown(self):
+        shutil.rmtree(self.projectpath)
+
+    def test1_convert(self):
+        """Metadata store - Metadata files are converted and then loaded from the store"""
+        self.assertEqual(clam.common.data.MetadataStore.convert(self.projectpath + 'output'), 2)
+        self.assertFalse(os.path.exists(self.projectpath + 'output/sub/.b.txt.METADATA'))
+        self.assertEqual(clam.common.data.CLAMOutputFile(self.projectpath, 'a.txt').metadata['language'], 'a')
+        outputfile = clam.common.data.CLAMOutputFile(self.projectpath, 'sub/b.txt')
+        self.assertEqual(outputfile.metadata['language'], 'b')
+        outputfile.delete()
+        self.assertRaises(IOError, clam.common.data.CLAMOutputFile, self.projectpath, 'sub/b.txt', True, None, True)
+
+    def test2_reader(self):
+        """Metadata store - Loading metadata shares a read-only connection until the store changes"""
+        clam.common.data.MetadataStore.convert(self.projectpath + 'output')
+        store = clam.common.data.MetadataStore.reader(self.projectpath + 'output')
+        self.assertTrue(clam.common.data.MetadataStore.reader(self.projectpath + 'output') is store)
+        self.assertEqual(clam.common.data.CLAMOutputFile(self.projectpath, 'a.txt').metadata['language'], 'a')
+        self.assertEqual(clam.common.data.CLAMOutputFile(self.projectpath, 'sub/b.txt').metadata['language'], 'b')
+        self.assertTrue(clam.common.data.MetadataStore.reader(self.projectpath + 'output') is store) #reading did not change the store
+        self.assertRaises(sqlite3.OperationalError, store.db.execute, "DELETE FROM metadata")
+        clam.common.data.CLAMOutputFile(self.projectpath, 'a.txt').delete()
+        self.assertFalse(clam.common.data.MetadataStore.reader(self.projectpath + 'output') is store)
+        self.assertRaises(IOError, clam.common.data.CLAMOutputFile, self.projectpath, 'a.txt', True, None, True)
+
+class MetadataCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.projectpath = tempfile.mkdtemp() + '/'
+        os.makedirs(self.projectpath + 'input')
+        with io.open(self.projectpath + 'input/a.txt','w',encoding='utf-8') as f:
+            f.write("test")
+
+    def tearDown(self):
+        shutil.rmtree(self.projectpath)
+
+    def test1_changes(self):
+        """Metadata cache - Metadata is parsed again once it changes"""
+        metafile = self.projectpath + 'input/.a.txt.METADATA'
+        clam.common.formats.PlainTextFormat(None, encoding='utf-8', language='nl').save(metafile)
+        self.assertEqual(clam.common.data.CLAMInputFile(self.projectpath, 'a.txt').metadata['language'], 'nl')
+        inputfile = clam.common.data.CLAMInputFile(self.projectpath, 'a.txt')
+        self.assertEqual(inputfile.metadata['language'], 'nl')
+        self.assertTrue(inputfile.metadata.file is inputfile)
+        clam.common.formats.PlainTextFormat(None, encoding='utf-8', language='fr').save(metafile)
+        os.utime(metafile, (0, 0))
+        self.assertEqual(clam.common.data.CLAMInputFile(self.projectpath, 'a.txt').metadata['language'], 'fr')
+
+    def test2_formatclass(self):
+        """Metadata cache - Custom formats take precedence"""
+        class PlainTextFormat(clam.common.formats.PlainTextFormat):
+            pass
+        self.assertTrue(clam.common.data.getformatclass('PlainTextFormat') is clam.common.formats.PlainTextFormat)
+        clam.common.data.CUSTOM_FORMATS = [PlainTextFormat]
+        try:
+            self.assertTrue(clam.common.data.getformatclass('PlainTextFormat') is PlainTextFormat)
+        finally:
+            clam.common.data.CUSTOM_FORMATS = []
+        self.assertTrue(clam.common.data.getformatclass('PlainTextFormat') is clam.common.formats.PlainTextFormat)
+
+    def test3_provenance(self):
+        """Metadata cache - Files loaded from the cache do not share provenance data"""
+        clam.common.formats.PlainTextFormat(None, encoding='utf-8', language='nl').save(self.projectpath + 'input/.a.txt.METADATA')
+        os.makedirs(self.projectpath + 'output')
+        with io.open(self.projectpath + 'output/b.txt','w',encoding='utf-8') as f:
+            f.write("test")
+        inputfile = clam.common.data.CLAMInputFile(self.projectpath, 'a.txt')
+        provenance = clam.common.data.CLAMProvenanceData('test','Test','http://localhost','out','Output',[inputfile], timestamp=1)
+        clam.common.formats.PlainTextFormat(None, provenance=provenance, encoding='utf-8').save(self.projectpath + 'output/.b.txt.METADATA')
+        first = clam.common.data.CLAMOutputFile(self.projectpath, 'b.txt').metadata
+        second = clam.common.data.CLAMOutputFile(self.projectpath, 'b.txt').metadata
+        self.assertFalse(first.provenance is second.provenance)
+        first.provenance.outputtemplate_id = 'changed'
+        first.provenance.inputfiles[0][1]['language'] = 'fr'
+        first.provenance.xmlcache[0] = 'changed'
+        self.assertEqual(second.provenance.outputtemplate_id, 'out')
+        self.assertEqual(second.provenance.inputfiles[0][1]['language'], 'nl')
+        self.assertEqual(second.provenance.xmlcache, {})
+        self.assertEqual(clam.common.data.CLAMOutputFile(self.projectpath, 'b.txt').metadata.provenance.outputtemplate_id, 'out')
 
 if __name__ == '__main__':
     unittest.main()
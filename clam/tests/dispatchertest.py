@@ -0,0 +1,94 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Dispatcher tests --
+#       by Maarten van Gompel (proycon)
+#       http://ilk.uvt.nl/~mvgompel
+#       Induction for Linguistic Knowledge Research Group
+#       Universiteit van Tilburg
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+import unittest
+import sys
+import os
+import io
+import signal
+import shutil
+import tempfile
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/../../')
+os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
+
+import clam.clamdispatcher
+import clam.common.status
+
+CLAMXML = """<?xml version="1.0" encoding="UTF-8"?>
+<clam xmlns:xlink="http://www.w3.org/1999/xlink" version="2.1" id="dispatchertest" name="Dispatcher test" project="test" user="anonymous" baseurl="http://localhost">
+    <status code="1" message="" completion="0" />
+    <program matchedprofiles="0">
+%s
+    </program>
+</clam>
+"""
+
+OUTPUTFILE = """        <outputfile name="%s.upper" template="upper">
+            <inputfile name="%s" template="textinput" />
+        </outputfile>"""
+
+class PerFileTest(unittest.TestCase):
+    def setUp(self):
+        self.projectdir = tempfile.mkdtemp() + '/'
+        os.makedirs(self.projectdir + 'input')
+        os.makedirs(self.projectdir + 'output')
+        self.inputfiles = [ str(i) + '.txt' for i in range(4) ]
+        for inputfile in self.inputfiles:
+            with io.open(self.projectdir + 'input/' + inputfile,'w',encoding='utf-8') as f:
+                f.write("test " + inputfile)
+        with io.open(self.projectdir + 'clam.xml','w',encoding='utf-8') as f:
+            f.write(CLAMXML % "\n".join( OUTPUTFILE % (inputfile, inputfile) for inputfile in self.inputfiles ))
+        self.sigterm = signal.getsignal(signal.SIGTERM)
+
+    def tearDown(self):
+        signal.signal(signal.SIGTERM, self.sigterm) #perfile() installs its own handler
+        shutil.rmtree(self.projectdir)
+
+    def statuslog(self):
+        statuslog = clam.common.status.StatusLog()
+        statuslog.update(self.projectdir + '.status')
+        return [ (message, completion) for message, _, completion in statuslog.entries ]
+
+    def test1_silent(self):
+        """Dispatcher - Per-file tasks that write no status messages still advance the completion"""
+        exitcode = clam.clamdispatcher.perfile(['2', self.projectdir, 'tr a-z A-Z < "%INPUTFILE%" > "%OUTPUTFILE%"'])
+        self.assertEqual(exitcode, 0)
+        for inputfile in self.inputfiles:
+            with io.open(self.projectdir + 'output/' + inputfile + '.upper','r',encoding='utf-8') as f:
+                self.assertEqual(f.read(), "TEST " + inputfile.upper())
+        statuslog = self.statuslog()
+        self.assertEqual(statuslog[0], ("Running 4 tasks", 0))
+        self.assertEqual(sorted( message for message, _ in statuslog[1:-1] ), sorted( "[" + inputfile + ".upper] Done" for inputfile in self.inputfiles ))
+        completions = [ completion for _, completion in statuslog[1:-1] ]
+        self.assertEqual(completions, sorted(completions))
+        self.assertTrue(0 < completions[0] < 100)
+        self.assertEqual(completions[-1], 100)
+        self.assertEqual(statuslog[-1], ("Done", 100))
+
+    def test2_failure(self):
+        """Dispatcher - The exit code of a failing per-file task is passed on"""
+        exitcode = clam.clamdispatcher.perfile(['0', self.projectdir, 'if [ "%INPUTFILE%" = "' + self.projectdir + 'input/2.txt" ]; then exit 5; fi; echo "50%\tHalfway" > "%STATUSFILE%"; cp "%INPUTFILE%" "%OUTPUTFILE%"'])
+        self.assertEqual(exitcode, 5)
+        messages = [ message for message, _ in self.statuslog() ]
+        self.assertIn("[2.txt.upper] Failed with exit code 5", messages)
+        self.assertIn("[0.txt.upper] Halfway", messages)
+        self.assertIn("[0.txt.upper] Done", messages)
+        self.assertEqual(messages[-1], "1 of 4 tasks failed")
+        self.assertFalse(os.path.exists(self.projectdir + 'output/2.txt.upper'))
+        self.assertTrue(os.path.exists(self.projectdir + 'output/3.txt.upper'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Executor pool tests --
+#       by Maarten van Gompel (proycon)
+#       http://ilk.uvt.nl/~mvgompel
+#       Induction for Linguistic Knowledge Research Group
+#       Universiteit van Tilburg
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+import unittest
+import sys
+import os
+import threading
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/../../')
+os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
+
+import clam.common.executor
+
+def multiply(x, y):
+    return x * y
+
+class ExecutorPoolTest(unittest.TestCase):
+    def test1_process(self):
+        """Executor - Run a function in a process pool"""
+        pool = clam.common.executor.Pool('process', 2)
+        try:
+            self.assertEqual(pool.submit(multiply, (2,3)).result(10), 6)
+        finally:
+            pool.shutdown(True)
+
+    def test2_saturated(self):
+        """Executor - Refuse work when the pool is full, accept it again once a function is done"""
+        pool = clam.common.executor.Pool('thread', 1)
+        event = threading.Event()
+        try:
+            future = pool.submit(event.wait, (10,))
+            self.assertRaises(clam.common.executor.Saturated, pool.submit, multiply, (2,3))
+            released = threading.Event()
+            future.add_done_callback(lambda future: released.set()) #runs after the callback that releases the slot
+            event.set()
+            self.assertTrue(released.wait(10))
+            self.assertEqual(pool.submit(multiply, (2,3)).result(10), 6)
+        finally:
+            event.set()
+            pool.shutdown(True)
+
+    def test3_maxconcurrency(self):
+        """Executor - Limit the number of concurrent calls per key"""
+        pool = clam.common.executor.Pool('thread', 4)
+        event = threading.Event()
+        try:
+            pool.submit(event.wait, (10,), 'wait', 1)
+            self.assertRaises(clam.common.executor.Saturated, pool.submit, event.wait, (10,), 'wait', 1)
+            self.assertEqual(pool.submit(multiply, (2,3), 'multiply', 1).result(10), 6)
+        finally:
+            event.set()
+            pool.shutdown(True)
+
+if __name__ == '__main__':
+    unittest.main()
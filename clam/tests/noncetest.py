@@ -0,0 +1,79 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Nonce memory tests --
+#       by Maarten van Gompel (proycon)
+#       http://ilk.uvt.nl/~mvgompel
+#       Induction for Linguistic Knowledge Research Group
+#       Universiteit van Tilburg
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import time
+import flask
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/../../')
+os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
+
+import clam.common.auth
+
+app = flask.Flask(__name__)
+
+class NonceMemoryTest(object):
+    """Tests shared by all nonce memories"""
+    backend = None
+
+    def setUp(self):
+        self.sessiondir = tempfile.mkdtemp()
+        self.noncememory = clam.common.auth.getnoncememory(self.backend, self.sessiondir, 900)
+
+    def tearDown(self):
+        shutil.rmtree(self.sessiondir)
+
+    def test1_validate(self):
+        """Nonce memory - A new nonce is valid for the client it was given to"""
+        with app.test_request_context(environ_base={'REMOTE_ADDR': '127.0.0.1'}):
+            nonce = self.noncememory.getnew(opaque='x')
+            self.assertTrue(self.noncememory.validate(nonce))
+            self.assertEqual(self.noncememory.get(nonce)[:2], ('x', '127.0.0.1'))
+        with app.test_request_context(environ_base={'REMOTE_ADDR': '127.0.0.2'}):
+            self.assertFalse(self.noncememory.validate(nonce))
+            self.assertRaises(KeyError, self.noncememory.get, nonce)
+
+    def test2_expire(self):
+        """Nonce memory - An expired nonce is invalid"""
+        with app.test_request_context(environ_base={'REMOTE_ADDR': '127.0.0.1'}):
+            nonce = self.noncememory.getnew(-1)
+            self.assertFalse(self.noncememory.validate(nonce))
+            self.assertFalse(self.noncememory.validate('nonexistant'))
+
+class SQLiteNonceMemoryTest(NonceMemoryTest, unittest.TestCase):
+    backend = 'sqlite'
+
+class DictNonceMemoryTest(NonceMemoryTest, unittest.TestCase):
+    backend = 'memory'
+
+    def test3_wheel(self):
+        """Nonce memory - Expired nonces are dropped from memory"""
+        self.noncememory = clam.common.auth.DictNonceMemory(900, granularity=0.01)
+        with app.test_request_context(environ_base={'REMOTE_ADDR': '127.0.0.1'}):
+            nonce = self.noncememory.getnew(0.01)
+            time.sleep(0.05)
+            self.assertRaises(KeyError, self.noncememory.get, nonce)
+            self.assertEqual(self.noncememory.nonces, {})
+            self.assertEqual(self.noncememory.wheel, {})
+
+class FileNonceMemoryTest(NonceMemoryTest, unittest.TestCase):
+    backend = 'files'
+
+if __name__ == '__main__':
+    unittest.main()
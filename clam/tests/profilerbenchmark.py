@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Profiler benchmark --
+#       by Maarten van Gompel (proycon)
+#       http://ilk.uvt.nl/~mvgompel
+#       Induction for Linguistic Knowledge Research Group
+#       Universiteit van Tilburg
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+#Measures how the time the profiler needs to start a project (i.e. to generate
+#the metadata of all output files) scales with the number of input files.
+#Usage: python profilerbenchmark.py [--sqlite] [inputcount ...]
+#(--sqlite writes the output metadata to a single store, as OUTPUTMETADATA = 'sqlite' does)
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import sys
+import os
+import io
+import time
+import shutil
+import tempfile
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/../../')
+os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
+
+from clam.common.data import Profile, InputTemplate, OutputTemplate, ParameterCondition, SetMetaField, CopyMetaField, ParameterMetaField, InputManifest, CLAMInputFile, profiler #pylint: disable=wrong-import-position
+from clam.common.parameters import StaticParameter, ChoiceParameter, BooleanParameter #pylint: disable=wrong-import-position
+from clam.common.formats import PlainTextFormat #pylint: disable=wrong-import-position
+
+PARAMETERS = [ BooleanParameter(id='lowercase',name='Lowercase',description='Lowercase the output', value=True) ]
+
+PROFILES = [
+    Profile(
+        InputTemplate('textinput', PlainTextFormat,"Input text document",
+            StaticParameter(id='encoding',name='Encoding',description='The character encoding of the file', value='utf-8'),
+            ChoiceParameter(id='language',name='Language',description='The language the text is in', choices=[('en','English'),('nl','Dutch')]),
+            extension='.txt',
+            multi=True,
+        ),
+        OutputTemplate('statsbydoc',PlainTextFormat,'Document Statistics',
+            SetMetaField('encoding','ascii'),
+            ParameterCondition(lowercase=True,
+                then=ParameterMetaField('lowercase','lowercase'),
+            ),
+            extension='.stats',
+            multi=True
+        ),
+        OutputTemplate('freqlistbydoc', PlainTextFormat,'Document Frequency list ',
+            CopyMetaField('language','textinput.language'),
+            CopyMetaField('encoding','textinput.encoding'),
+            extension='.freqlist',
+            multi=True
+        ),
+        ParameterCondition(lowercase=True,
+            then=OutputTemplate('lowercased', PlainTextFormat, 'Lowercased text',
+                copymetadata=True,
+                extension='.lower.txt',
+                multi=True
+            ),
+        ),
+        OutputTemplate('overallstats', PlainTextFormat, 'Overall Statistics',
+            SetMetaField('encoding','ascii'),
+            filename='overall.stats',
+            unique=True
+        ),
+    )
+]
+
+def createproject(inputcount):
+    projectpath = tempfile.mkdtemp() + '/'
+    os.makedirs(projectpath + 'input')
+    os.makedirs(projectpath + 'output')
+    for i in range(1, inputcount+1):
+        filename = 'doc' + str(i) + '.txt'
+        with io.open(projectpath + 'input/' + filename, 'w', encoding='utf-8') as f:
+            f.write("Dit is een test.\n")
+        PlainTextFormat(None, encoding='utf-8', language='nl').save(projectpath + 'input/' + CLAMInputFile(projectpath, filename, False).metafilename())
+        InputManifest.add(projectpath, 'textinput', i, filename)
+    return projectpath
+
+def benchmark(inputcount, outputmetadata='files'):
+    projectpath = createproject(inputcount)
+    try:
+        begintime = time.time()
+        matched, program = profiler(PROFILES, projectpath, PARAMETERS, 'benchmark', 'Benchmark', 'http://localhost', None, outputmetadata)
+        duration = time.time() - begintime
+        assert matched and len(program) == 3 * inputcount + 1
+    finally:
+        shutil.rmtree(projectpath)
+    return duration
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    outputmetadata = 'files'
+    if args and args[0] == '--sqlite':
+        outputmetadata = 'sqlite'
+        args = args[1:]
+    inputcounts = [ int(x) for x in args ] if args else [10, 100, 1000]
+    print("%10s %12s %16s" % ("inputfiles", "seconds", "ms per inputfile"))
+    for inputcount in inputcounts:
+        duration = benchmark(inputcount, outputmetadata)
+        print("%10d %12.3f %16.3f" % (inputcount, duration, duration / inputcount * 1000))
@@ -22,6 +22,8 @@ import time
 import unittest
 import io
 import zipfile
+import json
+import requests
 
 #We may need to do some path magic in order to find the clam.* imports
 
@@ -55,6 +57,11 @@ class BasicServiceTest(unittest.TestCase):
         success = self.client.create('basicservicetest')
         self.assertTrue(success)
 
+    def test2_1b_create(self):
+        """Basic Service Test - Reserved project name"""
+        r = requests.put(self.url + '/run/')
+        self.assertEqual(r.status_code, 403)
+
     def test2_2_create(self):
         """Basic Service Test - Project availability in index"""
         data = self.client.index()
@@ -217,6 +224,72 @@ class ExtensiveServiceTest(unittest.TestCase):
         self.client.downloadarchive(self.project,'/tmp/target.zip','zip')
         self.assertEqual(zipfile.ZipFile('/tmp/target.zip').testzip(), None) #testing zip file integrity
 
+    def test1c_rangedownload(self):
+        """Extensive Service Test - Download input file with range and conditional requests"""
+        data = self.client.get(self.project)
+        success = self.client.addinputfile(self.project, data.inputtemplate('textinput'),'/tmp/servicetest.txt', language='fr')
+        self.assertTrue(success)
+        r = requests.get(self.url + '/' + self.project + '/input/servicetest.txt')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.content, "On espère que tout ça marche bien.".encode('utf-8'))
+        self.assertEqual(int(r.headers['Content-Length']), len(r.content))
+        r2 = requests.get(self.url + '/' + self.project + '/input/servicetest.txt', headers={'If-None-Match': r.headers['ETag']})
+        self.assertEqual(r2.status_code, 304)
+        r3 = requests.get(self.url + '/' + self.project + '/input/servicetest.txt', headers={'Range': 'bytes=3-8'})
+        self.assertEqual(r3.status_code, 206)
+        self.assertEqual(r3.content, r.content[3:9])
+
+    def test1d_run(self):
+        """Extensive Service Test - Run in a single request"""
+        filename = self.client.run([('textinput','/tmp/servicetest.txt')], '/tmp/target.zip', textinput_language='fr')
+        self.assertEqual(filename, 'output.zip')
+        names = zipfile.ZipFile('/tmp/target.zip').namelist()
+        self.assertTrue('servicetest.txt.freqlist' in names)
+        self.assertTrue('servicetest.txt.stats' in names)
+
+    def test1e_wait(self):
+        """Extensive Service Test - Wait for a run to finish without polling"""
+        data = self.client.get(self.project)
+        success = self.client.addinputfile(self.project, data.inputtemplate('textinput'),'/tmp/servicetest.txt', language='fr')
+        self.assertTrue(success)
+        self.client.start(self.project)
+        updates = []
+        data = self.client.wait(self.project, timeout=60, callback=updates.append)
+        self.assertEqual(data.status, clam.common.status.DONE)
+        self.assertTrue(updates)
+        self.assertEqual(updates[-1]['statuscode'], clam.common.status.DONE)
+        r = requests.get(self.url + '/' + self.project + '/status/stream', params={'wait': 0})
+        self.assertEqual(r.status_code, 200)
+        statuslog = r.json()['statuslog']
+        self.assertTrue(statuslog)
+        self.assertEqual(sum( len(update['statuslog']) for update in updates ), len(statuslog))
+        self.assertEqual(sorted( entry[0] for update in updates for entry in update['statuslog'] ), sorted( entry[0] for entry in statuslog ))
+
+    def test1f_statusstream(self):
+        """Extensive Service Test - Status updates as Server-Sent Events"""
+        data = self.client.get(self.project)
+        success = self.client.addinputfile(self.project, data.inputtemplate('textinput'),'/tmp/servicetest.txt', language='fr')
+        self.assertTrue(success)
+        self.client.start(self.project)
+        r = requests.get(self.url + '/' + self.project + '/status/stream', stream=True, timeout=60)
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.headers['Content-Type'].startswith('text/event-stream'))
+        event = {}
+        for line in r.iter_lines(decode_unicode=True):
+            if not line:
+                if event: break #end of the first event
+                continue
+            if line[0] != ':': #not a comment (keepalive)
+                key, value = line.split(': ',1)
+                event[key] = value
+        r.close()
+        self.assertEqual(event['event'], 'status')
+        update = json.loads(event['data'])
+        self.assertIn(update['statuscode'], (clam.common.status.QUEUED, clam.common.status.RUNNING, clam.common.status.DONE))
+        self.assertEqual(int(event['id']), update['offset'])
+        self.assertEqual(len(update['statuslog']), update['offset'])
+        self.client.wait(self.project, timeout=60)
+
     def test2_parametererror(self):
         """Extensive Service Test - Global parameter error"""
         data = self.client.get(self.project)
@@ -279,9 +352,38 @@ class ExtensiveServiceTest(unittest.TestCase):
                 self.assertEqual(len(inputfiles), 1)
                 self.assertEqual(inputfiles[0][1], 'textinput')
 
-
-
-
+    def test5_filelisting(self):
+        """Extensive Service Test - Paginated file listings"""
+        data = self.client.get(self.project)
+        success = self.client.addinputfile(self.project, data.inputtemplate('textinput'),'/tmp/servicetest.txt', language='fr')
+        self.assertTrue(success)
+        data = self.client.start(self.project)
+        self.assertTrue(data)
+        while data.status != clam.common.status.DONE:
+            time.sleep(1) #wait 1 second before polling status
+            data = self.client.get(self.project) #get status again
+        outputfiles = sorted( x.filename for x in data.output )
+        self.assertTrue(len(outputfiles) > 2)
+        data = self.client.get(self.project, pagesize=2)
+        self.assertTrue(isinstance(data.output, clam.common.data.FileListing))
+        self.assertEqual(len(data.output), len(outputfiles))
+        self.assertEqual([ x.filename for x in data.output ], outputfiles) #fetches the other pages
+        self.assertEqual(len(data.input), 1)
+        data = self.client.get(self.project, files='none')
+        self.assertEqual(len(data.input), 0)
+        self.assertEqual(len(data.output), 0)
+        listing = self.client.files(self.project, 'output', 1, 1)
+        self.assertNotIn('input', listing)
+        self.assertEqual(listing['output']['count'], len(outputfiles))
+        self.assertEqual([ x['name'] for x in listing['output']['files'] ], outputfiles[1:2])
+        listing = self.client.files(self.project, template='statsbydoc')
+        self.assertEqual([ x['name'] for x in listing['output']['files'] ], ['servicetest.txt.stats'])
+        self.assertEqual(listing['input']['count'], 0)
+        listing = self.client.files(self.project, 'input', template='textinput', since=1)
+        self.assertEqual(listing['input']['files'][0]['name'], 'servicetest.txt')
+        self.assertEqual(listing['input']['files'][0]['template'], 'textinput')
+        listing = self.client.files(self.project, since=time.time() + 3600)
+        self.assertEqual(listing['input']['count'] + listing['output']['count'], 0)
 
     def tearDown(self):
         self.client.delete(self.project)
@@ -0,0 +1,142 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Project state tests --
+#       by Maarten van Gompel (proycon)
+#       http://ilk.uvt.nl/~mvgompel
+#       Induction for Linguistic Knowledge Research Group
+#       Universiteit van Tilburg
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/../../')
+os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
+
+import clam.common.state
+import clam.common.status
+
+class SQLiteProjectStateTest(unittest.TestCase):
+    def setUp(self):
+        self.projectsdir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.projectsdir, 'anonymous', 'test'))
+        self.store = clam.common.state.getbackend('sqlite', self.projectsdir)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.projectsdir)
+
+    def test1_lifecycle(self):
+        """SQLite project state - Life cycle of a project"""
+        self.store.create('anonymous','test')
+        self.assertEqual(self.store.get('anonymous','test')['status'], clam.common.status.READY)
+        self.store.started('anonymous','test', os.getpid())
+        state = self.store.lookup('anonymous','test')
+        self.assertEqual(state['status'], clam.common.status.RUNNING)
+        self.assertEqual(state['pid'], os.getpid())
+        self.store.finished('anonymous','test', 3, True)
+        state = self.store.get('anonymous','test')
+        self.assertEqual(state['status'], clam.common.status.DONE)
+        self.assertEqual(state['exitcode'], 3)
+        self.assertTrue(state['aborted'])
+        self.store.reset('anonymous','test')
+        self.assertEqual(self.store.get('anonymous','test')['status'], clam.common.status.READY)
+        shutil.rmtree(os.path.join(self.projectsdir, 'anonymous', 'test'))
+        self.store.delete('anonymous','test')
+        self.assertEqual(self.store.getall('anonymous'), [])
+
+    def test2_lostprocess(self):
+        """SQLite project state - Process that ended without reporting back"""
+        self.store.started('anonymous','test', 2**22 + 1) #beyond the default pid_max, can not exist
+        with open(os.path.join(self.projectsdir, 'anonymous', 'test', '.done'),'w') as f:
+            f.write("5")
+        state = self.store.lookup('anonymous','test')
+        self.assertEqual(state['status'], clam.common.status.DONE)
+        self.assertEqual(state['exitcode'], 5)
+
+    def test3_migration(self):
+        """SQLite project state - Projects from before the state store are picked up from their files"""
+        with open(os.path.join(self.projectsdir, 'anonymous', 'test', '.done'),'w') as f:
+            f.write("0")
+        state = self.store.get('anonymous','test')
+        self.assertEqual(state['status'], clam.common.status.DONE)
+        self.assertEqual(len(self.store.getall('anonymous')), 1)
+
+    def test4_index(self):
+        """SQLite project state - Index of all projects of a user, kept up to date per project"""
+        os.makedirs(os.path.join(self.projectsdir, 'anonymous', 'test2'))
+        self.store.create('anonymous','test3')
+        self.assertEqual([ state['project'] for state in self.store.getall('anonymous') ], ['test','test2','test3'])
+
+    def test5_diskusage(self):
+        """SQLite project state - Disk usage is accounted incrementally and reconciled with what is on disk"""
+        with open(os.path.join(self.projectsdir, 'anonymous', 'test', 'file'),'wb') as f:
+            f.write(b"x" * 1024 * 1024)
+        self.assertAlmostEqual(self.store.totaldiskusage('anonymous'), 1.0)
+        self.store.adddiskusage('anonymous','test', 0.5)
+        self.assertAlmostEqual(self.store.get('anonymous','test')['diskusage'], 1.5)
+        self.assertEqual(self.store.reconcile(3600), 0) #measured recently
+        self.assertEqual(self.store.reconcile(-1), 1)
+        self.assertAlmostEqual(self.store.get('anonymous','test')['diskusage'], 1.0)
+        shutil.rmtree(os.path.join(self.projectsdir, 'anonymous', 'test'))
+        self.store.reconcile(-1)
+        self.assertEqual(self.store.getall('anonymous'), [])
+
+    def test6_deleted(self):
+        """SQLite project state - A late report about a deleted project does not bring it back"""
+        self.store.create('anonymous','test')
+        self.store.started('anonymous','test', os.getpid())
+        shutil.rmtree(os.path.join(self.projectsdir, 'anonymous', 'test'))
+        self.store.delete('anonymous','test')
+        self.store.finished('anonymous','test', 2)
+        self.store.queued('anonymous','test')
+        self.assertEqual(self.store.getall('anonymous'), [])
+        self.assertEqual(self.store.get('anonymous','test'), None)
+
+class StatusLogTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.statusfile = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.unlink(self.statusfile)
+
+    def test1_incremental(self):
+        """Status log - Appended lines are picked up, duplicates and incomplete lines are skipped"""
+        clam.common.status.write(self.statusfile, "Starting", 0)
+        clam.common.status.write(self.statusfile, "Starting", 0)
+        statuslog, completion = clam.common.status.read(self.statusfile)
+        self.assertEqual(len(statuslog), 1)
+        clam.common.status.write(self.statusfile, "Processing", 50)
+        with open(self.statusfile,'a') as f:
+            f.write("75%\tHalf a li")
+        statuslog, completion = clam.common.status.read(self.statusfile)
+        self.assertEqual([ entry[0] for entry in statuslog ], ["Processing","Starting"])
+        self.assertEqual(completion, 50)
+        with open(self.statusfile,'a') as f:
+            f.write("ne\n")
+        statuslog, completion = clam.common.status.read(self.statusfile, 2)
+        self.assertEqual([ entry[0] for entry in statuslog ], ["Half a line","Processing"])
+        self.assertEqual(completion, 75)
+
+    def test2_truncated(self):
+        """Status log - A status file that was truncated is parsed again from the start"""
+        clam.common.status.write(self.statusfile, "First run", 100)
+        clam.common.status.read(self.statusfile)
+        open(self.statusfile,'w').close()
+        clam.common.status.write(self.statusfile, "Again", 10)
+        statuslog, completion = clam.common.status.read(self.statusfile)
+        self.assertEqual([ entry[0] for entry in statuslog ], ["Again"])
+        self.assertEqual(completion, 10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,296 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Supervisor and warm worker tests --
+#       by Maarten van Gompel (proycon)
+#       http://ilk.uvt.nl/~mvgompel
+#       Induction for Linguistic Knowledge Research Group
+#       Universiteit van Tilburg
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+import unittest
+import sys
+import os
+import io
+import time
+import shutil
+import glob
+import tempfile
+import subprocess
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/../../')
+os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
+
+import clam.clamsupervisor
+
+TESTDIR = os.path.dirname(os.path.abspath(__file__))
+
+CLAMXML = """<?xml version="1.0" encoding="UTF-8"?>
+<clam xmlns:xlink="http://www.w3.org/1999/xlink" version="2.1" id="supervisortest" name="Supervisor test" project="%s" user="anonymous" baseurl="http://localhost">
+    <status code="0" message="" completion="0" />
+</clam>
+"""
+
+def workerjob(clamdata, statusfile, outputdir): #pylint: disable=unused-argument
+    """The WORKER_FUNCTION of the tests: records the pid of the worker, and sleeps for as long as the input asks it to"""
+    with io.open(outputdir + 'worker.pid','w',encoding='utf-8') as f:
+        f.write(str(os.getpid()))
+    if os.path.exists('input/sleep'):
+        time.sleep(30)
+    return 0
+
+WAITFORRELEASE = 'while [ -d input ] && [ ! -e release ]; do sleep 0.1; done' #command of a job that runs until the test creates a release file in its project directory (or removes the project)
+
+class SupervisorTestCase(unittest.TestCase):
+    """Starts a supervisor (with the options in self.args) for every test, and provides helpers to submit jobs to it"""
+    args = []
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.socketpath = os.path.join(self.tmpdir, 'supervisor.sock')
+        self.log = io.open(os.path.join(self.tmpdir, 'supervisor.log'),'wb')
+        self.projectdirs = []
+        self.startsupervisor()
+        self.worker = {'function': 'supervisortest.workerjob', 'pythonpath': [TESTDIR], 'size': 1, 'maxjobs': 2}
+
+    def startsupervisor(self):
+        self.supervisor = subprocess.Popen([sys.executable, os.path.join(TESTDIR, '..', 'clamsupervisor.py'), '--socket', self.socketpath] + self.args, stderr=self.log)
+        for _ in range(50):
+            if os.path.exists(self.socketpath):
+                break
+            time.sleep(0.1)
+
+    def stopsupervisor(self):
+        self.supervisor.terminate()
+        self.supervisor.wait()
+
+    def createproject(self, name, sleep=False, user='anonymous'):
+        projectdir = os.path.join(self.tmpdir, 'projects', user, name) + '/'
+        os.makedirs(projectdir + 'input')
+        os.makedirs(projectdir + 'output')
+        with io.open(projectdir + 'clam.xml','w',encoding='utf-8') as f:
+            f.write(CLAMXML % name)
+        if sleep:
+            open(projectdir + 'input/sleep','w').close()
+        self.projectdirs.append(projectdir)
+        return projectdir
+
+    def submit(self, name, cmd, user='anonymous', **kwargs):
+        """Submits a command job, returns the project directory and the reply of the supervisor"""
+        projectdir = self.createproject(name, user=user)
+        reply = clam.clamsupervisor.submit(self.socketpath, projectdir, cmd, dict(os.environ), **kwargs)
+        self.assertTrue(reply['success'])
+        return projectdir, reply
+
+    def release(self, projectdir):
+        open(projectdir + 'release','w').close()
+
+    def waitfor(self, filename, timeout=20):
+        endtime = time.time() + timeout
+        while not os.path.exists(filename):
+            self.assertTrue(time.time() < endtime, "Timed out waiting for " + filename)
+            time.sleep(0.1)
+
+    def waitdone(self, projectdir, timeout=20):
+        self.waitfor(projectdir + '.done', timeout)
+        time.sleep(0.1) #.done is written before .pid is removed
+        with open(projectdir + '.done') as f:
+            return int(f.read())
+
+    def readpid(self, projectdir):
+        with open(projectdir + '.pid') as f:
+            return int(f.read())
+
+    def status(self):
+        reply = clam.clamsupervisor.request(self.socketpath, {'action': 'status'})
+        self.assertTrue(reply['success'])
+        return reply
+
+    def tearDown(self):
+        for projectdir in self.projectdirs:
+            if os.path.isdir(projectdir):
+                self.release(projectdir) #so no job outlives the test
+        self.stopsupervisor()
+        self.log.close()
+        shutil.rmtree(self.tmpdir)
+
+
+class SupervisorCommandTest(SupervisorTestCase):
+    def test1_exitcode(self):
+        """Supervisor - Run a command job, its exit code ends up in .done"""
+        projectdir, reply = self.submit('exitcode', WAITFORRELEASE + '; exit 4')
+        self.waitfor(projectdir + '.pid')
+        self.assertEqual(self.readpid(projectdir), reply['pid'])
+        self.assertEqual([ job['pid'] for job in self.status()['jobs'] ], [reply['pid']])
+        self.release(projectdir)
+        self.assertEqual(self.waitdone(projectdir), 4)
+        self.assertFalse(os.path.exists(projectdir + '.pid'))
+        self.assertFalse(os.path.exists(projectdir + '.aborted'))
+        self.assertEqual(self.status()['jobs'], []) #reaped
+        self.assertRaises(OSError, os.kill, reply['pid'], 0)
+
+    def test2_abort(self):
+        """Supervisor - Abort a running command job"""
+        projectdir, reply = self.submit('abort', 'sleep 30')
+        begintime = time.time()
+        self.assertTrue(clam.clamsupervisor.abort(self.socketpath, projectdir))
+        self.assertEqual(self.waitdone(projectdir), 0)
+        self.assertTrue(time.time() - begintime < 10)
+        self.assertTrue(os.path.exists(projectdir + '.aborted'))
+        self.assertFalse(os.path.exists(projectdir + '.pid'))
+        self.assertRaises(OSError, os.kill, reply['pid'], 0)
+        self.assertFalse(clam.clamsupervisor.abort(self.socketpath, projectdir)) #no longer known
+
+    def test3_maxtime(self):
+        """Supervisor - A command job that exceeds its maximum time is aborted with exit code 3"""
+        projectdir, _ = self.submit('maxtime', 'sleep 30', maxtime=1)
+        begintime = time.time()
+        self.assertEqual(self.waitdone(projectdir), 3)
+        self.assertTrue(time.time() - begintime < 10)
+        self.assertTrue(os.path.exists(projectdir + '.aborted'))
+
+
+class SupervisorQueueTest(SupervisorTestCase):
+    args = ['--maxjobs', '2', '--maxjobsperuser', '1', '--maxqueue', '2', '--scheduler', 'fairshare']
+
+    def assertQueued(self, projectdir, reply):
+        self.assertTrue(reply['queued'])
+        self.assertTrue(os.path.exists(projectdir + '.queued'))
+        self.assertFalse(os.path.exists(projectdir + '.pid'))
+        self.assertIn(projectdir, self.status()['queue'])
+
+    def assertStarted(self, projectdir):
+        self.waitfor(projectdir + '.pid', 5)
+        self.assertFalse(os.path.exists(projectdir + '.queued'))
+        self.assertNotIn(projectdir, self.status()['queue'])
+
+    def test1_peruser(self):
+        """Supervisor queue - Jobs beyond the per-user cap are queued"""
+        alice1, reply = self.submit('alice1', WAITFORRELEASE, user='alice')
+        self.assertIn('pid', reply)
+        alice2, reply = self.submit('alice2', WAITFORRELEASE, user='alice')
+        self.assertQueued(alice2, reply)
+        self.assertEqual(reply['position'], 1)
+        bob1, reply = self.submit('bob1', WAITFORRELEASE, user='bob')
+        self.assertIn('pid', reply) #another user may still start
+        self.assertEqual(len(self.status()['jobs']), 2)
+        self.release(alice1)
+        self.assertEqual(self.waitdone(alice1), 0)
+        self.assertStarted(alice2)
+
+    def test2_maxjobs(self):
+        """Supervisor queue - Jobs beyond the global cap are queued, and refused once the queue is full"""
+        self.submit('alice1', WAITFORRELEASE, user='alice')
+        self.submit('bob1', WAITFORRELEASE, user='bob')
+        carol1, reply = self.submit('carol1', WAITFORRELEASE, user='carol')
+        self.assertQueued(carol1, reply)
+        dave1, reply = self.submit('dave1', WAITFORRELEASE, user='dave')
+        self.assertQueued(dave1, reply)
+        self.assertEqual(reply['position'], 2)
+        projectdir = self.createproject('erin1', user='erin')
+        self.assertRaises(clam.clamsupervisor.SupervisorError, clam.clamsupervisor.submit, self.socketpath, projectdir, WAITFORRELEASE, dict(os.environ))
+        self.assertFalse(os.path.exists(projectdir + '.queued'))
+        self.assertEqual(self.status()['queue'], [carol1, dave1])
+
+    def test3_fairshare(self):
+        """Supervisor queue - Users without running jobs go first"""
+        self.args = ['--maxjobs', '2', '--scheduler', 'fairshare']
+        self.stopsupervisor()
+        self.startsupervisor()
+        self.submit('alice1', WAITFORRELEASE, user='alice')
+        bob1, _ = self.submit('bob1', WAITFORRELEASE, user='bob')
+        alice2, reply = self.submit('alice2', WAITFORRELEASE, user='alice')
+        self.assertQueued(alice2, reply)
+        bob2, reply = self.submit('bob2', WAITFORRELEASE, user='bob')
+        self.assertQueued(bob2, reply)
+        self.release(bob1)
+        self.assertEqual(self.waitdone(bob1), 0)
+        self.assertStarted(bob2) #alice still has a job running, so bob goes first even though alice submitted earlier
+        self.assertQueued(alice2, {'queued': True})
+
+    def test4_abortqueued(self):
+        """Supervisor queue - Abort a queued job"""
+        self.submit('alice1', WAITFORRELEASE, user='alice')
+        alice2, reply = self.submit('alice2', WAITFORRELEASE, user='alice')
+        self.assertQueued(alice2, reply)
+        self.assertEqual(len(glob.glob(self.socketpath + '.queue/*.job')), 1)
+        self.assertTrue(clam.clamsupervisor.abort(self.socketpath, alice2))
+        self.assertEqual(self.waitdone(alice2), 0)
+        self.assertTrue(os.path.exists(alice2 + '.aborted'))
+        self.assertFalse(os.path.exists(alice2 + '.queued'))
+        self.assertFalse(os.path.exists(alice2 + '.pid'))
+        self.assertEqual(self.status()['queue'], [])
+        self.assertEqual(glob.glob(self.socketpath + '.queue/*.job'), [])
+
+    def test5_restart(self):
+        """Supervisor queue - Queued jobs are resumed after a restart"""
+        alice1, _ = self.submit('alice1', WAITFORRELEASE, user='alice')
+        alice2, reply = self.submit('alice2', WAITFORRELEASE, user='alice')
+        self.assertQueued(alice2, reply)
+        self.stopsupervisor()
+        self.assertTrue(os.path.exists(alice2 + '.queued'))
+        self.assertEqual(len(glob.glob(self.socketpath + '.queue/*.job')), 1)
+        self.release(alice1) #ends unsupervised
+        self.startsupervisor()
+        self.assertStarted(alice2) #the jobs of the earlier run are not counted, so it starts right away
+        self.assertEqual(glob.glob(self.socketpath + '.queue/*.job'), [])
+        self.release(alice2)
+        self.assertEqual(self.waitdone(alice2), 0)
+
+
+class SupervisorWorkerTest(SupervisorTestCase):
+    def run_job(self, name, sleep=False):
+        """Submits a job with a worker specification (its fallback command does nothing), returns the project directory and the pid the supervisor reported"""
+        projectdir = self.createproject(name, sleep)
+        reply = clam.clamsupervisor.submit(self.socketpath, projectdir, 'true', dict(os.environ), worker=self.worker)
+        self.assertTrue(reply['success'])
+        return projectdir, reply['pid']
+
+    def workerpid(self, projectdir):
+        with open(projectdir + 'output/worker.pid') as f:
+            return int(f.read())
+
+    def test1_worker(self):
+        """Supervisor - Run a job in a warm worker"""
+        projectdir, pid = self.run_job('job1')
+        self.assertEqual(self.waitdone(projectdir), 0)
+        self.assertEqual(self.workerpid(projectdir), pid) #ran in-process in the worker, not by the command
+        self.assertNotEqual(pid, self.supervisor.pid)
+
+    def test2_recycle(self):
+        """Supervisor - Recycle workers after their maximum number of jobs"""
+        pids = []
+        for i in range(3):
+            projectdir, pid = self.run_job('job' + str(i))
+            self.assertEqual(self.waitdone(projectdir), 0)
+            pids.append(self.workerpid(projectdir))
+            self.assertEqual(pids[-1], pid)
+            time.sleep(1.5) #give the supervisor a chance to replace the exited worker
+        self.assertEqual(pids[0], pids[1])
+        self.assertNotEqual(pids[1], pids[2])
+
+    def test3_abort(self):
+        """Supervisor - Abort a job that runs in a worker"""
+        projectdir, pid = self.run_job('sleeper', sleep=True)
+        for _ in range(50):
+            if os.path.exists(projectdir + 'output/worker.pid'):
+                break
+            time.sleep(0.1)
+        self.assertEqual(self.workerpid(projectdir), pid)
+        begintime = time.time()
+        self.assertTrue(clam.clamsupervisor.abort(self.socketpath, projectdir))
+        self.waitdone(projectdir)
+        self.assertTrue(time.time() - begintime < 10)
+        self.assertTrue(os.path.exists(projectdir + '.aborted'))
+        #the next job is not handed to the killed worker
+        projectdir, pid2 = self.run_job('afterabort')
+        self.assertEqual(self.waitdone(projectdir), 0)
+        self.assertNotEqual(pid2, pid)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -59,6 +59,55 @@ if [ $? -ne 0 ]; then
    GOOD=0
 fi
 
+echo "Running dispatcher tests:" >&2
+python dispatchertest.py
+if [ $? -ne 0 ]; then
+   echo "ERROR: Dispatcher test failed!!" >&2
+   GOOD=0
+fi
+
+echo "Running project state tests:" >&2
+python statetest.py
+if [ $? -ne 0 ]; then
+   echo "ERROR: Project state test failed!!" >&2
+   GOOD=0
+fi
+
+echo "Running streaming archive tests:" >&2
+python archivetest.py
+if [ $? -ne 0 ]; then
+   echo "ERROR: Streaming archive test failed!!" >&2
+   GOOD=0
+fi
+
+echo "Running executor pool tests:" >&2
+python executortest.py
+if [ $? -ne 0 ]; then
+   echo "ERROR: Executor pool test failed!!" >&2
+   GOOD=0
+fi
+
+echo "Running nonce memory tests:" >&2
+python noncetest.py
+if [ $? -ne 0 ]; then
+   echo "ERROR: Nonce memory test failed!!" >&2
+   GOOD=0
+fi
+
+echo "Running MySQL user database tests:" >&2
+python userdbtest.py
+if [ $? -ne 0 ]; then
+   echo "ERROR: MySQL user database test failed!!" >&2
+   GOOD=0
+fi
+
+echo "Running supervisor and worker tests:" >&2
+python supervisortest.py
+if [ $? -ne 0 ]; then
+   echo "ERROR: Supervisor test failed!!" >&2
+   GOOD=0
+fi
+
 echo "Stopping all running clam services" >&2
 kill $(ps aux | grep 'clamservice' | awk '{print $2}') 2>/dev/null
 sleep 2
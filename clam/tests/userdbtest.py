@@ -0,0 +1,128 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- MySQL user database tests --
+#       by Maarten van Gompel (proycon)
+#       http://ilk.uvt.nl/~mvgompel
+#       Induction for Linguistic Knowledge Research Group
+#       Universiteit van Tilburg
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+import unittest
+import sys
+import os
+import types
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/../../')
+os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
+
+import clam.clamservice
+
+PASSWORDS = {'alice': 'hash-alice', 'bob': 'hash-bob'}
+
+class StubConnection(object):
+    """Stands in for a MySQLdb connection, counts its queries and can be made to fail"""
+
+    def __init__(self):
+        self.queries = 0
+        self.closed = False
+        self.broken = False
+
+    def cursor(self):
+        return StubCursor(self)
+
+    def ping(self):
+        if self.broken:
+            raise StubMySQLdb.Error("Connection lost")
+
+    def close(self):
+        self.closed = True
+
+class StubCursor(object):
+    def __init__(self, connection):
+        self.connection = connection
+        self.row = None
+
+    def execute(self, sql, args):
+        if self.connection.broken:
+            raise StubMySQLdb.Error("Connection lost")
+        self.connection.queries += 1
+        if args[0] in PASSWORDS:
+            self.row = (PASSWORDS[args[0]],)
+
+    def fetchone(self):
+        return self.row
+
+    def close(self):
+        pass
+
+StubMySQLdb = types.ModuleType('MySQLdb')
+StubMySQLdb.Error = type('Error', (Exception,), {})
+StubMySQLdb.connections = []
+
+def stubconnect(**kwargs): #pylint: disable=unused-argument
+    connection = StubConnection()
+    StubMySQLdb.connections.append(connection)
+    return connection
+
+StubMySQLdb.connect = stubconnect
+
+class MySQLUserDBTest(unittest.TestCase):
+    def setUp(self):
+        self.mysqldb = getattr(clam.clamservice, 'MySQLdb', None)
+        self.usersmysql = getattr(clam.clamservice.settings, 'USERS_MYSQL', None)
+        clam.clamservice.MySQLdb = StubMySQLdb
+        StubMySQLdb.connections = []
+        clam.clamservice.settings.USERS_MYSQL = {'poolsize': 2, 'cachettl': 60, 'negativecachettl': 60}
+        self.userdb = clam.clamservice.MySQLUserDB('localhost', 3306, 'clam', 'secret', 'clam', 'users', 'username', 'password', None, None)
+
+    def tearDown(self):
+        if self.mysqldb is None:
+            del clam.clamservice.MySQLdb
+        else:
+            clam.clamservice.MySQLdb = self.mysqldb
+        clam.clamservice.settings.USERS_MYSQL = self.usersmysql
+
+    def queries(self):
+        return sum( connection.queries for connection in StubMySQLdb.connections )
+
+    def test1_cache(self):
+        """MySQL user database - One query per user while the password is cached"""
+        self.assertEqual(self.userdb.lookup('alice'), 'hash-alice')
+        self.assertEqual(self.userdb.lookup('alice'), 'hash-alice')
+        self.assertEqual(self.queries(), 1)
+
+    def test2_unknown(self):
+        """MySQL user database - Unknown users are cached as well"""
+        self.assertRaises(KeyError, self.userdb.lookup, 'mallory')
+        self.assertRaises(KeyError, self.userdb.lookup, 'mallory')
+        self.assertEqual(self.queries(), 1)
+
+    def test3_pool(self):
+        """MySQL user database - Idle connections are reused"""
+        self.userdb.lookup('alice')
+        self.userdb.lookup('bob')
+        self.assertEqual(len(StubMySQLdb.connections), 1)
+        self.assertEqual(len(self.userdb.idle), 1)
+
+    def test4_error(self):
+        """MySQL user database - A connection that raised an error is not returned to the pool"""
+        self.userdb.lookup('alice')
+        connection = StubMySQLdb.connections[0]
+        connection.broken = True
+        self.userdb.pinginterval = 3600 #don't ping the idle connection, fail on the query itself
+        self.assertRaises(StubMySQLdb.Error, self.userdb.lookup, 'bob')
+        self.assertTrue(connection.closed)
+        self.assertEqual(self.userdb.idle, [])
+        self.assertEqual(self.userdb.lookup('bob'), 'hash-bob') #on a new connection
+        self.assertEqual(len(StubMySQLdb.connections), 2)
+        self.assertFalse(StubMySQLdb.connections[1].closed)
+        self.assertEqual(len(self.userdb.idle), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -99,6 +99,11 @@ clam.common.status.write(statusfile, "Starting...")
 #   inputtemplate = inputfile.metadata.inputtemplate
 #   inputfilepath = str(inputfile)
 #   encoding = inputfile.metadata['encoding'] #Example showing how to obtain metadata parameters
+#   for line in inputfile: #Lines are read one by one (decoded according to the encoding), large files are never loaded in memory entirely
+#       pass
+#   #For random access in large files: inputfile.mmap() maps the file in memory (read-only), inputfile.line(n) fetches line n,
+#   #and inputfile.linerange(begin,end) gives the byte offsets of a range of lines (to hand to worker processes).
+#   #The latter two use a line index that is built once and cached alongside the metadata.
 
 #(Note: Both these iteration examples will fail if you change the current working directory, so make sure to set it back to the initial path if you do need to change it!!)
 
@@ -40,7 +40,9 @@ setup(
             'startclamservice = clam.clamservice:main', #alias
             'clamnewproject = clam.clamnewproject:main', #alias
             'clamdispatcher = clam.clamdispatcher:main',
-            'clamclient = clam.clamclient:main'
+            'clamsupervisor = clam.clamsupervisor:main',
+            'clamclient = clam.clamclient:main',
+            'clammetadata = clam.clammetadata:main'
         ]
     },
     package_data = {'clam':['static/*.*','static/custom/*','static/tableimages/*','templates/*','style/*','clients/*.py','tests/*.py','wrappers/*.sh','config/*.wsgi'] },